@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from backends.base import FailureReason, GetLyricsBase
+
+_LOGGER = logging.getLogger(__name__)
+
+# Lookups that say nothing about whether the backend has the song
+# (the website was down, the input's duration was bad, or the backend broke)
+_IGNORED_REASONS = frozenset(
+    [
+        FailureReason.HTTP_ERROR,
+        FailureReason.INVALID_DURATION,
+        FailureReason.UNEXPECTED_ERROR,
+    ]
+)
+# Artist hit rates are pulled towards the backend's overall hit rate until there
+# have been this many lookups for the artist
+_ARTIST_PRIOR_WEIGHT = 5
+# Same for backends with no history (pulled towards this hit rate)
+_BACKEND_PRIOR_WEIGHT = 10
+_DEFAULT_HIT_RATE = 0.5
+# A search and a lyrics page
+_DEFAULT_REQUESTS_PER_LOOKUP = 2.0
+
+
+def expected_requests(hit_rates: Sequence[float], costs: Sequence[float]) -> float:
+    """Requests expected to find lyrics (or give up) trying backends in this order"""
+    expected = 0.0
+    still_looking = 1.0
+    for hit_rate, cost in zip(hit_rates, costs):
+        expected += still_looking * cost
+        still_looking *= 1 - hit_rate
+    return expected
+
+
+class BackendScheduler:
+    """Orders timestamp backends per song by how likely they are to have it (for how many requests).
+
+    Trying backends in descending hit rate / cost order minimises the expected number of requests.
+    Stats are kept between runs and optionally per artist.
+    """
+
+    def __init__(self, path: Path, per_artist: bool = False):
+        self.__path = path
+        self.__per_artist = per_artist
+        self.__lock = threading.Lock()
+        # Backend -> {"lookups", "found", "requests", "request_lookups"}
+        self.__backends: Dict[str, Dict[str, float]] = {}
+        # Artist -> backend -> {"lookups", "found"}
+        self.__artists: Dict[str, Dict[str, Dict[str, int]]] = {}
+        # How this run's orders compare to the configured order
+        self.__num_songs = 0
+        self.__num_reordered = 0
+        self.__expected_requests = 0.0
+        self.__configured_expected_requests = 0.0
+        self.__orders: Dict[str, int] = {}
+        if path.exists():
+            try:
+                with open(path, encoding="utf-8") as file:
+                    data = json.load(file)
+                self.__backends = data.get("backends", {})
+                self.__artists = data.get("artists", {})
+            except (OSError, ValueError) as ex:
+                _LOGGER.warning(f"Ignoring unreadable backend stats {path}: {ex}")
+
+    def __artist_key(self, artist: str) -> str:
+        return artist.strip().lower()
+
+    def __backend_hit_rate(self, backend_name: str) -> float:
+        stats = self.__backends.get(backend_name, {})
+        return (stats.get("found", 0) + _DEFAULT_HIT_RATE * _BACKEND_PRIOR_WEIGHT) / (
+            stats.get("lookups", 0) + _BACKEND_PRIOR_WEIGHT
+        )
+
+    def __hit_rate(self, backend_name: str, artist_key: str) -> float:
+        hit_rate = self.__backend_hit_rate(backend_name)
+        if not self.__per_artist:
+            return hit_rate
+        artist_stats = self.__artists.get(artist_key, {}).get(backend_name, {})
+        return (artist_stats.get("found", 0) + hit_rate * _ARTIST_PRIOR_WEIGHT) / (
+            artist_stats.get("lookups", 0) + _ARTIST_PRIOR_WEIGHT
+        )
+
+    def __cost(self, backend_name: str) -> float:
+        stats = self.__backends.get(backend_name, {})
+        if not stats.get("request_lookups"):
+            return _DEFAULT_REQUESTS_PER_LOOKUP
+        return max(1.0, stats["requests"] / stats["request_lookups"])
+
+    def order(self, artist: str, backends: List[GetLyricsBase]) -> List[GetLyricsBase]:
+        """Timestamp backends in the order to try them for the song"""
+        artist_key = self.__artist_key(artist)
+        with self.__lock:
+            hit_rates = {b.name: self.__hit_rate(b.name, artist_key) for b in backends}
+            costs = {b.name: self.__cost(b.name) for b in backends}
+        # Backends that don't send requests always go first and backends without timestamps last.
+        # Sort is stable so the configured order breaks ties
+        ordered = sorted(
+            backends,
+            key=lambda b: (
+                not b.has_timestamps,
+                b.sends_requests,
+                -hit_rates[b.name] / costs[b.name],
+            ),
+        )
+        expected = expected_requests(
+            [hit_rates[b.name] for b in ordered], [costs[b.name] for b in ordered]
+        )
+        configured_expected = expected_requests(
+            [hit_rates[b.name] for b in backends], [costs[b.name] for b in backends]
+        )
+        order_key = ",".join(b.name for b in ordered)
+        with self.__lock:
+            self.__num_songs += 1
+            if ordered != backends:
+                self.__num_reordered += 1
+            self.__expected_requests += expected
+            self.__configured_expected_requests += configured_expected
+            self.__orders[order_key] = self.__orders.get(order_key, 0) + 1
+        return ordered
+
+    def record_lookup(
+        self,
+        artist: str,
+        backend_name: str,
+        found: bool,
+        failure: Optional[FailureReason],
+    ) -> None:
+        if not found and (failure is None or failure in _IGNORED_REASONS):
+            # Cancelled, or says nothing about whether the backend has the song
+            return
+        with self.__lock:
+            all_stats = [self.__backends.setdefault(backend_name, {})]
+            if self.__per_artist:
+                # Otherwise nothing reads them, so the stats file doesn't grow with every artist
+                all_stats.append(
+                    self.__artists.setdefault(self.__artist_key(artist), {}).setdefault(
+                        backend_name, {}
+                    )
+                )
+            for stats in all_stats:
+                stats["lookups"] = stats.get("lookups", 0) + 1
+                stats["found"] = stats.get("found", 0) + int(found)
+
+    def record_requests(self, backend_name: str, requests: int, lookups: int) -> None:
+        """Requests a backend sent for its lookups (to learn how many requests a lookup costs)"""
+        with self.__lock:
+            stats = self.__backends.setdefault(backend_name, {})
+            stats["requests"] = stats.get("requests", 0) + requests
+            stats["request_lookups"] = stats.get("request_lookups", 0) + lookups
+
+    def summary(self) -> dict:
+        """What the scheduler decided this run and what it thinks of each backend"""
+        with self.__lock:
+            return {
+                "per_artist": self.__per_artist,
+                "songs": self.__num_songs,
+                "reordered": self.__num_reordered,
+                "expected_requests": self.__expected_requests,
+                "configured_order_expected_requests": self.__configured_expected_requests,
+                "orders": dict(self.__orders),
+                "backends": {
+                    name: {
+                        "hit_rate": self.__backend_hit_rate(name),
+                        "requests_per_lookup": self.__cost(name),
+                        **stats,
+                    }
+                    for name, stats in self.__backends.items()
+                },
+            }
+
+    def save(self) -> None:
+        with self.__lock:
+            data = json.dumps(
+                {"backends": self.__backends, "artists": self.__artists}, indent=1
+            )
+        # Write to a temporary file first so a crash can't corrupt the stats
+        temp_path = self.__path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(temp_path, self.__path)
@@ -1,40 +1,104 @@
-from typing import Optional, Tuple
+from enum import Enum
+from typing import List, NamedTuple, Optional, Tuple
 import requests
+import threading
 import logging
-import re
-from bs4 import BeautifulSoup, SoupStrainer
+from backends.extraction import extract_links, extract_text
+from backends.http_cache import LYRICS_PAGE, SEARCH_PAGE, Page
+from backends.lrc import LrcLyrics, find_sync_problem
+from backends.metrics import GET_LINK, GET_LYRICS, PARSE, BackendMetrics
+from backends.normaliser import (
+    DEFAULT_IGNORE_KEYWORDS_IN_TITLE_BRACKETS,
+    DEFAULT_REMOVE_WORDS_FROM_TITLE_ARTIST,
+    Normaliser,
+    get_normaliser,
+)
+from backends.scoring import compile_time_regex, get_result_secs, rank_candidates
+from backends.rate_limiter import RateLimiter
 
-# For Beautiful Soup speed
-import lxml
-import cchardet
+_LOGGER = logging.getLogger(__name__)
 
+# Set up in each process (so not sent to parse processes)
+_RUNTIME_ATTRIBUTES = (
+    "rate_limiter",
+    "transport",
+    "http_cache",
+    "metrics",
+    "parse_pool",
+)
+
+
+class FailureReason(Enum):
+    INVALID_DURATION = "invalid_duration"
+    NO_SEARCH_RESULTS = "no_search_results"
+    NO_MATCHING_RESULT = "no_matching_result"
+    DURATION_MISMATCH = "duration_mismatch"
+    # The website was down or busy (connection error, timeout, 429 or 5xx)
+    HTTP_ERROR = "http_error"
+    # The website refused the request (any other 4xx, e.g. 404 or 410)
+    HTTP_CLIENT_ERROR = "http_client_error"
+    PARSE_ERROR = "parse_error"
+    NO_LYRICS = "no_lyrics"
+    INVALID_LYRICS = "invalid_lyrics"
+    # Timestamps go backwards or past the end of the song
+    BAD_SYNC = "bad_sync"
+    # The backend raised something other than LookupFailed (e.g. a bug, or a website changed)
+    UNEXPECTED_ERROR = "unexpected_error"
+
+
+class LookupFailed(Exception):
+    def __init__(self, reason: FailureReason, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+    def __reduce__(self):
+        # So it can be raised in a parse process and caught in the worker thread
+        return LookupFailed, (self.reason, str(self))
+
+
+def get_http_failure_reason(ex: Exception) -> FailureReason:
+    """HTTP_CLIENT_ERROR if the website answered with a 4xx other than 429, otherwise HTTP_ERROR"""
+    status_code = getattr(getattr(ex, "response", None), "status_code", None)
+    if status_code and 400 <= status_code < 500 and status_code != 429:
+        return FailureReason.HTTP_CLIENT_ERROR
+    return FailureReason.HTTP_ERROR
 
-_LOGGER = logging.getLogger(__name__)
+
+class LookupResult(NamedTuple):
+    lyrics: Optional[str]
+    # Not set if the lookup was cancelled
+    failure: Optional[FailureReason] = None
 
 
 class GetLyricsBase:
     def __init__(self, args):
         ### BASIC SETUP ###
-        self.session = requests.Session()
         self.request_headers = {
             "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0.0.0 Safari/537.36",
         }
         self.duration_padding = 5
         self.time_regex = r"\[(\d{2}):(\d{2}.\d{2})\]"
-        self.ignore_keywords_in_title_brackets = [
-            "feat",
-            "acoustic",
-            "bonus",
-            "from",
-            "version",
-            "cover",
-            "live",
-            "remix",
-            "theme",
-            "official",
-            "explicit",
-        ]
-        self.remove_words_from_title_artist = ["a", "the", "of"]
+        self.ignore_keywords_in_title_brackets = list(
+            DEFAULT_IGNORE_KEYWORDS_IN_TITLE_BRACKETS
+        )
+        self.remove_words_from_title_artist = list(
+            DEFAULT_REMOVE_WORDS_FROM_TITLE_ARTIST
+        )
+        self.metrics = BackendMetrics()
+        # Set if pages are parsed in separate processes (see ParsePool)
+        self.parse_pool = None
+
+        ### IMPLEMENTATION CAN OVERRIDE ###
+        # Default limits so we don't get banned (can be overridden per backend from the CLI)
+        self.max_concurrency = 4
+        self.requests_per_second = 5.0
+        # Search results scoring less than this (out of 1) are ignored
+        self.min_confidence = 0.8
+        # Max number of search results to get lyrics from (if the best one's lyrics are invalid)
+        self.max_candidates = 3
+        # Backends that don't send requests (e.g. the local lyrics store) are always tried first,
+        # and their failures aren't remembered between runs
+        self.sends_requests = True
 
         ### IMPLEMENTATION SHOULD OVERRIDE ###
         self.name = "base"
@@ -51,6 +115,8 @@ class GetLyricsBase:
         # The following 3 arguments should follow the format:
         # {"name": "div", "attrs": {"class": "row ui"}}
         # See https://www.crummy.com/software/BeautifulSoup/bs4/doc/#kinds-of-filters
+        # A tag name with string, regex or True attribute values is parsed without
+        # BeautifulSoup (much faster), anything else falls back to BeautifulSoup
 
         # HTML tag containing all the results
         self.link_strainer_args = None
@@ -59,161 +125,371 @@ class GetLyricsBase:
         # HTML tag containing the lyrics text
         self.lyrics_strainer_args = None
 
+    def configure(self, args) -> None:
+        """Called once the implementation is set up, to apply per backend overrides from args"""
+        max_concurrency = args.backend_concurrency.get(self.name, self.max_concurrency)
+        requests_per_second = args.backend_requests_per_second.get(
+            self.name, self.requests_per_second
+        )
+        self.rate_limiter = RateLimiter(max_concurrency, requests_per_second)
+        self.http_cache = args.http_cache
+        self.transport = args.transport
+        base_url = args.backend_base_urls.get(self.name)
+        if base_url and self.base_url:
+            # Point the backend at a mirror (or a local server), keeping the same paths
+            base_url = base_url.rstrip("/")
+            if self.search_url and self.search_url.startswith(self.base_url):
+                self.search_url = base_url + self.search_url[len(self.base_url) :]
+            self.base_url = base_url
+        if self.base_url:
+            self.transport.register(self.base_url, max_concurrency)
+        if args.min_confidence is not None:
+            self.min_confidence = args.min_confidence
+        if args.max_candidates is not None:
+            self.max_candidates = args.max_candidates
+
+    def __getstate__(self) -> dict:
+        # Parse processes only need the backend's settings, not the things used to send requests
+        state = self.__dict__.copy()
+        for name in _RUNTIME_ATTRIBUTES:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.metrics = BackendMetrics()
+        self.parse_pool = None
+
     ### CALL THIS FUNCTION ###
 
     def get_lyrics(
-        self, title_raw: str, artist_raw: str, duration_raw: str
+        self,
+        title_raw: str,
+        artist_raw: str,
+        duration_raw: str,
+        cancel_event: Optional[threading.Event] = None,
     ) -> Optional[str]:
+        return self.search_lyrics(
+            title_raw, artist_raw, duration_raw, cancel_event
+        ).lyrics
+
+    def find_lyrics(
+        self,
+        title_raw: str,
+        artist_raw: str,
+        duration_raw: str,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> LookupResult:
+        """Same as get_lyrics but also says why the lookup failed. Never raises"""
+        try:
+            if type(self).get_lyrics is not GetLyricsBase.get_lyrics:
+                # e.g. a plugin backend that only implements get_lyrics
+                lyrics = self.get_lyrics(title_raw, artist_raw, duration_raw)
+                return LookupResult(lyrics, None if lyrics else FailureReason.NO_LYRICS)
+            return self.search_lyrics(title_raw, artist_raw, duration_raw, cancel_event)
+        except Exception as ex:
+            _LOGGER.debug(
+                f"{self.name}: Could not get lyrics for: {title_raw} - {artist_raw}: {ex}",
+                exc_info=True,
+            )
+            return LookupResult(None, FailureReason.UNEXPECTED_ERROR)
+
+    ### HELPER FUNCTIONS (FOR IMPLEMENTATIONS TO OVERRIDE) ###
+
+    def search_lyrics(
+        self,
+        title_raw: str,
+        artist_raw: str,
+        duration_raw: str,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> LookupResult:
+        """Searches the website and gets the lyrics of the best valid results"""
         assert self.lyrics_strainer_args
         title, artist, duration = self.standardise(title_raw, artist_raw, duration_raw)
         if not duration and self.validate_duration:
-            return None
+            return LookupResult(None, FailureReason.INVALID_DURATION)
         _LOGGER.debug(f"{self.name}: Getting lyrics for: {title} - {artist}")
-        link = self.get_link(title, artist, duration)
-        if not link:
-            return None
-        if not self.link_includes_base:
-            link = f"{self.base_url}{link}"
         try:
-            response = self.session.get(
-                url=link,
-                headers=self.request_headers,
-            )
-            response.raise_for_status()
-            strainer = SoupStrainer(**self.lyrics_strainer_args)
-            result = BeautifulSoup(response.text, "lxml", parse_only=strainer)
-            lyrics = result.get_text(separator="\n", strip=True)
+            with self.metrics.timed(GET_LINK):
+                links = self.get_links(title, artist, duration)
+        except LookupFailed as ex:
+            _LOGGER.debug(f"{self.name}: {ex}")
+            return LookupResult(None, ex.reason)
+
+        # Only try the next best result if the previous one's lyrics were no good
+        reason = None
+        for link in links[: self.max_candidates]:
+            if not self.link_includes_base:
+                link = f"{self.base_url}{link}"
+            # Another backend has already got lyrics so don't waste a request
+            if cancel_event and cancel_event.is_set():
+                _LOGGER.debug(
+                    f"{self.name}: Cancelled getting lyrics for: {title} - {artist}"
+                )
+                return LookupResult(None)
+            try:
+                with self.metrics.timed(GET_LYRICS):
+                    lyrics = self.get_lyrics_from_link(link, duration)
+            except LookupFailed as ex:
+                _LOGGER.debug(f"{self.name}: {ex}")
+                reason = ex.reason
+                continue
             _LOGGER.debug(f"{self.name}: Got lyrics for: {title} - {artist}")
-            return self.scrub_lyrics(lyrics)
-        except Exception as ex:
-            _LOGGER.debug(f"{self.name}: Could not get lyrics from link: {link}: {ex}")
-            return None
+            return LookupResult(lyrics)
+        return LookupResult(None, reason)
 
-    ### HELPER FUNCTIONS (FOR IMPLEMENTATIONS TO OVERRIDE) ###
+    def get_link(self, title: str, artist: str, duration_secs: Optional[int]) -> str:
+        """Raises LookupFailed if there is no valid link"""
+        return self.get_links(title, artist, duration_secs)[0]
 
-    def get_link(
+    def get_links(
         self, title: str, artist: str, duration_secs: Optional[int]
-    ) -> Optional[str]:
+    ) -> List[str]:
+        """Links of valid search results, best match first. Raises LookupFailed if there are none"""
         assert self.base_url and self.search_url and self.query_key
         assert self.link_strainer_args and self.link_result_args
         _LOGGER.debug(f"{self.name}: Getting link for: {title} - {artist}")
-        duration = duration_secs if self.validate_duration else None
         params = "+".join(title.split() + artist.split())
         try:
-            response = self.session.get(
-                url=self.search_url,
-                params={self.query_key: params},
-                headers=self.request_headers,
-            )
-            response.raise_for_status()
-            strainer = SoupStrainer(**self.link_strainer_args)
-            parsed_html = BeautifulSoup(response.text, "lxml", parse_only=strainer)
-            results = parsed_html.find_all(**self.link_result_args)
-            for result in results:
-                result_text = result.text.strip().lower()
-                if self.validate_result(title, artist, duration, result_text):
-                    link = result.get_attribute_list(key="href")[0]
-                    _LOGGER.debug(
-                        f"{self.name}: Got link for: {title} - {artist}: {link}"
-                    )
-                    return link
-            _LOGGER.debug(
-                f"{self.name}: Failed to get valid link for {title} - {artist} from {len(results)} results"
+            response = self.get_page(
+                self.search_url, {self.query_key: params}, kind=SEARCH_PAGE
+            )
+        except requests.RequestException as ex:
+            raise LookupFailed(
+                get_http_failure_reason(ex),
+                f"Could not get search result: {self.query_key}?={params}: {ex}",
+            )
+        # Includes waiting for a parse process if there are any
+        with self.metrics.timed(PARSE):
+            return self.run_parser(
+                "parse_search_page",
+                response.content,
+                response.encoding,
+                title,
+                artist,
+                duration_secs,
+            )
+
+    def parse_search_page(
+        self,
+        content: bytes,
+        encoding: Optional[str],
+        title: str,
+        artist: str,
+        duration_secs: Optional[int],
+    ) -> List[str]:
+        """Links of valid search results on the page, best match first. Raises LookupFailed if there are none"""
+        check_duration = self.has_timestamps and self.validate_duration
+        params = "+".join(title.split() + artist.split())
+        try:
+            results = extract_links(
+                content, encoding, self.link_strainer_args, self.link_result_args
             )
-            return None
         except Exception as ex:
+            raise LookupFailed(
+                FailureReason.PARSE_ERROR,
+                f"Could not parse search result: {self.query_key}?={params}: {ex}",
+            )
+        if not results:
+            raise LookupFailed(
+                FailureReason.NO_SEARCH_RESULTS,
+                f"No search results for {title} - {artist}",
+            )
+        ranked = rank_candidates(
+            title,
+            artist,
+            duration_secs if check_duration else None,
+            results,
+            self.normaliser,
+            self.time_regex,
+            self.duration_padding,
+            self.min_confidence,
+        )
+        if not ranked.candidates:
+            # A matching song with the wrong duration is the most useful reason to report
+            reason = FailureReason.NO_MATCHING_RESULT
+            if ranked.num_duration_mismatches:
+                reason = FailureReason.DURATION_MISMATCH
+            raise LookupFailed(
+                reason,
+                f"Failed to get valid link for {title} - {artist} from {len(results)} results",
+            )
+        for candidate in ranked.candidates:
             _LOGGER.debug(
-                f"{self.name}: Could not get link to lyrics from search result: {self.query_key}?={params}: {ex}"
+                f"{self.name}: Candidate for: {title} - {artist}: {candidate.text} (Confidence={candidate.confidence:.2f}) {candidate.link}"
             )
-            return None
+        return [candidate.link for candidate in ranked.candidates]
+
+    def get_lyrics_from_link(self, link: str, duration_secs: Optional[int]) -> str:
+        """Raises LookupFailed if there are no valid lyrics at the link"""
+        try:
+            response = self.get_page(link, kind=LYRICS_PAGE)
+        except requests.RequestException as ex:
+            raise LookupFailed(
+                get_http_failure_reason(ex),
+                f"Could not get lyrics from link: {link}: {ex}",
+            )
+        # Includes waiting for a parse process if there are any
+        with self.metrics.timed(PARSE):
+            return self.run_parser(
+                "parse_lyrics_page",
+                response.content,
+                response.encoding,
+                link,
+                duration_secs,
+            )
+
+    def parse_lyrics_page(
+        self,
+        content: bytes,
+        encoding: Optional[str],
+        link: str,
+        duration_secs: Optional[int],
+    ) -> str:
+        """Scrubbed lyrics on the page. Raises LookupFailed if there are no valid lyrics"""
+        try:
+            lyrics = extract_text(content, encoding, self.lyrics_strainer_args)
+            lyrics, parsed = self.scrub_and_parse_lyrics(lyrics)
+        except Exception as ex:
+            raise LookupFailed(
+                FailureReason.PARSE_ERROR,
+                f"Could not parse lyrics from link: {link}: {ex}",
+            )
+        if not lyrics:
+            raise LookupFailed(
+                FailureReason.NO_LYRICS, f"No lyrics found at link: {link}"
+            )
+        reason = self.check_lyrics(lyrics, duration_secs, parsed)
+        if reason:
+            raise LookupFailed(reason, f"Invalid lyrics at link: {link}")
+        return lyrics
+
+    def run_parser(self, method_name: str, *args):
+        """Call a parse method here, or in a parse process if pages are parsed in separate processes"""
+        if self.parse_pool:
+            return self.parse_pool.run(self.name, method_name, args)
+        return getattr(self, method_name)(*args)
+
+    def get_page(
+        self, url: str, params: Optional[dict] = None, kind: str = LYRICS_PAGE
+    ) -> Page:
+        full_url = requests.Request("GET", url, params=params).prepare().url
+        if self.http_cache:
+            page = self.http_cache.get(full_url, kind)
+            if page:
+                self.metrics.record_cache_hit()
+                return page
+        response = self.transport.get(
+            full_url, self.request_headers, self.rate_limiter, self.metrics
+        )
+        response.raise_for_status()
+        # Keep the encoding requests would have used to decode the text
+        encoding = response.encoding or response.apparent_encoding
+        page = Page(full_url, response.content, encoding)
+        if self.http_cache:
+            self.http_cache.put(page, kind)
+        return page
 
     def scrub_lyrics(self, lyrics: str) -> str:
         # Nothing to scrub by default
         return lyrics
 
+    def scrub_and_parse_lyrics(self, lyrics: str) -> Tuple[str, Optional[LrcLyrics]]:
+        """Scrubbed lyrics, and their parsed LRC if scrubbing had to parse them anyway
+        (so they aren't parsed again to be checked)"""
+        return self.scrub_lyrics(lyrics), None
+
+    def validate_lyrics(self, lyrics: str, duration_secs: Optional[int]) -> bool:
+        return not self.check_lyrics(lyrics, duration_secs)
+
+    def check_lyrics(
+        self,
+        lyrics: str,
+        duration_secs: Optional[int],
+        parsed: Optional[LrcLyrics] = None,
+    ) -> Optional[FailureReason]:
+        """Returns why the lyrics are invalid (or None if they are valid)"""
+        # Lyrics from timestamp backends must actually have timestamps (that fit the song)
+        if not self.has_timestamps:
+            return None
+        if parsed is None:
+            parsed = LrcLyrics.parse(lyrics)
+        if not parsed.num_timed():
+            _LOGGER.debug(f"{self.name}: Invalid lyrics: No timestamps")
+            return FailureReason.INVALID_LYRICS
+        problem = find_sync_problem(parsed, duration_secs, self.duration_padding)
+        if problem:
+            _LOGGER.debug(f"{self.name}: Invalid lyrics: {problem}")
+            return FailureReason.BAD_SYNC
+        return None
+
+    @property
+    def normaliser(self) -> Normaliser:
+        # Looked up each time since implementations can change the words after init
+        return get_normaliser(
+            tuple(self.ignore_keywords_in_title_brackets),
+            tuple(self.remove_words_from_title_artist),
+        )
+
     def remove_punctuation(self, string: str) -> str:
-        string = re.sub(r"[’`'\"]", "", string)
-        string = re.sub(r"[^A-Za-z0-9]", " ", string)
-        string = re.sub(r"-", " ", string)
-        string_parts = string.split()
-        string_parts = [
-            part
-            for part in string_parts
-            if part not in self.remove_words_from_title_artist
-        ]
-        string = " ".join(string_parts)
-        return string
+        return self.normaliser.remove_punctuation(string)
 
     def standardise_title(self, title: str) -> str:
-        title = title.strip().lower()
-        brackets = re.findall("\(.*?\)", title)
-        brackets += re.findall("\[.*?\]", title)
-        for bracket in brackets:
-            if any(
-                [
-                    keyword in bracket
-                    for keyword in self.ignore_keywords_in_title_brackets
-                ]
-            ):
-                title = title.replace(bracket, "")
-        title = self.remove_punctuation(title)
-        return title
+        return self.normaliser.standardise_title(title)
 
     def standardise_artist(self, artist: str) -> str:
-        artist = artist.strip().lower()
-        if ";" in artist:  # Remove multiple artists
-            artist = artist.split(";")[0].strip()
-
-        artist = self.remove_punctuation(artist)
-        return artist
+        return self.normaliser.standardise_artist(artist)
 
     def get_secs_from_time_str(self, duration: str) -> Optional[int]:
-        duration = duration.strip()
-        duration_parts = re.findall(r"^(\d{2}):(\d{2}):(\d{2})$", duration)
-        if not duration_parts or len(duration_parts) != 1:
+        secs = self.normaliser.get_secs_from_time_str(duration)
+        if secs is None:
             _LOGGER.debug(
                 f"{self.name}: Failed to standardise: {duration} does not match HH:MM:SS"
             )
-            return None
-        hours, mins, secs = duration_parts[0]
-        return int(hours) * 3600 + int(mins) * 60 + int(secs)
+        return secs
 
     def standardise(
         self, title: str, artist: str, duration: str
     ) -> Tuple[str, str, Optional[int]]:
-        title = self.standardise_title(title)
-        artist = self.standardise_artist(artist)
-        dur_secs = self.get_secs_from_time_str(duration)
-        return title, artist, dur_secs
+        result = self.normaliser.standardise(title, artist, duration)
+        if result[2] is None:
+            _LOGGER.debug(
+                f"{self.name}: Failed to standardise: {duration} does not match HH:MM:SS"
+            )
+        return result
 
     def validate_result(
         self, title: str, artist: str, duration_secs: Optional[int], result_str: str
     ) -> bool:
+        return not self.check_result(title, artist, duration_secs, result_str)
+
+    def check_result(
+        self, title: str, artist: str, duration_secs: Optional[int], result_str: str
+    ) -> Optional[FailureReason]:
+        """Returns why the result is invalid (or None if it is valid)"""
         # Validate title and artist
         parts = title.split() + artist.split()
         if not all([part.lower() in result_str.lower() for part in parts]):
             _LOGGER.debug(
                 f"{self.name}: Invalid result for: {title} - {artist}: {result_str} failed: No matching title and artist"
             )
-            return False
+            return FailureReason.NO_MATCHING_RESULT
 
         # Duration doesn't need to be validated if lyrics don't have timestamps
         if not self.has_timestamps or not duration_secs:
-            return True
+            return None
 
         # Validate duration
-        time_match = re.findall(rf".*{self.time_regex}", result_str)
-        if not time_match:
+        time_secs = get_result_secs(compile_time_regex(self.time_regex), result_str)
+        if time_secs is None:
             _LOGGER.debug(
                 f"{self.name}: Invalid result for: {title} - {artist}: {result_str} failed: No valid time stamp"
             )
-            return False
-        mins, secs = time_match[-1]
-        time_secs = int(mins) * 60 + float(secs)
+            return FailureReason.DURATION_MISMATCH
         valid_time = abs(time_secs - duration_secs) <= self.duration_padding
         if not valid_time:
             _LOGGER.debug(
                 f"{self.name}: Invalid result for: {title} - {artist}: {result_str} failed: Out of time range (padding={self.duration_padding})"
             )
-            return False
-        return True
+            return FailureReason.DURATION_MISMATCH
+        return None
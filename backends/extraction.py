@@ -0,0 +1,161 @@
+import logging
+import re
+from typing import Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+_LOGGER = logging.getLogger(__name__)
+
+# Feed the parser a chunk at a time so we can stop once we have what we need
+_CHUNK_SIZE = 16 * 1024
+# BeautifulSoup's get_text doesn't include these either
+_IGNORE_TEXT_TAGS = frozenset(["script", "style", "template"])
+
+
+class ElementMatcher:
+    """Matches lxml elements the same way BeautifulSoup matches the strainer args"""
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        # Ids are unique, so there can only be one matching element
+        self.unique = isinstance(attrs.get("id"), str)
+
+    def matches(self, element) -> bool:
+        if element.tag != self.name:
+            return False
+        for key, expected in self.attrs.items():
+            value = element.get(key)
+            if value is None:
+                return False
+            if expected is True:
+                continue
+            # Class can match the whole attribute or any one of the classes
+            values = [value] + value.split() if key == "class" else [value]
+            if isinstance(expected, str):
+                if expected not in values:
+                    return False
+            elif not any(expected.search(value) for value in values):
+                return False
+        return True
+
+
+def compile_matcher(strainer_args: dict) -> Optional[ElementMatcher]:
+    """Returns None if the args can't be matched without BeautifulSoup"""
+    name = strainer_args.get("name")
+    attrs = strainer_args.get("attrs", {})
+    if set(strainer_args) - {"name", "attrs"} or not isinstance(name, str):
+        return None
+    for expected in attrs.values():
+        if not (
+            expected is True
+            or isinstance(expected, str)
+            or isinstance(expected, re.Pattern)
+        ):
+            return None
+    return ElementMatcher(name.lower(), attrs)
+
+
+def _iter_matching_elements(
+    content: bytes, encoding: Optional[str], matcher: ElementMatcher
+) -> Iterator[etree._Element]:
+    """Yields each complete top level matching element while parsing the raw page"""
+    parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding or "utf-8")
+    open_matches = 0
+    offset = 0
+    while True:
+        if offset < len(content):
+            parser.feed(content[offset : offset + _CHUNK_SIZE])
+            offset += _CHUNK_SIZE
+        else:
+            try:
+                parser.close()
+            except etree.XMLSyntaxError:
+                # Nothing to parse (e.g. an empty page)
+                return
+        for event, element in parser.read_events():
+            if not isinstance(element.tag, str) or not matcher.matches(element):
+                continue
+            if event == "start":
+                open_matches += 1
+                continue
+            open_matches -= 1
+            # Nested matches are included in the outer match
+            if open_matches == 0:
+                yield element
+                if matcher.unique:
+                    return
+        if offset >= len(content):
+            return
+
+
+def _iter_strings(element: etree._Element) -> Iterator[str]:
+    if element.text and element.tag not in _IGNORE_TEXT_TAGS:
+        yield element.text
+    for child in element:
+        # Skip comments and processing instructions (but not the text after them)
+        if isinstance(child.tag, str):
+            yield from _iter_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def _get_text(element: etree._Element) -> str:
+    return "".join(_iter_strings(element))
+
+
+def extract_links(
+    content: bytes, encoding: Optional[str], container_args: dict, result_args: dict
+) -> List[Tuple[str, str]]:
+    """(href, text) of each result within the container element"""
+    container_matcher = compile_matcher(container_args)
+    result_matcher = compile_matcher(result_args)
+    if container_matcher and result_matcher:
+        results = []
+        for container in _iter_matching_elements(content, encoding, container_matcher):
+            for element in container.iter(result_matcher.name):
+                href = element.get("href")
+                if href and result_matcher.matches(element):
+                    results.append((href, _get_text(element).strip()))
+        return results
+
+    _LOGGER.debug(f"Falling back to BeautifulSoup for links: {container_args}")
+    parsed_html = _parse_with_beautiful_soup(content, encoding, container_args)
+    return [
+        (result.get("href"), result.text.strip())
+        for result in parsed_html.find_all(**result_args)
+        if result.get("href")
+    ]
+
+
+def extract_text(content: bytes, encoding: Optional[str], strainer_args: dict) -> str:
+    """Text of the matching element(s), one line per string (like BeautifulSoup's get_text)"""
+    matcher = compile_matcher(strainer_args)
+    if matcher:
+        lines = [
+            stripped
+            for element in _iter_matching_elements(content, encoding, matcher)
+            for string in _iter_strings(element)
+            if (stripped := string.strip())
+        ]
+        return "\n".join(lines)
+
+    _LOGGER.debug(f"Falling back to BeautifulSoup for text: {strainer_args}")
+    result = _parse_with_beautiful_soup(content, encoding, strainer_args)
+    return result.get_text(separator="\n", strip=True)
+
+
+def _parse_with_beautiful_soup(
+    content: bytes, encoding: Optional[str], strainer_args: dict
+):
+    # Only imported if a backend needs it (it's slow to import and rarely needed)
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    # For Beautiful Soup speed
+    import cchardet  # noqa: F401
+
+    return BeautifulSoup(
+        content.decode(encoding or "utf-8", errors="replace"),
+        "lxml",
+        parse_only=SoupStrainer(**strainer_args),
+    )
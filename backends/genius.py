@@ -1,11 +1,23 @@
 import logging
-from typing import Optional
-from backends.base import GetLyricsBase
+import threading
+from typing import List, Optional, Tuple
+from backends.base import (
+    FailureReason,
+    GetLyricsBase,
+    LookupFailed,
+    LookupResult,
+    get_http_failure_reason,
+)
+from backends.metrics import GET_LINK, GET_LYRICS
+from backends.scoring import rank_candidates
 from lyricsgenius import Genius
 import re
 
 _LOGGER = logging.getLogger(__name__)
 
+# Search results to rank (one search request gets them all)
+RESULTS_PER_SEARCH = 10
+
 
 class GetLyricsGenius(GetLyricsBase):
     """Sometimes lyrics without timestamps is better than no lyrics at all"""
@@ -31,25 +43,118 @@ class GetLyricsGenius(GetLyricsBase):
 
     def scrub_lyrics(self, result_title: str, lyrics: str) -> str:
         # Remove "<title> Lyrics" header
-        lyrics = re.sub(rf"^{result_title} Lyrics", "", lyrics)
+        lyrics = re.sub(rf"^{re.escape(result_title)} Lyrics", "", lyrics)
 
         # Remove "Embed##" from the end
         lyrics = re.sub(r"[0-9]+Embed$", "", lyrics)
 
         return lyrics.strip()
 
-    def get_lyrics(
-        self, title_raw: str, artist_raw: str, duration_raw: int
-    ) -> Optional[str]:
-        title, artist, duration = self.standardise(title_raw, artist_raw, duration_raw)
-        _LOGGER.debug(f"Getting lyrics for: {title} - {artist}")
+    def search_lyrics(
+        self,
+        title_raw: str,
+        artist_raw: str,
+        duration_raw: str,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> LookupResult:
+        title, artist, _ = self.standardise(title_raw, artist_raw, duration_raw)
+        _LOGGER.debug(f"{self.name}: Getting lyrics for: {title} - {artist}")
+        try:
+            with self.metrics.timed(GET_LINK):
+                results = self.get_results(title, artist)
+        except LookupFailed as ex:
+            _LOGGER.debug(f"{self.name}: {ex}")
+            return LookupResult(None, ex.reason)
+
+        # Only get the next best result's lyrics if the previous one had none
+        reason = None
+        for link, result_title in results[: self.max_candidates]:
+            if cancel_event and cancel_event.is_set():
+                _LOGGER.debug(
+                    f"{self.name}: Cancelled getting lyrics for: {title} - {artist}"
+                )
+                return LookupResult(None)
+            try:
+                with self.metrics.timed(GET_LYRICS):
+                    lyrics = self.get_lyrics_from_result(link, result_title)
+            except LookupFailed as ex:
+                _LOGGER.debug(f"{self.name}: {ex}")
+                reason = ex.reason
+                continue
+            _LOGGER.debug(f"{self.name}: Got lyrics for: {title} - {artist}")
+            return LookupResult(lyrics)
+        return LookupResult(None, reason)
+
+    def get_results(self, title: str, artist: str) -> List[Tuple[str, str]]:
+        """Link and title of the valid search results, best match first.
+        Raises LookupFailed if there are none"""
+        try:
+            with self.rate_limiter:
+                response = self.__genius.search_songs(
+                    f"{title} {artist}", per_page=RESULTS_PER_SEARCH
+                )
+        except Exception as ex:
+            raise LookupFailed(
+                get_http_failure_reason(ex),
+                f"Could not get search results for: {title} - {artist}: {ex}",
+            )
+        result_titles = {}
+        results = []
+        for hit in response.get("hits", []):
+            result = hit.get("result") or {}
+            if hit.get("type", "song") != "song" or not result.get("url"):
+                continue
+            result_titles[result["url"]] = result["title"]
+            results.append(
+                (result["url"], f"{result['title']} {result['primary_artist']['name']}")
+            )
+        if not results:
+            raise LookupFailed(
+                FailureReason.NO_SEARCH_RESULTS,
+                f"No search results for: {title} - {artist}",
+            )
+        # Genius has no durations, so only the title and artist are compared
+        ranked = rank_candidates(
+            title,
+            artist,
+            None,
+            results,
+            self.normaliser,
+            self.time_regex,
+            self.duration_padding,
+            self.min_confidence,
+        )
+        if not ranked.candidates:
+            raise LookupFailed(
+                FailureReason.NO_MATCHING_RESULT,
+                f"No valid result for: {title} - {artist} in {ranked.num_results} results",
+            )
+        return [
+            (candidate.link, result_titles[candidate.link])
+            for candidate in ranked.candidates
+        ]
+
+    def get_lyrics_from_result(self, link: str, result_title: str) -> str:
+        """Raises LookupFailed if there are no lyrics at the link"""
         try:
-            # TODO: Get multiple results in case first one isn't valid
-            song = self.__genius.search_song(title, artist, get_full_info=False)
-            if song and self.validate_result(title, artist, duration, song.full_title):
-                _LOGGER.debug(f"Got lyrics for: {title} - {artist}")
-                return self.scrub_lyrics(song.title, song.lyrics)
-            return None
+            with self.rate_limiter:
+                lyrics = self.__genius.lyrics(
+                    song_url=link, remove_section_headers=True
+                )
         except Exception as ex:
-            _LOGGER.debug(f"Could not get lyrics for: {title} - {artist}: {ex}")
-            return None
+            raise LookupFailed(
+                get_http_failure_reason(ex),
+                f"Could not get lyrics from link: {link}: {ex}",
+            )
+        if not lyrics:
+            raise LookupFailed(FailureReason.NO_LYRICS, f"No lyrics at link: {link}")
+        try:
+            lyrics = self.scrub_lyrics(result_title, lyrics)
+        except Exception as ex:
+            raise LookupFailed(
+                FailureReason.PARSE_ERROR,
+                f"Could not scrub lyrics from link: {link}: {ex}",
+            )
+        if not lyrics:
+            raise LookupFailed(FailureReason.NO_LYRICS, f"No lyrics at link: {link}")
+        return lyrics
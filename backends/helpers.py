@@ -1,20 +1,41 @@
-from typing import List, Optional
-from backends.megalobiz import GetLyricsMegalobiz
-from backends.base import GetLyricsBase
-from backends.genius import GetLyricsGenius
-from backends.rclyricsband import GetLyricsRCLyricsBand
-from backends.lyricsify import GetLyricsLyricsify
+from importlib import import_module
+from importlib.metadata import entry_points
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional, Type, TypeVar
 
 import logging
 
+if TYPE_CHECKING:
+    from backends.base import GetLyricsBase
+
 _LOGGER = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Other packages can add backends by declaring an entry point in this group,
+# e.g. `mybackend = my_package.backend:GetLyricsMyBackend`
+ENTRY_POINT_GROUP = "lyrics_getter.backends"
+
+
+class _BackendSpec(NamedTuple):
+    # Backend modules are only imported when the backend is used (they're slow to import)
+    module: str
+    class_name: str
+
+
 _BACKENDS_WITH_TIMESTAMPS = {
-    "lyricsify": GetLyricsLyricsify,
-    "rclyricsband": GetLyricsRCLyricsBand,
-    "megalobiz": GetLyricsMegalobiz,
+    "lyricsify": _BackendSpec("backends.lyricsify", "GetLyricsLyricsify"),
+    "rclyricsband": _BackendSpec("backends.rclyricsband", "GetLyricsRCLyricsBand"),
+    "megalobiz": _BackendSpec("backends.megalobiz", "GetLyricsMegalobiz"),
+}
+_BACKENDS_NO_TIMESTAMPS = {"genius": _BackendSpec("backends.genius", "GetLyricsGenius")}
+# Only used with a lyrics store (see --lyrics-store)
+LOCAL_BACKEND = "local"
+# Lyrics without timestamps in the store (only used with --no-timestamp-fallback)
+LOCAL_TXT_BACKEND = "local_txt"
+_BACKENDS_LOCAL = {
+    LOCAL_BACKEND: _BackendSpec("backends.local", "GetLyricsLocal"),
+    LOCAL_TXT_BACKEND: _BackendSpec("backends.local", "GetLyricsLocalTxt"),
 }
-_BACKENDS_NO_TIMESTAMPS = {"genius": GetLyricsGenius}
 
 # Don't include non-timestamp backends by default
 # because the point of this program is to get LRC lyrics
@@ -26,14 +47,53 @@ def get_all_no_timestamp_backends() -> List[str]:
     return list(_BACKENDS_NO_TIMESTAMPS.keys())
 
 
-def get_backend_class(backend: str) -> Optional[List[GetLyricsBase]]:
-    be_lower = backend.lower()
-    if be_lower in _BACKENDS_WITH_TIMESTAMPS:
-        return _BACKENDS_WITH_TIMESTAMPS[be_lower]
-    if be_lower in _BACKENDS_NO_TIMESTAMPS:
-        return _BACKENDS_NO_TIMESTAMPS[be_lower]
+def get_plugin_backends() -> List[str]:
+    """Backends installed by other packages (not used unless asked for by name)"""
+    return sorted(entry_point.name.lower() for entry_point in entry_points(group=ENTRY_POINT_GROUP))
+
+
+def _load_plugin_class(backend: str) -> Optional[Type["GetLyricsBase"]]:
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        if entry_point.name.lower() != backend:
+            continue
+        try:
+            return entry_point.load()
+        except Exception as ex:
+            _LOGGER.warning(f"Can't load backend {backend} from {entry_point.value}: {ex}")
+            return None
     return None
 
 
+def get_backend_class(backend: str) -> Optional[Type["GetLyricsBase"]]:
+    be_lower = backend.lower()
+    spec = _BACKENDS_WITH_TIMESTAMPS.get(be_lower) or _BACKENDS_NO_TIMESTAMPS.get(be_lower) or _BACKENDS_LOCAL.get(be_lower)
+    if spec:
+        return getattr(import_module(spec.module), spec.class_name)
+    return _load_plugin_class(be_lower)
+
+
 def has_timestamps(backend: str) -> bool:
-    return backend in _BACKENDS_WITH_TIMESTAMPS
+    # Only knows about built in backends, use the backend instance's has_timestamps for plugins
+    return backend in _BACKENDS_WITH_TIMESTAMPS or backend == LOCAL_BACKEND
+
+
+def create_backend(backend: str, args) -> Optional["GetLyricsBase"]:
+    backend_class = get_backend_class(backend)
+    if not backend_class:
+        return None
+    instance = backend_class(args)
+    instance.configure(args)
+    return instance
+
+
+def parse_backend_options(
+    options: List[str], value_type: Callable[[str], T]
+) -> Dict[str, T]:
+    """Parse a list of `<backend>=<value>` strings from the CLI"""
+    parsed = {}
+    for option in options:
+        backend, sep, value = option.partition("=")
+        if not sep:
+            raise ValueError(f"Backend option {option} should be <backend>=<value>")
+        parsed[backend.strip().lower()] = value_type(value.strip())
+    return parsed
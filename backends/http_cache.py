@@ -0,0 +1,114 @@
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+SEARCH_PAGE = "search"
+LYRICS_PAGE = "lyrics"
+
+
+class Page(NamedTuple):
+    url: str
+    content: bytes
+    encoding: Optional[str]
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+class HttpCache:
+    """Persistent cache of successful responses keyed on the full request URL (including query params)"""
+
+    def __init__(self, path: Path, ttls: Dict[str, float], max_size_bytes: int):
+        self.__ttls = ttls
+        self.__max_size_bytes = max_size_bytes
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                content BLOB NOT NULL,
+                encoding TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )""")
+        self.__connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+        (self.__size_bytes,) = self.__connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        self.hits = {kind: 0 for kind in ttls}
+        self.misses = {kind: 0 for kind in ttls}
+
+    def get(self, url: str, kind: str) -> Optional[Page]:
+        now = time.time()
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT content, encoding, stored_at, size FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row:
+                content, encoding, stored_at, size = row
+                if now - stored_at <= self.__ttls[kind]:
+                    self.__connection.execute(
+                        "UPDATE responses SET accessed_at = ? WHERE url = ?",
+                        (now, url),
+                    )
+                    self.hits[kind] += 1
+                    return Page(url, content, encoding)
+                # Expired
+                self.__connection.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self.__size_bytes -= size
+            self.misses[kind] += 1
+            return None
+
+    def put(self, page: Page, kind: str) -> None:
+        now = time.time()
+        size = len(page.content)
+        if size > self.__max_size_bytes:
+            return
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT size FROM responses WHERE url = ?", (page.url,)
+            ).fetchone()
+            if row:
+                self.__size_bytes -= row[0]
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (page.url, kind, page.content, page.encoding, now, now, size),
+            )
+            self.__size_bytes += size
+            self.__evict()
+
+    def __evict(self) -> None:
+        # Remove least recently used responses until we are under the size cap
+        while self.__size_bytes > self.__max_size_bytes:
+            rows = self.__connection.execute(
+                "SELECT url, size FROM responses ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for url, size in rows:
+                if self.__size_bytes <= self.__max_size_bytes:
+                    break
+                self.__connection.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self.__size_bytes -= size
+                _LOGGER.debug(f"Evicted cached response: {url}")
+
+    def summary(self) -> str:
+        parts = [
+            f"{kind}(Hits={self.hits[kind]} Misses={self.misses[kind]})"
+            for kind in self.__ttls
+        ]
+        return f"HTTP cache: {' '.join(parts)} Size={self.__size_bytes / 1e6:.1f}MB"
@@ -0,0 +1,58 @@
+import logging
+import threading
+from typing import Optional
+from backends.base import FailureReason, GetLyricsBase, LookupResult
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class GetLyricsLocal(GetLyricsBase):
+    """Lyrics already found in previous runs (or imported), from the local lyrics store"""
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.name = "local"
+        self.has_timestamps = True
+        self.sends_requests = False
+
+        if not args.lyrics_store:
+            raise ValueError(
+                "A lyrics store must be provided to use the local backend."
+            )
+        self.__store = args.lyrics_store
+
+    def search_lyrics(
+        self,
+        title_raw: str,
+        artist_raw: str,
+        duration_raw: str,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> LookupResult:
+        title, artist, duration = self.standardise(title_raw, artist_raw, duration_raw)
+        if not duration and self.validate_duration:
+            return LookupResult(None, FailureReason.INVALID_DURATION)
+        stored = self.__store.find(
+            title, artist, duration, self.has_timestamps, self.duration_padding
+        )
+        if not stored:
+            return LookupResult(None, FailureReason.NO_MATCHING_RESULT)
+        # Stored lyrics may not have a duration (e.g. imported), so check they fit this song
+        reason = self.check_lyrics(stored.lyrics, duration)
+        if reason:
+            return LookupResult(None, reason)
+        _LOGGER.debug(
+            f"{self.name}: Got lyrics for: {title} - {artist} (from {stored.source})"
+        )
+        return LookupResult(stored.lyrics)
+
+
+class GetLyricsLocalTxt(GetLyricsLocal):
+    """Lyrics without timestamps (e.g. from Genius) from the local lyrics store, tried before
+    the fallback backends"""
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.name = "local_txt"
+        self.has_timestamps = False
+        # Like the fallback backends, lyrics without timestamps fit any duration
+        self.validate_duration = False
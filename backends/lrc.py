@@ -0,0 +1,242 @@
+import re
+from array import array
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# A line's first two [mm:ss.xx] timestamps (if they're in that format), any other brackets at
+# the start of the line (timestamps and tags like [ar:Artist]) and the rest of the line
+_LINE_REGEX = re.compile(
+    r"^[ \t]*(?:\[(\d\d:\d\d)\.(\d\d)\](?:\[(\d\d:\d\d)\.(\d\d)\])?)?((?:\[[^\[\]\n]*\])*)([^\n]*)",
+    re.MULTILINE,
+)
+_PADDED = [f"{number:02d}" for number in range(100)]
+# "mm:ss" -> ms and "xx" (hundredths) -> ms, so parsing a timestamp is two lookups
+_MINS_SECS_MS = {
+    f"{mins}:{secs}": int(mins) * 60000 + int(secs) * 1000
+    for mins in _PADDED
+    for secs in _PADDED
+}
+_HUNDREDTHS_MS = {hundredths: int(hundredths) * 10 for hundredths in _PADDED}
+# Seconds (under 100 minutes) -> "mm:ss"
+_MINS_SECS_TEXT = [f"{mins}:{secs}" for mins in _PADDED for secs in _PADDED[:60]]
+# Contents of one [...]
+_BRACKET_REGEX = re.compile(r"\[([^\[\]]*)\]")
+# mm:ss, mm:ss.xx or mm:ss.xxx (some websites use : instead of .)
+_TIMESTAMP_REGEX = re.compile(r"(\d+):(\d{1,2})(?:[.:](\d{1,3}))?")
+_TIMESTAMPS_REGEX = re.compile(r"(?:\[\d+:\d{1,2}(?:[.:]\d{1,3})?\])+")
+_TAG_REGEX = re.compile(r"([A-Za-z#][\w#-]*):(.*)")
+
+# Time of lines without a timestamp (e.g. blank lines between verses)
+UNTIMED = -1
+
+
+def format_timestamp(time_ms: int, precision: int = 2) -> str:
+    mins, ms = divmod(time_ms, 60000)
+    secs, ms = divmod(ms, 1000)
+    if precision == 3:
+        return f"[{mins:02d}:{secs:02d}.{ms:03d}]"
+    if mins >= 100:
+        return f"[{mins}:{_PADDED[secs]}.{_PADDED[ms // 10]}]"
+    # Much faster than format specs (this is called for every line)
+    return f"[{_PADDED[mins]}:{_PADDED[secs]}.{_PADDED[ms // 10]}]"
+
+
+class LrcLyrics:
+    """Parsed LRC lyrics: a line's timestamp (in ms) is in `times` and its text is
+    text[offsets[i]:offsets[i + 1]], so even long lyrics are a few objects.
+
+    Tags (like [ar:Artist]) are kept in order. Lines with more than one timestamp (the same
+    line sung again) keep their other timestamps in `extra_times`.
+    """
+
+    __slots__ = ("tags", "times", "offsets", "text", "extra_times", "precise_lines")
+
+    def __init__(self):
+        self.tags: List[Tuple[str, str]] = []
+        self.times = array("l")
+        self.offsets = array("l", [0])
+        self.text = ""
+        # Line index -> its timestamps after the first
+        self.extra_times: Dict[int, List[int]] = {}
+        # Lines with a timestamp in milliseconds (serialised with 3 digits after the seconds)
+        self.precise_lines: Set[int] = set()
+
+    @classmethod
+    def parse(cls, lyrics: str, keep_extra_times: bool = True) -> "LrcLyrics":
+        """Parse LRC text in one pass over the lines"""
+        parsed = cls()
+        times = parsed.times
+        texts = []
+        # Looked up once as this loop runs for every line
+        add_time = times.append
+        add_text = texts.append
+        mins_secs_ms = _MINS_SECS_MS
+        hundredths_ms = _HUNDREDTHS_MS
+        extra_times = parsed.extra_times
+        for (
+            mins_secs,
+            hundredths,
+            mins_secs2,
+            hundredths2,
+            prefix,
+            text,
+        ) in _LINE_REGEX.findall(lyrics):
+            text = text.rstrip()
+            # Nearly every line starts with [mm:ss.xx] (some with a second one, e.g. when the
+            # line ends), which the regex has already split up
+            time_ms = UNTIMED
+            if mins_secs:
+                time_ms = mins_secs_ms[mins_secs] + hundredths_ms[hundredths]
+                if mins_secs2 and keep_extra_times:
+                    extra_times[len(times)] = [
+                        mins_secs_ms[mins_secs2] + hundredths_ms[hundredths2]
+                    ]
+            if prefix:
+                time_ms, rest = parsed.__parse_prefix(prefix, time_ms, keep_extra_times)
+                text = rest + text
+                if time_ms == UNTIMED and not text:
+                    # Only tags
+                    continue
+            elif time_ms == UNTIMED and not text and not times:
+                # Leading blank lines are just spacing
+                continue
+            add_time(time_ms)
+            add_text(text)
+
+        # Trailing blank lines are just spacing
+        while times and times[-1] == UNTIMED and not texts[-1]:
+            times.pop()
+            texts.pop()
+        parsed.offsets.extend(accumulate(map(len, texts)))
+        parsed.text = "".join(texts)
+        return parsed
+
+    def __parse_prefix(
+        self, prefix: str, time_ms: int, keep_extra_times: bool
+    ) -> Tuple[int, str]:
+        """Read the rest of the tags and timestamps at the start of a line (timestamps after
+        the first go in extra_times for the line about to be added).
+
+        Returns the line's first timestamp (or UNTIMED) and any of the prefix that's text.
+        """
+        if (
+            time_ms != UNTIMED
+            and not keep_extra_times
+            and _TIMESTAMPS_REGEX.fullmatch(prefix)
+        ):
+            # Only more timestamps, which aren't wanted
+            return time_ms, ""
+        index = len(self.times)
+        line_times = (
+            [] if time_ms == UNTIMED else [time_ms] + self.extra_times.get(index, [])
+        )
+        pos = 0
+        for match in _BRACKET_REGEX.finditer(prefix):
+            content = match.group(1)
+            timestamp = _TIMESTAMP_REGEX.fullmatch(content)
+            if timestamp:
+                mins, secs, fraction = timestamp.groups()
+                time_ms = int(mins) * 60000 + int(secs) * 1000
+                if fraction:
+                    if len(fraction) == 3:
+                        self.precise_lines.add(index)
+                    time_ms += int(fraction.ljust(3, "0"))
+                if not line_times or keep_extra_times:
+                    line_times.append(time_ms)
+            else:
+                tag = _TAG_REGEX.fullmatch(content)
+                if not tag:
+                    # Just text in brackets (e.g. [Chorus])
+                    break
+                self.tags.append((tag.group(1), tag.group(2).strip()))
+            pos = match.end()
+        if not line_times:
+            return UNTIMED, prefix[pos:]
+        if len(line_times) > 1:
+            self.extra_times[index] = line_times[1:]
+        return line_times[0], prefix[pos:]
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def line_text(self, index: int) -> str:
+        return self.text[self.offsets[index] : self.offsets[index + 1]]
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        """Timestamp (or UNTIMED) and text of each line"""
+        text = self.text
+        offsets = self.offsets
+        for index, time_ms in enumerate(self.times):
+            yield time_ms, text[offsets[index] : offsets[index + 1]]
+
+    def num_timed(self) -> int:
+        return len(self.times) - self.times.count(UNTIMED)
+
+    def last_time_ms(self) -> Optional[int]:
+        """Latest timestamp in the lyrics (None if there are none)"""
+        last = max(self.times, default=UNTIMED)
+        for line_times in self.extra_times.values():
+            last = max(last, *line_times)
+        return None if last == UNTIMED else last
+
+    def first_out_of_order(self) -> Optional[int]:
+        """Index of the first line timed before the line before it (None if they're all in order).
+
+        Only each line's first timestamp counts, as the others are repeats.
+        """
+        timed = [time_ms for time_ms in self.times if time_ms != UNTIMED]
+        if timed == sorted(timed):
+            # Nearly always, and much faster than checking each line
+            return None
+        previous = UNTIMED
+        for index, time_ms in enumerate(self.times):
+            if time_ms == UNTIMED:
+                continue
+            if time_ms < previous:
+                return index
+            previous = time_ms
+        return None
+
+    def serialise(self) -> str:
+        lines = [f"[{key}:{value}]" for key, value in self.tags]
+        # Looked up once as this loop runs for every line
+        add_line = lines.append
+        padded = _PADDED
+        mins_secs_text = _MINS_SECS_TEXT
+        text = self.text
+        offsets = self.offsets
+        extra_times = self.extra_times
+        precise_lines = self.precise_lines
+        for index, time_ms in enumerate(self.times):
+            line = text[offsets[index] : offsets[index + 1]]
+            if time_ms == UNTIMED:
+                add_line(line)
+            elif index in extra_times or index in precise_lines or time_ms >= 6000000:
+                precision = 3 if index in precise_lines else 2
+                timestamps = [time_ms] + extra_times.get(index, [])
+                add_line(
+                    "".join(format_timestamp(t, precision) for t in timestamps) + line
+                )
+            else:
+                # [mm:ss.xx] inlined (much faster than format_timestamp for every line)
+                add_line(
+                    f"[{mins_secs_text[time_ms // 1000]}.{padded[time_ms % 1000 // 10]}]{line}"
+                )
+        # No newline after the last line (like the websites)
+        return "\n".join(lines)
+
+
+def find_sync_problem(
+    lyrics: LrcLyrics, duration_secs: Optional[int], padding_secs: float
+) -> Optional[str]:
+    """Why the timestamps can't be right for the song (None if they look fine)"""
+    if not lyrics.num_timed():
+        return "No timestamps"
+    index = lyrics.first_out_of_order()
+    if index is not None:
+        return f"Timestamps go backwards at line {index + 1}: {lyrics.line_text(index)}"
+    if duration_secs:
+        last_secs = lyrics.last_time_ms() / 1000
+        if last_secs > duration_secs + padding_secs:
+            return f"Last timestamp ({last_secs:.2f}s) is after the end of the song ({duration_secs}s)"
+    return None
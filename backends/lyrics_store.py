@@ -0,0 +1,326 @@
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from backends.normaliser import (
+    DEFAULT_IGNORE_KEYWORDS_IN_TITLE_BRACKETS,
+    DEFAULT_REMOVE_WORDS_FROM_TITLE_ARTIST,
+    get_normaliser,
+)
+from backends.scoring import rank_candidates
+
+_LOGGER = logging.getLogger(__name__)
+
+# Close enough for the full text search to count a stored song as the same song
+_SEARCH_MIN_CONFIDENCE = 0.8
+_SEARCH_LIMIT = 20
+# Words of the title and artist searched for (so a long title can't make a slow query)
+_SEARCH_MAX_WORDS = 8
+
+
+class StoredLyrics(NamedTuple):
+    title: str
+    artist: str
+    duration_secs: Optional[int]
+    lyrics: str
+    has_timestamps: bool
+    # Backend the lyrics came from
+    source: str
+
+
+class LyricsStore:
+    """Lyrics found in every run, keyed on the standardised title and artist (and duration).
+
+    Exact matches are found with an index, and close matches (e.g. the stored title has extra
+    words) with a full text index on the standardised title and artist.
+
+    Lookups each use a read only connection (kept for the next lookup), so they never wait
+    for each other or for lyrics being added.
+    """
+
+    def __init__(self, path: Path):
+        # Same standardising as the backends' defaults, whichever backend found the lyrics
+        self.__normaliser = get_normaliser(
+            DEFAULT_IGNORE_KEYWORDS_IN_TITLE_BRACKETS,
+            DEFAULT_REMOVE_WORDS_FROM_TITLE_ARTIST,
+        )
+        self.__path = path
+        # Writes and the counters (lookups don't take it)
+        self.__lock = threading.Lock()
+        # Read only connections not being used by a lookup
+        self.__idle_readers: List[sqlite3.Connection] = []
+        self.__connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute("""CREATE TABLE IF NOT EXISTS lyrics (
+                id INTEGER PRIMARY KEY,
+                std_title TEXT NOT NULL,
+                std_artist TEXT NOT NULL,
+                duration_secs INTEGER,
+                has_timestamps INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                artist TEXT NOT NULL,
+                lyrics TEXT NOT NULL,
+                source TEXT NOT NULL,
+                stored_at REAL NOT NULL
+            )""")
+        # NULL durations aren't equal to each other, so they'd never clash
+        self.__connection.execute(
+            """CREATE UNIQUE INDEX IF NOT EXISTS lyrics_song ON lyrics (
+                std_title, std_artist, has_timestamps, IFNULL(duration_secs, -1)
+            )"""
+        )
+        # Only the standardised names are searched, so the index keeps its own copy of them
+        self.__connection.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS lyrics_search USING fts5(std_title, std_artist)"
+        )
+        self.hits = 0
+        self.search_hits = 0
+        self.misses = 0
+        self.added = 0
+
+    def add(
+        self,
+        title: str,
+        artist: str,
+        duration_secs: Optional[int],
+        lyrics: str,
+        has_timestamps: bool,
+        source: str,
+    ) -> None:
+        """Store the lyrics (replacing any already stored for the song)"""
+        self.add_many(
+            [StoredLyrics(title, artist, duration_secs, lyrics, has_timestamps, source)]
+        )
+
+    def add_many(self, songs: Iterable[StoredLyrics]) -> int:
+        """Store lots of lyrics in one transaction. Returns how many were stored"""
+        now = time.time()
+        count = 0
+        with self.__lock:
+            self.__connection.execute("BEGIN")
+            try:
+                for song in songs:
+                    std_title = self.__normaliser.standardise_title(song.title)
+                    std_artist = self.__normaliser.standardise_artist(song.artist)
+                    if not std_title or not std_artist or not song.lyrics:
+                        # Can't be looked up
+                        continue
+                    self.__put(std_title, std_artist, song, now)
+                    count += 1
+                self.__connection.execute("COMMIT")
+            except BaseException:
+                self.__connection.execute("ROLLBACK")
+                raise
+            self.added += count
+        return count
+
+    def __put(
+        self, std_title: str, std_artist: str, song: StoredLyrics, now: float
+    ) -> None:
+        row = self.__connection.execute(
+            """SELECT id FROM lyrics WHERE std_title = ? AND std_artist = ?
+                AND has_timestamps = ? AND IFNULL(duration_secs, -1) = IFNULL(?, -1)""",
+            (std_title, std_artist, song.has_timestamps, song.duration_secs),
+        ).fetchone()
+        if row:
+            # Same standardised names, so the search index doesn't change
+            self.__connection.execute(
+                """UPDATE lyrics SET title = ?, artist = ?, lyrics = ?, source = ?, stored_at = ?
+                    WHERE id = ?""",
+                (song.title, song.artist, song.lyrics, song.source, now, row[0]),
+            )
+            return
+        cursor = self.__connection.execute(
+            """INSERT INTO lyrics (
+                    std_title, std_artist, duration_secs, has_timestamps,
+                    title, artist, lyrics, source, stored_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                std_title,
+                std_artist,
+                song.duration_secs,
+                song.has_timestamps,
+                song.title,
+                song.artist,
+                song.lyrics,
+                song.source,
+                now,
+            ),
+        )
+        self.__connection.execute(
+            "INSERT INTO lyrics_search (rowid, std_title, std_artist) VALUES (?, ?, ?)",
+            (cursor.lastrowid, std_title, std_artist),
+        )
+
+    def find(
+        self,
+        std_title: str,
+        std_artist: str,
+        duration_secs: Optional[int],
+        has_timestamps: bool,
+        duration_padding: float,
+    ) -> Optional[StoredLyrics]:
+        """Best stored lyrics for the (standardised) song, or None.
+
+        Lyrics stored without a duration match any duration (the caller should check they fit).
+        """
+        reader = self.__take_reader()
+        try:
+            rows = reader.execute(
+                """SELECT duration_secs, title, artist, lyrics, source FROM lyrics
+                    WHERE std_title = ? AND std_artist = ? AND has_timestamps = ?""",
+                (std_title, std_artist, has_timestamps),
+            ).fetchall()
+            stored = self.__closest(
+                rows, duration_secs, has_timestamps, duration_padding
+            )
+            if stored:
+                with self.__lock:
+                    self.hits += 1
+                return stored
+            stored = self.__search(
+                reader,
+                std_title,
+                std_artist,
+                duration_secs,
+                has_timestamps,
+                duration_padding,
+            )
+        finally:
+            with self.__lock:
+                self.__idle_readers.append(reader)
+        with self.__lock:
+            if stored:
+                self.search_hits += 1
+            else:
+                self.misses += 1
+        return stored
+
+    def __take_reader(self) -> sqlite3.Connection:
+        with self.__lock:
+            if self.__idle_readers:
+                return self.__idle_readers.pop()
+        return sqlite3.connect(
+            f"{self.__path.resolve().as_uri()}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+        )
+
+    def __closest(
+        self,
+        rows: List[tuple],
+        duration_secs: Optional[int],
+        has_timestamps: bool,
+        duration_padding: float,
+    ) -> Optional[StoredLyrics]:
+        best = None
+        best_distance = None
+        for stored_secs, title, artist, lyrics, source in rows:
+            if stored_secs is None:
+                # Could be any version of the song, so only if there's nothing better
+                distance = duration_padding + 1
+            elif duration_secs:
+                distance = abs(stored_secs - duration_secs)
+                if distance > duration_padding:
+                    continue
+            else:
+                distance = 0
+            if best_distance is None or distance < best_distance:
+                best = StoredLyrics(
+                    title, artist, stored_secs, lyrics, has_timestamps, source
+                )
+                best_distance = distance
+        return best
+
+    def __search(
+        self,
+        reader: sqlite3.Connection,
+        std_title: str,
+        std_artist: str,
+        duration_secs: Optional[int],
+        has_timestamps: bool,
+        duration_padding: float,
+    ) -> Optional[StoredLyrics]:
+        # Every word of the title and any word of the artist, so only a few rows match, fewest
+        # extra words first (the scoring decides if they're close enough).
+        # Standardised names are only letters, digits and spaces so the words can be quoted as is
+        title_words = list(dict.fromkeys(std_title.split()))[:_SEARCH_MAX_WORDS]
+        artist_words = list(dict.fromkeys(std_artist.split()))[:_SEARCH_MAX_WORDS]
+        if not title_words or not artist_words:
+            return None
+        query = "std_title : ({}) AND std_artist : ({})".format(
+            " AND ".join(f'"{word}"' for word in title_words),
+            " OR ".join(f'"{word}"' for word in artist_words),
+        )
+        rows = reader.execute(
+            """SELECT lyrics.id, lyrics.std_title, lyrics.std_artist, lyrics.duration_secs
+                FROM lyrics_search JOIN lyrics ON lyrics.id = lyrics_search.rowid
+                WHERE lyrics_search MATCH ? AND lyrics.has_timestamps = ?
+                ORDER BY LENGTH(lyrics.std_title) LIMIT ?""",
+            (query, has_timestamps, _SEARCH_LIMIT),
+        ).fetchall()
+        # Scored like search results on the websites (so e.g. a live version doesn't match)
+        results = []
+        for row_id, title, artist, stored_secs in rows:
+            if duration_secs and stored_secs is not None:
+                if abs(stored_secs - duration_secs) > duration_padding:
+                    continue
+            results.append((str(row_id), f"{title} {artist}"))
+        ranked = rank_candidates(
+            std_title,
+            std_artist,
+            None,
+            results,
+            self.__normaliser,
+            "",
+            duration_padding,
+            _SEARCH_MIN_CONFIDENCE,
+        )
+        if not ranked.candidates:
+            return None
+        best_id = int(ranked.candidates[0].link)
+        row = reader.execute(
+            "SELECT title, artist, duration_secs, lyrics, has_timestamps, source FROM lyrics WHERE id = ?",
+            (best_id,),
+        ).fetchone()
+        title, artist, stored_secs, lyrics, stored_has_timestamps, source = row
+        return StoredLyrics(
+            title, artist, stored_secs, lyrics, bool(stored_has_timestamps), source
+        )
+
+    def __iter__(self) -> Iterator[StoredLyrics]:
+        """All the stored lyrics, leaving out lyrics without timestamps if the song has them with timestamps"""
+        with self.__lock:
+            rows = self.__connection.execute(
+                """SELECT title, artist, duration_secs, lyrics, has_timestamps, source
+                FROM lyrics AS song WHERE has_timestamps OR NOT EXISTS (
+                    SELECT 1 FROM lyrics WHERE std_title = song.std_title
+                        AND std_artist = song.std_artist AND has_timestamps
+                ) ORDER BY std_artist, std_title"""
+            ).fetchall()
+        for title, artist, duration_secs, lyrics, has_timestamps, source in rows:
+            yield StoredLyrics(
+                title, artist, duration_secs, lyrics, bool(has_timestamps), source
+            )
+
+    def count(self) -> int:
+        with self.__lock:
+            return self.__connection.execute("SELECT COUNT(*) FROM lyrics").fetchone()[
+                0
+            ]
+
+    def summary(self) -> str:
+        return f"Lyrics store: Songs={self.count()} Hits={self.hits} SearchHits={self.search_hits} Misses={self.misses} Added={self.added}"
+
+    def close(self) -> None:
+        with self.__lock:
+            for reader in self.__idle_readers:
+                reader.close()
+            self.__idle_readers = []
+            self.__connection.close()
@@ -0,0 +1,125 @@
+import threading
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence
+
+# Kinds of time spent by a backend
+NETWORK = "network"
+PARSE = "parse"
+GET_LINK = "get_link"
+GET_LYRICS = "get_lyrics"
+TIME_KINDS = [NETWORK, PARSE, GET_LINK, GET_LYRICS]
+
+# Status of requests that didn't get a response (connection errors, timeouts...)
+NO_RESPONSE = "error"
+# Lookups that were stopped because another backend already got lyrics
+CANCELLED = "cancelled"
+
+PERCENTILES = [50, 95, 99]
+
+
+def percentile(values: Sequence[float], percent: float) -> float:
+    """Nearest rank percentile of already sorted values (0 if there are none)"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarise_latencies(values: Sequence[float]) -> Dict[str, float]:
+    values = sorted(values)
+    summary = {f"p{percent}": percentile(values, percent) for percent in PERCENTILES}
+    summary["max"] = values[-1] if values else 0.0
+    return summary
+
+
+class BackendMetrics:
+    """What a backend has done during a run, summed across threads"""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__secs: Dict[str, float] = {kind: 0.0 for kind in TIME_KINDS}
+        self.__counts: Dict[str, int] = {kind: 0 for kind in TIME_KINDS}
+        self.__statuses = Counter()
+        self.__failures = Counter()
+        self.__bytes_downloaded = 0
+        self.__cache_hits = 0
+        self.__retries = 0
+        self.__lookups = 0
+        self.__found = 0
+        # Doubles (rather than a list of floats) so long runs don't use much memory
+        self.__request_secs = array("d")
+        self.__lookup_secs = array("d")
+
+    @contextmanager
+    def timed(self, kind: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(kind, time.perf_counter() - start_time)
+
+    def add(self, kind: str, secs: float) -> None:
+        with self.__lock:
+            self.__secs[kind] = self.__secs.get(kind, 0.0) + secs
+            self.__counts[kind] = self.__counts.get(kind, 0) + 1
+
+    def record_request(
+        self, status: Optional[int], num_bytes: int, secs: float
+    ) -> None:
+        """A request to the website (status is None if there was no response)"""
+        self.add(NETWORK, secs)
+        with self.__lock:
+            self.__statuses[str(status) if status else NO_RESPONSE] += 1
+            self.__bytes_downloaded += num_bytes
+            self.__request_secs.append(secs)
+
+    def record_retry(self) -> None:
+        with self.__lock:
+            self.__retries += 1
+
+    def record_cache_hit(self) -> None:
+        with self.__lock:
+            self.__cache_hits += 1
+
+    def record_lookup(self, found: bool, failure: Optional[str], secs: float) -> None:
+        """A song looked up on the backend (failure is None if it was cancelled)"""
+        with self.__lock:
+            self.__lookups += 1
+            if found:
+                self.__found += 1
+            else:
+                self.__failures[failure or CANCELLED] += 1
+            self.__lookup_secs.append(secs)
+
+    def secs(self, kind: str) -> float:
+        with self.__lock:
+            return self.__secs.get(kind, 0.0)
+
+    def count(self, kind: str) -> int:
+        with self.__lock:
+            return self.__counts.get(kind, 0)
+
+    def snapshot(self) -> dict:
+        """All the metrics as plain JSON serialisable values"""
+        with self.__lock:
+            snapshot = {
+                "lookups": self.__lookups,
+                "found": self.__found,
+                "hit_rate": self.__found / self.__lookups if self.__lookups else 0.0,
+                "failures": dict(self.__failures),
+                "requests": self.__counts[NETWORK],
+                "retries": self.__retries,
+                "cache_hits": self.__cache_hits,
+                "statuses": dict(self.__statuses),
+                "bytes_downloaded": self.__bytes_downloaded,
+                "time_secs": dict(self.__secs),
+            }
+            request_secs = self.__request_secs[:]
+            lookup_secs = self.__lookup_secs[:]
+        # Sorting can take a while so don't hold up the workers
+        snapshot["request_latency_secs"] = summarise_latencies(request_secs)
+        snapshot["lookup_latency_secs"] = summarise_latencies(lookup_secs)
+        return snapshot
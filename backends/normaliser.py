@@ -0,0 +1,107 @@
+import re
+from functools import lru_cache
+from string import ascii_letters, digits
+from typing import Optional, Tuple
+
+_BRACKETS_REGEXES = (re.compile(r"\(.*?\)"), re.compile(r"\[.*?\]"))
+_NON_ALPHANUMERIC_REGEX = re.compile(r"[^A-Za-z0-9]+")
+_TIME_STR_REGEX = re.compile(r"^(\d{2}):(\d{2}):(\d{2})$")
+
+# Remove quotes and replace any other punctuation/whitespace with a space.
+# Most titles are ASCII so they go through the (much faster) bytes translate
+_QUOTES = "’`'\""
+_ASCII_PUNCTUATION_TABLE = bytes(
+    byte if chr(byte) in ascii_letters + digits else ord(" ") for byte in range(256)
+)
+_ASCII_QUOTES = b"`'\""
+_PUNCTUATION_TABLE = str.maketrans({char: None for char in _QUOTES})
+
+# Default settings of the backends (see GetLyricsBase)
+DEFAULT_IGNORE_KEYWORDS_IN_TITLE_BRACKETS = (
+    "feat",
+    "acoustic",
+    "bonus",
+    "from",
+    "version",
+    "cover",
+    "live",
+    "remix",
+    "theme",
+    "official",
+    "explicit",
+)
+DEFAULT_REMOVE_WORDS_FROM_TITLE_ARTIST = ("a", "the", "of")
+
+
+class Normaliser:
+    """Standardises titles and artists so they can be compared across websites"""
+
+    def __init__(
+        self,
+        ignore_keywords_in_title_brackets: Tuple[str, ...],
+        remove_words_from_title_artist: Tuple[str, ...],
+    ):
+        self.__keywords_regex = None
+        if ignore_keywords_in_title_brackets:
+            self.__keywords_regex = re.compile(
+                "|".join(map(re.escape, ignore_keywords_in_title_brackets))
+            )
+        self.__remove_words = frozenset(remove_words_from_title_artist)
+        # Every backend standardises the same song, so remember the results
+        self.standardise = lru_cache(maxsize=2**16)(self.__standardise)
+
+    def remove_punctuation(self, string: str) -> str:
+        if string.isascii():
+            string = (
+                string.encode("ascii")
+                .translate(_ASCII_PUNCTUATION_TABLE, _ASCII_QUOTES)
+                .decode("ascii")
+            )
+        else:
+            string = _NON_ALPHANUMERIC_REGEX.sub(
+                " ", string.translate(_PUNCTUATION_TABLE)
+            )
+        return " ".join(
+            part for part in string.split() if part not in self.__remove_words
+        )
+
+    def standardise_title(self, title: str) -> str:
+        title = title.strip().lower()
+        if self.__keywords_regex and ("(" in title or "[" in title):
+            brackets = _BRACKETS_REGEXES[0].findall(title)
+            brackets += _BRACKETS_REGEXES[1].findall(title)
+            for bracket in brackets:
+                if self.__keywords_regex.search(bracket):
+                    title = title.replace(bracket, "")
+        return self.remove_punctuation(title)
+
+    def standardise_artist(self, artist: str) -> str:
+        artist = artist.strip().lower()
+        if ";" in artist:  # Remove multiple artists
+            artist = artist.split(";")[0].strip()
+        return self.remove_punctuation(artist)
+
+    def get_secs_from_time_str(self, duration: str) -> Optional[int]:
+        match = _TIME_STR_REGEX.match(duration.strip())
+        if not match:
+            return None
+        hours, mins, secs = match.groups()
+        return int(hours) * 3600 + int(mins) * 60 + int(secs)
+
+    def __standardise(
+        self, title: str, artist: str, duration: str
+    ) -> Tuple[str, str, Optional[int]]:
+        return (
+            self.standardise_title(title),
+            self.standardise_artist(artist),
+            self.get_secs_from_time_str(duration),
+        )
+
+
+@lru_cache(maxsize=None)
+def get_normaliser(
+    ignore_keywords_in_title_brackets: Tuple[str, ...],
+    remove_words_from_title_artist: Tuple[str, ...],
+) -> Normaliser:
+    """Backends with the same settings share a normaliser (and its remembered results)"""
+    return Normaliser(ignore_keywords_in_title_brackets, remove_words_from_title_artist)
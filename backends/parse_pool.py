@@ -0,0 +1,57 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, List
+
+if TYPE_CHECKING:
+    from backends.base import GetLyricsBase
+
+_LOGGER = logging.getLogger(__name__)
+
+# Copies of the backends in each parse process (set up once when the process starts)
+_BACKENDS: Dict[str, "GetLyricsBase"] = {}
+
+
+def _init_process(backends: List["GetLyricsBase"], log_level: int) -> None:
+    logging.basicConfig(level=log_level)
+    for backend in backends:
+        _BACKENDS[backend.name] = backend
+
+
+def _parse(backend_name: str, method_name: str, args: tuple):
+    return getattr(_BACKENDS[backend_name], method_name)(*args)
+
+
+class ParsePool:
+    """Parses pages (and checks the results) in separate processes, so parsing doesn't hold the
+    GIL while the worker threads are waiting on websites.
+
+    Each process gets its own copy of the backends when it starts (see GetLyricsBase.__getstate__),
+    so only the page and the song are sent for each parse.
+    """
+
+    def __init__(self, backends: List["GetLyricsBase"], processes: int):
+        if processes < 1:
+            raise ValueError("Number of parse processes must be at least 1")
+        # Only scraping backends parse pages (e.g. Genius uses an API client)
+        parse_backends = [b for b in backends if b.lyrics_strainer_args]
+        # Forking a process with threads running isn't safe, so start fresh ones
+        self.__executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process,
+            initargs=(parse_backends, logging.getLogger().getEffectiveLevel()),
+        )
+        self.processes = processes
+        for backend in parse_backends:
+            backend.parse_pool = self
+        _LOGGER.debug(
+            f"Parsing pages in {processes} processes for: {', '.join(b.name for b in parse_backends)}"
+        )
+
+    def run(self, backend_name: str, method_name: str, args: tuple):
+        """Call the backend's method in a parse process and wait for the result (or exception)"""
+        return self.__executor.submit(_parse, backend_name, method_name, args).result()
+
+    def close(self) -> None:
+        self.__executor.shutdown()
@@ -0,0 +1,66 @@
+import threading
+import time
+from typing import Optional
+
+# When a website throttles us, halve the rate (but not below this fraction of the limit)
+_MIN_RATE_FRACTION = 0.05
+# Then win back this fraction of the limit for each successful request
+_RECOVERY_FRACTION = 0.02
+
+
+class RateLimiter:
+    """Caps the number of concurrent requests and the requests per second sent to one website.
+
+    The rate backs off when the website starts throttling us and slowly recovers afterwards.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_second: Optional[float]):
+        if max_concurrency < 1:
+            raise ValueError("Backend concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.__semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.__lock = threading.Lock()
+        self.__next_request_time = 0.0
+        self.__rate = requests_per_second
+
+    @property
+    def current_rate(self) -> Optional[float]:
+        with self.__lock:
+            return self.__rate
+
+    def __enter__(self) -> "RateLimiter":
+        self.__semaphore.acquire()
+        # Reserve the next free slot then wait for it outside of the lock
+        with self.__lock:
+            now = time.monotonic()
+            request_time = max(now, self.__next_request_time)
+            if self.__rate:
+                self.__next_request_time = request_time + 1 / self.__rate
+        if request_time > now:
+            time.sleep(request_time - now)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.__semaphore.release()
+
+    def throttled(self, retry_after_secs: Optional[float] = None) -> None:
+        """The website said we're sending too many requests (e.g. 429 or 503)"""
+        with self.__lock:
+            if self.requests_per_second:
+                self.__rate = max(
+                    self.requests_per_second * _MIN_RATE_FRACTION, self.__rate / 2
+                )
+            if retry_after_secs:
+                # Nobody should send anything until the website is ready again
+                self.__next_request_time = max(
+                    self.__next_request_time, time.monotonic() + retry_after_secs
+                )
+
+    def succeeded(self) -> None:
+        with self.__lock:
+            if self.requests_per_second and self.__rate < self.requests_per_second:
+                self.__rate = min(
+                    self.requests_per_second,
+                    self.__rate + self.requests_per_second * _RECOVERY_FRACTION,
+                )
@@ -1,6 +1,7 @@
 import logging
-import re
+from typing import Optional, Tuple
 from backends.base import GetLyricsBase
+from backends.lrc import LrcLyrics
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,29 +23,13 @@ class GetLyricsRCLyricsBand(GetLyricsBase):
         }
 
     def scrub_lyrics(self, lyrics: str) -> str:
-        lines = lyrics.split("\n")
-
-        # Split first line of lyrics from information
-        indexes = [pos for pos, char in enumerate(lines[0]) if char == "["]
-        first_line_index = indexes[-2]
-        info = lines[0][:first_line_index]
-        first_line = lines[0][first_line_index:]
-        lines[0] = first_line
-
-        for count, line in enumerate(lines):
-            # Remove extra website labels
-            lines[count] = line.replace("[re:www.rclyricsband.com]", "")
-
-            # Remove second time stamp (to match other backends)
-            # Happy to remove if others want this second timestamp
-            second_timestamp = lines[count][10:20]
-            if re.match(rf"^{self.time_regex}$", second_timestamp):
-                lines[count] = lines[count].replace(second_timestamp, "")
-
-        # Add back in info sections split into new lines
-        info_indexes = indexes[1:-2]
-        for index in info_indexes[::-1]:
-            lines.insert(0, info[index:])
-            info = info[:index]
-
-        return "\n".join(lines)
+        return self.scrub_and_parse_lyrics(lyrics)[0]
+
+    def scrub_and_parse_lyrics(self, lyrics: str) -> Tuple[str, Optional[LrcLyrics]]:
+        # Remove extra website labels (can be in the middle of lines too)
+        lyrics = lyrics.replace("[re:www.rclyricsband.com]", "")
+        # Info tags (on the same line as the first lyrics) go on their own lines.
+        # Remove second time stamp (to match other backends)
+        # Happy to keep it if others want this second timestamp
+        parsed = LrcLyrics.parse(lyrics, keep_extra_times=False)
+        return parsed.serialise(), parsed
@@ -0,0 +1,122 @@
+import re
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Pattern, Tuple
+
+from backends.normaliser import Normaliser
+
+# Words that usually mean a different recording to the one asked for
+PENALTY_KEYWORDS = frozenset(
+    ["live", "remix", "cover", "karaoke", "instrumental", "acoustic", "demo", "medley"]
+)
+KEYWORD_PENALTY = 0.2
+# Max penalty for a result that is as far away from the duration as allowed
+DURATION_PENALTY = 0.1
+
+
+class Candidate(NamedTuple):
+    link: str
+    text: str
+    # 1 means every word of the title and artist was found (with no penalties)
+    confidence: float
+    # Fraction of the result's words that are in the title and artist
+    precision: float
+    duration_distance: Optional[float]
+
+
+class RankedCandidates(NamedTuple):
+    # Best first, only includes candidates above the confidence threshold
+    candidates: List[Candidate]
+    num_results: int
+    # Results that matched the song but not its duration
+    num_duration_mismatches: int
+
+
+@lru_cache(maxsize=None)
+def compile_time_regex(time_regex: str) -> Pattern:
+    return re.compile(time_regex)
+
+
+def get_result_secs(time_pattern: Pattern, result_str: str) -> Optional[float]:
+    # Use the last time stamp in the result
+    last_match = None
+    for last_match in time_pattern.finditer(result_str):
+        pass
+    if not last_match:
+        return None
+    mins, secs = last_match.groups()
+    return int(mins) * 60 + float(secs)
+
+
+def rank_candidates(
+    title: str,
+    artist: str,
+    duration_secs: Optional[int],
+    results: Iterable[Tuple[str, str]],
+    normaliser: Normaliser,
+    time_regex: str,
+    duration_padding: float,
+    min_confidence: float,
+) -> RankedCandidates:
+    """Score every (link, text) search result against the song in one go.
+
+    Title and artist are standardised, so results are tokenised the same way.
+    Durations are only checked when duration_secs is given.
+    """
+    title_tokens = set(title.split())
+    artist_tokens = set(artist.split())
+    song_tokens = title_tokens | artist_tokens
+    time_pattern = compile_time_regex(time_regex)
+
+    candidates = []
+    num_results = 0
+    num_duration_mismatches = 0
+    for link, text in results:
+        num_results += 1
+        result_tokens = set(normaliser.remove_punctuation(text.lower()).split())
+        if not result_tokens:
+            continue
+
+        # Title and artist count equally, so a result can't match on the title alone
+        confidence = 0.0
+        for tokens in (title_tokens, artist_tokens):
+            if tokens:
+                confidence += len(tokens & result_tokens) / len(tokens) / 2
+            else:
+                confidence += 0.5
+        confidence -= KEYWORD_PENALTY * len(
+            (result_tokens & PENALTY_KEYWORDS) - song_tokens
+        )
+
+        if confidence < min_confidence:
+            continue
+
+        duration_distance = None
+        if duration_secs:
+            result_secs = get_result_secs(time_pattern, text)
+            if result_secs is None:
+                num_duration_mismatches += 1
+                continue
+            duration_distance = abs(result_secs - duration_secs)
+            if duration_distance > duration_padding:
+                num_duration_mismatches += 1
+                continue
+            if duration_padding:
+                confidence -= DURATION_PENALTY * duration_distance / duration_padding
+            if confidence < min_confidence:
+                continue
+
+        precision = len(result_tokens & song_tokens) / len(result_tokens)
+        candidates.append(
+            Candidate(link, text, confidence, precision, duration_distance)
+        )
+
+    candidates.sort(key=lambda c: (c.confidence, c.precision), reverse=True)
+    # Search pages can link the same lyrics page more than once (e.g. a post's title
+    # and its "read more"), so only keep the best scoring result for each link
+    seen_links = set()
+    unique_candidates = []
+    for candidate in candidates:
+        if candidate.link not in seen_links:
+            seen_links.add(candidate.link)
+            unique_candidates.append(candidate)
+    return RankedCandidates(unique_candidates, num_results, num_duration_mismatches)
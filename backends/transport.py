@@ -0,0 +1,130 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+
+from backends.metrics import BackendMetrics
+from backends.rate_limiter import RateLimiter
+
+_LOGGER = logging.getLogger(__name__)
+
+# Worth trying again (the website is busy rather than the page being wrong)
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+# Statuses that mean we're sending too many requests
+THROTTLE_STATUSES = frozenset([429, 503])
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (either seconds or an HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_time = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_time.tzinfo is None:
+        retry_time = retry_time.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_time - datetime.now(timezone.utc)).total_seconds())
+
+
+class Transport:
+    """One connection pool shared by all scraping backends, with retries and backoff"""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        timeout_secs: float = 30,
+        backoff_secs: float = 1,
+        max_backoff_secs: float = 30,
+        max_retry_after_secs: float = 120,
+    ):
+        self.max_retries = max_retries
+        self.timeout_secs = timeout_secs
+        self.backoff_secs = backoff_secs
+        self.max_backoff_secs = max_backoff_secs
+        self.max_retry_after_secs = max_retry_after_secs
+        self.__session = requests.Session()
+        # Uses brotli too if it's installed
+        self.__session.headers["accept-encoding"] = ACCEPT_ENCODING
+        self.__lock = threading.Lock()
+        self.__pool_sizes: Dict[str, int] = {}
+
+    def register(self, base_url: str, max_concurrency: int) -> None:
+        """Keep enough connections alive for every concurrent request to the website"""
+        with self.__lock:
+            if self.__pool_sizes.get(base_url, 0) >= max_concurrency:
+                return
+            self.__pool_sizes[base_url] = max_concurrency
+            # Retries are done here instead, so the rate limiter knows about them
+            adapter = HTTPAdapter(pool_maxsize=max_concurrency, max_retries=0)
+            self.__session.mount(base_url, adapter)
+
+    def __backoff(self, attempt: int) -> float:
+        # Full jitter so retries from different threads don't all line up
+        return random.uniform(
+            0, min(self.max_backoff_secs, self.backoff_secs * 2**attempt)
+        )
+
+    def get(
+        self,
+        url: str,
+        headers: dict,
+        rate_limiter: RateLimiter,
+        metrics: BackendMetrics,
+    ) -> requests.Response:
+        """Get the URL, retrying connection errors and busy responses.
+
+        Returns the last response (even if it's an error), or raises the last connection error.
+        """
+        attempt = 0
+        while True:
+            with rate_limiter:
+                start_time = time.perf_counter()
+                try:
+                    response = self.__session.get(
+                        url, headers=headers, timeout=self.timeout_secs
+                    )
+                except (requests.ConnectionError, requests.Timeout) as ex:
+                    metrics.record_request(None, 0, time.perf_counter() - start_time)
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self.__backoff(attempt)
+                    _LOGGER.debug(f"Retrying {url} in {delay:.1f}s: {ex}")
+                else:
+                    metrics.record_request(
+                        response.status_code,
+                        len(response.content),
+                        time.perf_counter() - start_time,
+                    )
+                    if response.status_code not in RETRY_STATUSES:
+                        rate_limiter.succeeded()
+                        return response
+                    retry_after = parse_retry_after(response.headers.get("retry-after"))
+                    if response.status_code in THROTTLE_STATUSES:
+                        rate_limiter.throttled(
+                            min(retry_after, self.max_retry_after_secs)
+                            if retry_after is not None
+                            else None
+                        )
+                    if attempt >= self.max_retries:
+                        return response
+                    delay = self.__backoff(attempt)
+                    if retry_after is not None:
+                        delay = max(delay, min(retry_after, self.max_retry_after_secs))
+                    _LOGGER.debug(
+                        f"Retrying {url} in {delay:.1f}s: Status {response.status_code}"
+                    )
+            metrics.record_retry()
+            attempt += 1
+            # Sleep without holding up other requests to the website
+            time.sleep(delay)
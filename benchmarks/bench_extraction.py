@@ -0,0 +1,120 @@
+"""Compare the lxml extraction path against full BeautifulSoup parses for each backend.
+
+Uses the saved search and lyrics pages in benchmarks/fixtures/<backend>/.
+
+Run from the repository root: python -m benchmarks.bench_extraction
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from backends import helpers
+from backends.extraction import extract_links, extract_text
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+_ENCODING = "utf-8"
+# Title and artist of a song on every fixture's search page
+_SONG = ("Hello", "Adele")
+
+
+def _legacy_links(
+    content: bytes, container_args: dict, result_args: dict
+) -> List[Tuple[str, str]]:
+    # What get_link used to do with response.text
+    strainer = SoupStrainer(**container_args)
+    parsed_html = BeautifulSoup(content.decode(_ENCODING), "lxml", parse_only=strainer)
+    return [
+        (result.get_attribute_list(key="href")[0], result.text.strip())
+        for result in parsed_html.find_all(**result_args)
+    ]
+
+
+def _legacy_text(content: bytes, strainer_args: dict) -> str:
+    strainer = SoupStrainer(**strainer_args)
+    result = BeautifulSoup(content.decode(_ENCODING), "lxml", parse_only=strainer)
+    return result.get_text(separator="\n", strip=True)
+
+
+def _time(function: Callable, iterations: int) -> Tuple[float, object]:
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        result = function()
+    return (time.perf_counter() - start_time) / iterations, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-i",
+        "--iterations",
+        help="Times each page is parsed.",
+        type=int,
+        default=200,
+    )
+    args = parser.parse_args()
+
+    mismatches = []
+    for backend_dir in sorted(FIXTURES_DIR.iterdir()):
+        backend = helpers.get_backend_class(backend_dir.name)(None)
+        search_page = (backend_dir / "search.html").read_bytes()
+        lyrics_page = (backend_dir / "lyrics.html").read_bytes()
+
+        legacy_search_time, legacy_links = _time(
+            lambda: _legacy_links(
+                search_page, backend.link_strainer_args, backend.link_result_args
+            ),
+            args.iterations,
+        )
+        search_time, links = _time(
+            lambda: extract_links(
+                search_page,
+                _ENCODING,
+                backend.link_strainer_args,
+                backend.link_result_args,
+            ),
+            args.iterations,
+        )
+        legacy_lyrics_time, legacy_lyrics = _time(
+            lambda: _legacy_text(lyrics_page, backend.lyrics_strainer_args),
+            args.iterations,
+        )
+        lyrics_time, lyrics = _time(
+            lambda: extract_text(lyrics_page, _ENCODING, backend.lyrics_strainer_args),
+            args.iterations,
+        )
+
+        if links != legacy_links:
+            mismatches.append(f"{backend.name} links")
+        # Some fixtures link a song more than once, but its lyrics should only be fetched once
+        title, artist, _ = backend.standardise(*_SONG, "")
+        ranked_links = backend.parse_search_page(
+            search_page, _ENCODING, title, artist, None
+        )
+        if len(set(ranked_links)) != len(ranked_links):
+            mismatches.append(f"{backend.name} duplicate candidates")
+        if lyrics != legacy_lyrics:
+            mismatches.append(f"{backend.name} lyrics")
+
+        print(
+            f"{backend.name} ({len(links)} results, {len(lyrics.splitlines())} lines)"
+        )
+        print(
+            f"  Search: {legacy_search_time * 1000:.2f}ms -> {search_time * 1000:.2f}ms ({legacy_search_time / search_time:.1f}x)"
+        )
+        print(
+            f"  Lyrics: {legacy_lyrics_time * 1000:.2f}ms -> {lyrics_time * 1000:.2f}ms ({legacy_lyrics_time / lyrics_time:.1f}x)"
+        )
+
+    for mismatch in mismatches:
+        print(f"MISMATCH {mismatch}")
+    print(f"Identical output: {not mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
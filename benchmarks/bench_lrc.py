@@ -0,0 +1,121 @@
+"""Compare parsing LRC lyrics (rclyricsband scrubbing and validation) against the original string code.
+
+Run from the repository root: python -m benchmarks.bench_lrc
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import List
+
+from backends.lrc import LrcLyrics, find_sync_problem, format_timestamp
+
+_TIME_REGEX = r"\[(\d{2}):(\d{2}.\d{2})\]"
+_WORDS = ["love", "night", "road", "fire", "heart", "home", "rain", "blue", "gold"]
+
+
+# Original implementation from GetLyricsRCLyricsBand
+def _legacy_scrub_lyrics(lyrics: str) -> str:
+    lines = lyrics.split("\n")
+
+    indexes = [pos for pos, char in enumerate(lines[0]) if char == "["]
+    first_line_index = indexes[-2]
+    info = lines[0][:first_line_index]
+    first_line = lines[0][first_line_index:]
+    lines[0] = first_line
+
+    for count, line in enumerate(lines):
+        lines[count] = line.replace("[re:www.rclyricsband.com]", "")
+        second_timestamp = lines[count][10:20]
+        if re.match(rf"^{_TIME_REGEX}$", second_timestamp):
+            lines[count] = lines[count].replace(second_timestamp, "")
+
+    info_indexes = indexes[1:-2]
+    for index in info_indexes[::-1]:
+        lines.insert(0, info[index:])
+        info = info[:index]
+
+    return "\n".join(lines)
+
+
+# Original implementation from GetLyricsBase
+def _legacy_validate_lyrics(lyrics: str) -> bool:
+    return bool(re.search(_TIME_REGEX, lyrics))
+
+
+def make_lyrics(rand: random.Random, num_lines: int) -> str:
+    """rclyricsband style lyrics: info tags on the first line and a start and end time on every line"""
+    lines = []
+    time_ms = 500
+    for _ in range(num_lines):
+        end_ms = time_ms + rand.randint(2000, 5000)
+        text = " ".join(rand.choices(_WORDS, k=6)).capitalize()
+        lines.append(f"{format_timestamp(time_ms)}{format_timestamp(end_ms)}{text}")
+        time_ms = end_ms
+    lines[0] = "[ar:Artist][ti:Title][re:www.rclyricsband.com]" + lines[0]
+    return "\n".join(lines)
+
+
+def timed_lines(lyrics: str) -> List[str]:
+    return [line for line in lyrics.split("\n") if re.match(_TIME_REGEX, line)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        "Benchmark LRC scrubbing/validation against the original string code."
+    )
+    parser.add_argument("--songs", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rand = random.Random(args.seed)
+    corpus = [make_lyrics(rand, args.lines) for _ in range(args.songs)]
+
+    start_time = time.perf_counter()
+    legacy = [_legacy_scrub_lyrics(lyrics) for lyrics in corpus]
+    legacy_valid = [_legacy_validate_lyrics(lyrics) for lyrics in legacy]
+    legacy_time = time.perf_counter() - start_time
+
+    # Scrubbing parses the lyrics, and the same parse is checked (like GetLyricsRCLyricsBand)
+    start_time = time.perf_counter()
+    parsed = [
+        LrcLyrics.parse(
+            lyrics.replace("[re:www.rclyricsband.com]", ""), keep_extra_times=False
+        )
+        for lyrics in corpus
+    ]
+    scrubbed = [lyrics.serialise() for lyrics in parsed]
+    scrub_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    problems = [find_sync_problem(lyrics, None, 5) for lyrics in parsed]
+    validate_time = time.perf_counter() - start_time
+
+    # The original also dropped the first info tag, so only compare the lyrics lines
+    mismatches = [
+        (old, new)
+        for old, new in zip(legacy, scrubbed)
+        if timed_lines(old) != timed_lines(new)
+    ]
+    mismatches += [
+        (legacy_lyrics, problem)
+        for legacy_lyrics, valid, problem in zip(legacy, legacy_valid, problems)
+        if valid != (problem is None)
+    ]
+    for old, new in mismatches[:3]:
+        print(f"MISMATCH:\n{old[:200]}\n!=\n{str(new)[:200]}")
+
+    new_time = scrub_time + validate_time
+    print(f"Songs: {args.songs} x {args.lines} lines")
+    print(f"Original (scrub + has a timestamp): {legacy_time:.3f}s")
+    print(
+        f"LRC model (scrub + sync checks):    {new_time:.3f}s ({legacy_time / new_time:.1f}x) Scrub={scrub_time:.3f}s Validate={validate_time:.3f}s"
+    )
+    print(f"Identical lyrics lines: {not mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
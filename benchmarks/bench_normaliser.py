@@ -0,0 +1,197 @@
+"""Compare the shared normaliser against the original per-backend string functions.
+
+Run from the repository root: python -m benchmarks.bench_normaliser
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import List, Optional, Tuple
+
+from backends.normaliser import Normaliser
+
+_KEYWORDS = [
+    "feat",
+    "acoustic",
+    "bonus",
+    "from",
+    "version",
+    "cover",
+    "live",
+    "remix",
+    "theme",
+    "official",
+    "explicit",
+]
+_REMOVE_WORDS = ["a", "the", "of"]
+_WORDS = [
+    "love",
+    "Hello",
+    "the",
+    "Don't",
+    "stop",
+    "me",
+    "now",
+    "a",
+    "night",
+    "of",
+    "Café",
+    "Beyoncé",
+    "rock-n-roll",
+    "AC/DC",
+    "P!nk",
+    "Guns N' Roses",
+    "“Quoted”",
+    "it’s",
+    "`tick`",
+    "x",
+    "99",
+]
+_BRACKETS = [
+    "(feat. Someone)",
+    "(Live at Wembley)",
+    "[Remastered 2011]",
+    "(2015 Remaster)",
+    "[Explicit]",
+    "(Acoustic Version)",
+    "(Interlude)",
+    "(Part [2)",
+    "[Radio Edit]",
+]
+
+
+# Original implementations from GetLyricsBase
+def _legacy_remove_punctuation(string: str) -> str:
+    string = re.sub(r"[’`'\"]", "", string)
+    string = re.sub(r"[^A-Za-z0-9]", " ", string)
+    string = re.sub(r"-", " ", string)
+    string_parts = string.split()
+    string_parts = [part for part in string_parts if part not in _REMOVE_WORDS]
+    string = " ".join(string_parts)
+    return string
+
+
+def _legacy_standardise_title(title: str) -> str:
+    title = title.strip().lower()
+    brackets = re.findall(r"\(.*?\)", title)
+    brackets += re.findall(r"\[.*?\]", title)
+    for bracket in brackets:
+        if any([keyword in bracket for keyword in _KEYWORDS]):
+            title = title.replace(bracket, "")
+    title = _legacy_remove_punctuation(title)
+    return title
+
+
+def _legacy_standardise_artist(artist: str) -> str:
+    artist = artist.strip().lower()
+    if ";" in artist:
+        artist = artist.split(";")[0].strip()
+    artist = _legacy_remove_punctuation(artist)
+    return artist
+
+
+def _legacy_get_secs_from_time_str(duration: str) -> Optional[int]:
+    duration = duration.strip()
+    duration_parts = re.findall(r"^(\d{2}):(\d{2}):(\d{2})$", duration)
+    if not duration_parts or len(duration_parts) != 1:
+        return None
+    hours, mins, secs = duration_parts[0]
+    return int(hours) * 3600 + int(mins) * 60 + int(secs)
+
+
+def _legacy_standardise(
+    title: str, artist: str, duration: str
+) -> Tuple[str, str, Optional[int]]:
+    return (
+        _legacy_standardise_title(title),
+        _legacy_standardise_artist(artist),
+        _legacy_get_secs_from_time_str(duration),
+    )
+
+
+def make_corpus(size: int, seed: int) -> List[Tuple[str, str, str]]:
+    rand = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        title = " ".join(rand.choices(_WORDS, k=rand.randint(1, 5)))
+        for _ in range(rand.choice([0, 0, 1, 2])):
+            title += " " + rand.choice(_BRACKETS)
+        artist = " ".join(rand.choices(_WORDS, k=rand.randint(1, 3)))
+        if rand.random() < 0.2:
+            artist += "; " + rand.choice(_WORDS)
+        duration = f"00:{rand.randint(0, 9):02d}:{rand.randint(0, 59):02d}"
+        if rand.random() < 0.01:
+            duration = "4:05"
+        corpus.append((title, artist, duration))
+    return corpus
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        "Benchmark the title/artist normaliser against the original functions."
+    )
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--backends",
+        help="Times each song is standardised (once per backend).",
+        type=int,
+        default=3,
+    )
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.size, args.seed)
+    normaliser = Normaliser(tuple(_KEYWORDS), tuple(_REMOVE_WORDS))
+
+    start_time = time.perf_counter()
+    legacy = [
+        _legacy_standardise(*song) for song in corpus for _ in range(args.backends)
+    ]
+    legacy_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    uncached = [
+        (
+            normaliser.standardise_title(title),
+            normaliser.standardise_artist(artist),
+            normaliser.get_secs_from_time_str(duration),
+        )
+        for title, artist, duration in corpus
+        for _ in range(args.backends)
+    ]
+    uncached_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    cached = [
+        normaliser.standardise(*song) for song in corpus for _ in range(args.backends)
+    ]
+    cached_time = time.perf_counter() - start_time
+
+    songs = [song for song in corpus for _ in range(args.backends)]
+    mismatches = [
+        (song, old, new)
+        for song, old, new in zip(songs, legacy, cached)
+        if old != new or type(old[2]) != type(new[2])
+    ]
+    mismatches += [
+        (song, old, new)
+        for song, old, new in zip(songs, legacy, uncached)
+        if old != new
+    ]
+    for song, old, new in mismatches[:10]:
+        print(f"MISMATCH {song}: {old} != {new}")
+
+    print(f"Songs: {args.size} x {args.backends} backends")
+    print(f"Original:            {legacy_time:.3f}s")
+    print(
+        f"Normaliser:          {uncached_time:.3f}s ({legacy_time / uncached_time:.1f}x)"
+    )
+    print(f"Normaliser (shared): {cached_time:.3f}s ({legacy_time / cached_time:.1f}x)")
+    print(f"Identical output: {not mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Run LyricsGetter end to end against the local replay server instead of the real websites.
+
+Reports songs/sec, p50/p95 time per song and how much time the backends spent on
+the network versus parsing, so changes can be compared on the same footing.
+
+Run from the repository root: python -m benchmarks.bench_replay
+"""
+
+import argparse
+import logging
+import tempfile
+from pathlib import Path
+
+from backends import helpers
+from benchmarks.replay_server import ReplayServer
+from backends.metrics import NETWORK, PARSE, percentile
+from backends.parse_pool import ParsePool
+from backends.transport import Transport
+from input_reader import format_duration
+from lyrics_getter import LyricsGetter
+
+# Songs in the saved search pages (durations match the results)
+_SONGS = [
+    ("Adele", "Hello", 295),
+    ("Queen", "Bohemian Rhapsody", 354),
+    ("Coldplay", "Yellow", 266),
+    ("Oasis", "Wonderwall", 258),
+]
+
+
+def write_input(path: Path, size: int) -> None:
+    # Bracketed keywords are ignored when matching results, so every song is looked up
+    # (and saved to a different file) while still matching the saved search pages
+    with open(path, "w", encoding="utf-8") as file:
+        for count in range(size):
+            artist, title, duration = _SONGS[count % len(_SONGS)]
+            file.write(
+                f"{artist}|{title} (Version {count})|{format_duration(duration)}\n"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-n", "--songs", help="Number of songs to look up.", type=int, default=200
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        help="Backend to use. Multiple can be specified. Uses every backend with saved pages by default.",
+        action="append",
+        default=[],
+    )
+    parser.add_argument(
+        "-w", "--workers", help="Number of songs at the same time.", type=int, default=4
+    )
+    parser.add_argument(
+        "--backend-concurrency",
+        help="Max concurrent requests to each backend. Uses the number of workers by default.",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--backend-rps",
+        help="Max requests per second to each backend. Unlimited by default.",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--hedge-backends",
+        help="Query all timestamp backends for a song at the same time.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--latency", help="Delay of each response in ms.", type=float, default=20
+    )
+    parser.add_argument(
+        "--jitter", help="Random +/- ms added to the delay.", type=float, default=10
+    )
+    parser.add_argument(
+        "--error-rate",
+        help="Fraction of requests (0 to 1) that fail.",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--retry-after",
+        help="Retry-After header (in seconds) of failed responses. Not sent by default.",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--max-retries",
+        help="Times to retry a failed request.",
+        type=int,
+        default=3,
+    )
+    parser.add_argument(
+        "--backoff",
+        help="Base delay (in ms) before retrying a failed request. Doubles each retry.",
+        type=float,
+        default=100,
+    )
+    parser.add_argument(
+        "--parse-processes",
+        help="Processes to parse pages in (0 parses in the workers).",
+        type=int,
+        default=0,
+    )
+    parser.add_argument("--seed", help="Random seed.", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    server = ReplayServer(
+        latency_secs=args.latency / 1000,
+        jitter_secs=args.jitter / 1000,
+        error_rate=args.error_rate,
+        retry_after_secs=args.retry_after,
+        seed=args.seed,
+    )
+    names = args.backend or server.backends
+    backend_concurrency = args.backend_concurrency or args.workers
+    # Same options main.py would set up from the command line
+    backend_args = argparse.Namespace(
+        backend_concurrency={name: backend_concurrency for name in names},
+        backend_requests_per_second={name: args.backend_rps for name in names},
+        backend_base_urls={name: server.url_for(name) for name in names},
+        transport=Transport(
+            max_retries=args.max_retries, backoff_secs=args.backoff / 1000
+        ),
+        http_cache=None,
+        min_confidence=None,
+        max_candidates=None,
+    )
+    backends = [helpers.create_backend(name, backend_args) for name in names]
+    parse_pool = None
+    if args.parse_processes:
+        parse_pool = ParsePool(backends, args.parse_processes)
+
+    with server, tempfile.TemporaryDirectory() as temp_dir:
+        input_path = Path(temp_dir, "input.txt")
+        output_path = Path(temp_dir, "output")
+        output_path.mkdir()
+        write_input(input_path, args.songs)
+        getter = LyricsGetter(
+            backends,
+            input_path,
+            output_path,
+            "|",
+            workers=args.workers,
+            hedge_backends=args.hedge_backends,
+            retry_failed=True,
+            # Songs only differ by version (which backends ignore), so look up every one
+            share_lookups=False,
+        )
+        try:
+            summary = getter.run()
+        finally:
+            if parse_pool:
+                parse_pool.close()
+
+    print(
+        f"Songs: {summary.total} (Saved={summary.saved_lrc + summary.saved_txt} Failed={summary.failed}) Workers={args.workers} Backends={','.join(names)}"
+    )
+    print(
+        f"Server: Latency={args.latency}ms Jitter={args.jitter}ms ErrorRate={args.error_rate}"
+    )
+    print(f"Time:      {summary.elapsed_secs:.2f}s")
+    print(f"Songs/sec: {summary.total / summary.elapsed_secs:.1f}")
+    song_secs = sorted(summary.song_secs)
+    print(
+        f"Per song:  p50={percentile(song_secs, 50) * 1000:.1f}ms p95={percentile(song_secs, 95) * 1000:.1f}ms"
+    )
+    total_network = sum(backend.metrics.secs(NETWORK) for backend in backends)
+    total_parse = sum(backend.metrics.secs(PARSE) for backend in backends)
+    total_song = sum(summary.song_secs)
+    print(
+        f"Split (summed over threads): Network={total_network:.2f}s Parse={total_parse:.2f}s Other={max(0.0, total_song - total_network - total_parse):.2f}s"
+    )
+    for backend in backends:
+        retries = backend.metrics.snapshot()["retries"]
+        requests = backend.metrics.count(NETWORK)
+        parses = backend.metrics.count(PARSE)
+        print(
+            f"    {backend.name}: Requests={requests} Retries={retries} Network={backend.metrics.secs(NETWORK):.2f}s ({backend.metrics.secs(NETWORK) / max(requests, 1) * 1000:.1f}ms each) Parse={backend.metrics.secs(PARSE):.2f}s ({backend.metrics.secs(PARSE) / max(parses, 1) * 1000:.2f}ms each)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Local stand-in for the lyrics websites, serving the saved pages in benchmarks/fixtures/.
+
+Each backend is served under /<backend>, so pointing a backend at it is just a base URL
+override (e.g. --backend-url lyricsify=http://127.0.0.1:8000/lyricsify).
+
+Run from the repository root to use it with main.py: python -m benchmarks.replay_server
+"""
+
+import argparse
+import random
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from backends import helpers
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Default backlog of 5 drops connections (and clients wait a second to retry)
+    request_queue_size = 128
+
+
+class _Backend:
+    def __init__(self, name: str, fixtures_dir: Path):
+        backend = helpers.get_backend_class(name)(None)
+        self.original_base_url = backend.base_url
+        self.query_key = backend.query_key
+        self.search_page = (fixtures_dir / "search.html").read_bytes()
+        self.lyrics_page = (fixtures_dir / "lyrics.html").read_bytes()
+
+
+class ReplayServer:
+    """Serves recorded search and lyrics pages with configurable latency, jitter and errors"""
+
+    def __init__(
+        self,
+        fixtures_dir: Path = FIXTURES_DIR,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_secs: float = 0.0,
+        jitter_secs: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after_secs: Optional[float] = None,
+        seed: Optional[int] = None,
+    ):
+        self.latency_secs = latency_secs
+        self.jitter_secs = jitter_secs
+        self.error_rate = error_rate
+        self.retry_after_secs = retry_after_secs
+        self.__random = random.Random(seed)
+        self.__random_lock = threading.Lock()
+        self.__backends: Dict[str, _Backend] = {
+            backend_dir.name: _Backend(backend_dir.name, backend_dir)
+            for backend_dir in sorted(fixtures_dir.iterdir())
+            if backend_dir.is_dir()
+        }
+        self.__server = _Server((host, port), self.__make_handler())
+        self.__thread: Optional[threading.Thread] = None
+        # Links in recorded pages point at the real websites
+        for name, backend in self.__backends.items():
+            backend.search_page = backend.search_page.replace(
+                backend.original_base_url.encode(), self.url_for(name).encode()
+            )
+
+    @property
+    def backends(self) -> List[str]:
+        return list(self.__backends)
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url_for(self, backend: str) -> str:
+        return f"{self.url}/{backend}"
+
+    def start(self) -> "ReplayServer":
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever, name="replay-server", daemon=True
+        )
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread:
+            self.__thread.join()
+
+    def __enter__(self) -> "ReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def next_response(self) -> Tuple[float, bool]:
+        # Delay and whether to fail the request
+        with self.__random_lock:
+            jitter = self.__random.uniform(-self.jitter_secs, self.jitter_secs)
+            failed = self.__random.random() < self.error_rate
+        return max(0.0, self.latency_secs + jitter), failed
+
+    def get_page(self, path: str, query: str) -> Optional[bytes]:
+        """Page for the request (search pages have the backend's query key), if there is one"""
+        name = path.lstrip("/").split("/", 1)[0]
+        backend = self.__backends.get(name)
+        if not backend:
+            return None
+        if backend.query_key in parse_qs(query):
+            return backend.search_page
+        return backend.lyrics_page
+
+    def __make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                delay, failed = server.next_response()
+                time.sleep(delay)
+                url = urlsplit(self.path)
+                page = server.get_page(url.path, url.query)
+                if failed:
+                    self.send_response(HTTPStatus.SERVICE_UNAVAILABLE)
+                    if server.retry_after_secs is not None:
+                        self.send_header(
+                            "Retry-After", str(round(server.retry_after_secs))
+                        )
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if page is None:
+                    self.send_error(HTTPStatus.NOT_FOUND)
+                    return
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+            def log_message(self, format: str, *args) -> None:
+                # Too noisy when benchmarking
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", help="Port to listen on.", type=int, default=8000)
+    parser.add_argument(
+        "--latency", help="Delay of each response in ms.", type=float, default=0
+    )
+    parser.add_argument(
+        "--jitter", help="Random +/- ms added to the delay.", type=float, default=0
+    )
+    parser.add_argument(
+        "--error-rate",
+        help="Fraction of requests (0 to 1) that get a 503 response.",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--retry-after",
+        help="Retry-After header (in seconds) of failed responses. Not sent by default.",
+        type=float,
+        default=None,
+    )
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        port=args.port,
+        latency_secs=args.latency / 1000,
+        jitter_secs=args.jitter / 1000,
+        error_rate=args.error_rate,
+        retry_after_secs=args.retry_after,
+    )
+    print("Serving:")
+    for backend in server.backends:
+        print(f"    --backend-url {backend}={server.url_for(backend)}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
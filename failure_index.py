@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from backends.base import FailureReason
+
+_LOGGER = logging.getLogger(__name__)
+
+# The website was down or busy (even after retries), so the song may well be there next time.
+# Other HTTP errors (e.g. 404) are recorded, and backed off like any other failure
+_TRANSIENT_REASONS = frozenset([FailureReason.HTTP_ERROR])
+
+
+class FailureIndex:
+    """Persistent record of which backends failed to get lyrics for each song, and why"""
+
+    def __init__(
+        self,
+        path: Path,
+        recheck_interval_secs: float,
+        max_recheck_interval_secs: float,
+        retry_all: bool = False,
+    ):
+        self.__path = path
+        self.__recheck_interval_secs = recheck_interval_secs
+        self.__max_recheck_interval_secs = max_recheck_interval_secs
+        self.__retry_all = retry_all
+        self.__lock = threading.Lock()
+        self.__failures = {}
+        # Whether there's anything to save
+        self.__changed = False
+        if path.exists():
+            try:
+                with open(path, encoding="utf-8") as file:
+                    self.__failures = json.load(file)
+            except (OSError, ValueError) as ex:
+                _LOGGER.warning(f"Ignoring unreadable failure index {path}: {ex}")
+
+    def __len__(self) -> int:
+        return len(self.__failures)
+
+    def should_skip(self, song_key: str, backend_name: str) -> bool:
+        if self.__retry_all:
+            return False
+        with self.__lock:
+            failure = self.__failures.get(song_key, {}).get(backend_name)
+        if not failure:
+            return False
+        # Re-check interval doubles every time the backend fails for the song
+        interval = min(
+            self.__recheck_interval_secs * 2 ** (failure["attempts"] - 1),
+            self.__max_recheck_interval_secs,
+        )
+        return time.time() < failure["failed_at"] + interval
+
+    def record_failure(
+        self, song_key: str, backend_name: str, reason: FailureReason
+    ) -> None:
+        if reason in _TRANSIENT_REASONS:
+            return
+        with self.__lock:
+            backends = self.__failures.setdefault(song_key, {})
+            previous = backends.get(backend_name)
+            backends[backend_name] = {
+                "failed_at": time.time(),
+                "reason": reason.value,
+                "attempts": previous["attempts"] + 1 if previous else 1,
+            }
+            self.__changed = True
+
+    def record_success(self, song_key: str, backend_name: str) -> None:
+        """Only forgets the backend's failure, as others may still not have the lyrics
+        (e.g. timestamp backends when a fallback backend found lyrics without timestamps)
+        """
+        with self.__lock:
+            backends = self.__failures.get(song_key)
+            if backends is None or backend_name not in backends:
+                return
+            del backends[backend_name]
+            if not backends:
+                del self.__failures[song_key]
+            self.__changed = True
+
+    def __prune(self) -> None:
+        """Forget failures that will be rechecked whatever their attempts (call with the lock held)"""
+        expired_before = time.time() - self.__max_recheck_interval_secs
+        for song_key in list(self.__failures):
+            backends = self.__failures[song_key]
+            for backend_name in [
+                name
+                for name, failure in backends.items()
+                if failure["failed_at"] < expired_before
+            ]:
+                del backends[backend_name]
+                self.__changed = True
+            if not backends:
+                del self.__failures[song_key]
+
+    def save(self) -> None:
+        """Only writes the index if it has changed since it was loaded or last saved"""
+        with self.__lock:
+            self.__prune()
+            if not self.__changed:
+                return
+            self.__changed = False
+            data = json.dumps(self.__failures, indent=1)
+        # Write to a temporary file first so a crash can't corrupt the index
+        temp_path = self.__path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(data)
+        os.replace(temp_path, self.__path)
@@ -0,0 +1,186 @@
+import csv
+import json
+import logging
+import math
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
+
+_LOGGER = logging.getLogger(__name__)
+
+SEPARATED = "separated"
+CSV = "csv"
+JSONL = "jsonl"
+M3U = "m3u"
+INPUT_FORMATS = [SEPARATED, CSV, JSONL, M3U]
+
+_FORMAT_EXTENSIONS = {
+    ".csv": CSV,
+    ".jsonl": JSONL,
+    ".ndjson": JSONL,
+    ".m3u": M3U,
+    ".m3u8": M3U,
+}
+_DEFAULT_SEPARATORS = {SEPARATED: "|", CSV: ","}
+
+_HOURS_MINS_SECS_REGEX = re.compile(r"^(\d+):(\d{1,2}):(\d{1,2})$")
+_MINS_SECS_REGEX = re.compile(r"^(\d+):(\d{1,2})$")
+_SECS_REGEX = re.compile(r"^\d+(\.\d+)?$")
+# #EXTINF:<duration secs> <optional key="value" attributes>,<artist> - <title>
+_EXTINF_REGEX = re.compile(
+    r'^#EXTINF:\s*(-?\d+(?:\.\d+)?)(?:\s+[\w-]+="[^"]*")*\s*,(.*)$'
+)
+
+
+class Song(NamedTuple):
+    title: str
+    artist: str
+    # HH:MM:SS
+    duration: str
+
+
+def get_song_key(title: str, artist: str, duration: str) -> str:
+    return "|".join(part.strip().lower() for part in (artist, title, duration))
+
+
+def detect_format(path: Path) -> str:
+    return _FORMAT_EXTENSIONS.get(path.suffix.lower(), SEPARATED)
+
+
+def get_default_separator(input_format: str) -> Optional[str]:
+    return _DEFAULT_SEPARATORS.get(input_format)
+
+
+def format_duration(secs: Union[int, float]) -> str:
+    secs = round(secs)
+    return f"{secs // 3600:02d}:{secs // 60 % 60:02d}:{secs % 60:02d}"
+
+
+def normalise_duration(duration: Union[str, int, float, None]) -> str:
+    """Convert seconds, MM:SS or H:MM:SS into HH:MM:SS (left as is if not understood)"""
+    if isinstance(duration, bool):
+        # e.g. true in JSON, which Python thinks is 1
+        return ""
+    if isinstance(duration, (int, float)):
+        return (
+            format_duration(duration)
+            if math.isfinite(duration) and duration >= 0
+            else ""
+        )
+    if not isinstance(duration, str):
+        # None, or e.g. an object or list in JSON
+        return ""
+    duration = duration.strip()
+    match = _HOURS_MINS_SECS_REGEX.match(duration)
+    if match:
+        hours, mins, secs = (int(part) for part in match.groups())
+        return format_duration(hours * 3600 + mins * 60 + secs)
+    match = _MINS_SECS_REGEX.match(duration)
+    if match:
+        mins, secs = (int(part) for part in match.groups())
+        return format_duration(mins * 60 + secs)
+    if _SECS_REGEX.match(duration):
+        return format_duration(float(duration))
+    return duration
+
+
+def read_songs(
+    path: Path, input_format: str, separator: Optional[str]
+) -> Iterator[Song]:
+    """Stream songs from the input file one line at a time"""
+    # CSV module handles new lines itself (for quoted fields)
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        yield from parse_lines(file, input_format, separator)
+
+
+def parse_lines(
+    lines: Iterable[str], input_format: str, separator: Optional[str]
+) -> Iterator[Song]:
+    if input_format == SEPARATED:
+        return _parse_separated(lines, separator)
+    if input_format == CSV:
+        return _parse_csv(lines, separator)
+    if input_format == JSONL:
+        return _parse_jsonl(lines)
+    if input_format == M3U:
+        return _parse_m3u(lines)
+    raise ValueError(f"Unknown input format: {input_format}")
+
+
+def _parse_separated(lines: Iterable[str], separator: str) -> Iterator[Song]:
+    for line in lines:
+        if not line.strip():
+            continue
+        parts = line.split(separator)
+        if len(parts) < 3:
+            _LOGGER.warning(
+                f"Skipping input line {line}. Should be <artist>{separator}<title>{separator}HH:MM:SS"
+            )
+            continue
+        # Artist and duration can't contain the separator, so anything else is part of the title
+        artist, duration = parts[0], parts[-1]
+        title = separator.join(parts[1:-1])
+        yield Song(title.strip(), artist.strip(), normalise_duration(duration))
+
+
+def _parse_csv(lines: Iterable[str], delimiter: str) -> Iterator[Song]:
+    columns = {"artist": 0, "title": 1, "duration": 2}
+    first_row = True
+    for row in csv.reader(lines, delimiter=delimiter):
+        if not row or not any(field.strip() for field in row):
+            continue
+        if first_row:
+            # The header is the first row that isn't blank
+            first_row = False
+            header = [field.strip().lower() for field in row]
+            if "artist" in header and "title" in header:
+                columns = {
+                    name: header.index(name) for name in columns if name in header
+                }
+                continue
+        try:
+            artist = row[columns["artist"]]
+            title = row[columns["title"]]
+            duration = row[columns["duration"]] if "duration" in columns else ""
+        except IndexError:
+            _LOGGER.warning(
+                f"Skipping input row {row}. Should have artist, title and duration columns"
+            )
+            continue
+        yield Song(title.strip(), artist.strip(), normalise_duration(duration))
+
+
+def _parse_jsonl(lines: Iterable[str]) -> Iterator[Song]:
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+            artist = data["artist"]
+            title = data["title"]
+        except (ValueError, KeyError, TypeError):
+            _LOGGER.warning(
+                f'Skipping input line {line}. Should be a JSON object like {{"artist": ..., "title": ..., "duration": ...}}'
+            )
+            continue
+        yield Song(
+            str(title).strip(),
+            str(artist).strip(),
+            normalise_duration(data.get("duration")),
+        )
+
+
+def _parse_m3u(lines: Iterable[str]) -> Iterator[Song]:
+    for line in lines:
+        if not line.startswith("#EXTINF:"):
+            # Header, comments and the media file paths
+            continue
+        match = _EXTINF_REGEX.match(line.strip())
+        artist, sep, title = match.group(2).partition(" - ") if match else ("", "", "")
+        if not sep:
+            _LOGGER.warning(
+                f"Skipping input line {line}. Should be #EXTINF:<duration>,<artist> - <title>"
+            )
+            continue
+        duration = float(match.group(1))
+        yield Song(title.strip(), artist.strip(), normalise_duration(duration))
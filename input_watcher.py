@@ -0,0 +1,71 @@
+import logging
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+# Bytes before the read position that must be the same for the file to have only been appended to
+_CHECK_BYTES = 4096
+
+
+class InputWatcher:
+    """Reads lines as they're added to the input file, without reading the rest of it again.
+
+    Remembers how far it has read. If the file is only appended to, only the new lines are read.
+    If it's edited, replaced or gets shorter, the whole file is read again.
+    """
+
+    def __init__(self, path: Path):
+        self.__path = path
+        self.__offset = 0
+        # Bytes just before the offset (to tell if the file was changed, not appended to)
+        self.__tail = b""
+        self.__inode: Optional[int] = None
+        # Size and modified time when last read (so an unchanged file is one stat)
+        self.__last_stat: Optional[Tuple[int, int]] = None
+        # e.g. the CSV header, needed to parse lines after it
+        self.first_line: Optional[str] = None
+
+    def read_new_lines(self) -> Tuple[List[str], bool]:
+        """Complete lines added since the last call, and whether they're from the start of the file
+        (the first call, or the file was changed)"""
+        try:
+            stat = os.stat(self.__path)
+        except FileNotFoundError:
+            return [], False
+        if (stat.st_size, stat.st_mtime_ns) == self.__last_stat:
+            return [], False
+        with open(self.__path, "rb") as file:
+            from_start = not self.__is_appended(file, stat)
+            offset = 0 if from_start else self.__offset
+            file.seek(offset)
+            data = file.read()
+        # The last line may still be being written, so leave it for next time
+        end = data.rfind(b"\n") + 1
+        data = data[:end]
+        if from_start and self.__inode is not None:
+            _LOGGER.info(f"{self.__path} was changed, reading it again")
+        self.__inode = stat.st_ino
+        self.__last_stat = (stat.st_size, stat.st_mtime_ns)
+        self.__offset = offset + end
+        self.__tail = ((b"" if from_start else self.__tail) + data)[-_CHECK_BYTES:]
+        if not from_start and not data:
+            return [], False
+        # Lines can't split a UTF-8 character, so each chunk decodes on its own
+        text = data.decode("utf-8-sig" if offset == 0 else "utf-8", errors="replace")
+        lines = text.splitlines(keepends=True)
+        if from_start:
+            # Blank lines before the header are skipped (like when reading the whole file)
+            self.first_line = next((line for line in lines if line.strip()), None)
+        return lines, from_start
+
+    def __is_appended(self, file, stat: os.stat_result) -> bool:
+        if self.__inode is None or stat.st_ino != self.__inode:
+            # First read, or a new file moved into place
+            return False
+        if stat.st_size <= self.__offset:
+            # Shorter, or the same size but modified
+            return False
+        file.seek(self.__offset - len(self.__tail))
+        return file.read(len(self.__tail)) == self.__tail
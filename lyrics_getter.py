@@ -1,13 +1,123 @@
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
 from pathlib import Path
 from slugify import slugify
+from backend_scheduler import BackendScheduler
 from backends.base import GetLyricsBase
+from backends.lyrics_store import LyricsStore
+from failure_index import FailureIndex
+from input_reader import (
+    CSV,
+    SEPARATED,
+    Song,
+    get_song_key,
+    parse_lines,
+    read_songs,
+)
+from input_watcher import InputWatcher
+from output_index import OutputIndex
+from output_writer import OutputWriter, WriteJob
+from run_journal import RunJournal
+from run_report import (
+    RunSummary,
+    build_report,
+    write_json_report,
+    write_prometheus_report,
+)
+from sharding import Shard, in_shard
+from single_flight import SingleFlight
 
+import json
 import logging
-from typing import List, Tuple
+import os
+import sqlite3
+import tempfile
+import threading
+from typing import Deque, Hashable, Iterable, Iterator, List, Optional, Tuple
 import time
 
 _LOGGER = logging.getLogger(__name__)
 
+# Songs remembered while watching, so they aren't counted again if the input is rewritten
+# (songs forgotten are only cheap checks, as their lyrics exist or their failures are backed off)
+_WATCH_SEEN_SONGS = 100000
+# Latest songs whose times go in the latency percentiles while watching
+_WATCH_LATENCY_SONGS = 10000
+# Failure index is saved at most this often while watching (it's always saved when watching stops)
+_WATCH_FAILURE_INDEX_SAVE_SECS = 60
+
+
+class SongOutcome(Enum):
+    SKIPPED = "skipped"
+    SAVED_LRC = "saved_lrc"
+    SAVED_TXT = "saved_txt"
+    FAILED = "failed"
+
+
+def get_canonical_key(
+    backend: GetLyricsBase, title: str, artist: str, duration: str
+) -> Hashable:
+    """Same song as far as the backend can tell (e.g. "Adele" and "Adele; Someone")"""
+    std_title, std_artist, duration_secs = backend.standardise(title, artist, duration)
+    if not std_title or not std_artist:
+        # Nothing left once standardised (e.g. non-latin titles) so only exact duplicates
+        return get_song_key(title, artist, duration)
+    return (
+        std_title,
+        std_artist,
+        duration_secs if duration_secs is not None else duration.strip(),
+    )
+
+
+def add_to_store(
+    store: LyricsStore, song: Song, lyrics: str, backend: GetLyricsBase
+) -> None:
+    duration_secs = backend.normaliser.get_secs_from_time_str(song.duration)
+    try:
+        store.add(
+            song.title,
+            song.artist,
+            duration_secs,
+            lyrics,
+            backend.has_timestamps,
+            backend.name,
+        )
+    except sqlite3.Error as ex:
+        # The lyrics are still saved (or returned)
+        _LOGGER.warning(
+            f"Cannot add lyrics to the store for: {song.title} - {song.artist}: {ex}"
+        )
+
+
+class _SongCounts:
+    """Outcomes of the songs processed so far"""
+
+    def __init__(self, max_song_secs: Optional[int] = None):
+        self.total = 0
+        self.skipped = 0
+        self.saved_lrc = 0
+        self.saved_txt = 0
+        self.failed = 0
+        self.resumed = 0
+        # Only the latest songs' times if there's a max
+        self.song_secs: Deque[float] = deque(maxlen=max_song_secs)
+
+    def add(self, outcome: SongOutcome, secs: Optional[float]) -> None:
+        self.total += 1
+        if secs is None:
+            self.resumed += 1
+        else:
+            self.song_secs.append(secs)
+        if outcome == SongOutcome.SKIPPED:
+            self.skipped += 1
+        elif outcome == SongOutcome.SAVED_LRC:
+            self.saved_lrc += 1
+        elif outcome == SongOutcome.SAVED_TXT:
+            self.saved_txt += 1
+        else:
+            self.failed += 1
+
 
 class LyricsGetter:
     def __init__(
@@ -16,16 +126,62 @@ class LyricsGetter:
         input_path: Path,
         output_root: Path,
         separator: str,
+        input_format: str = SEPARATED,
+        workers: int = 1,
+        hedge_backends: bool = False,
+        retry_failed: bool = False,
+        failure_recheck_secs: float = 24 * 3600,
+        prometheus_path: Optional[Path] = None,
+        scheduler: Optional[BackendScheduler] = None,
+        resume: bool = False,
+        share_lookups: bool = True,
+        lyrics_store: Optional[LyricsStore] = None,
+        shard: Optional[Shard] = None,
     ):
         self.__backends = backends
         self.__input_path = input_path
         self.__output_root = output_root
         self.__separator = separator
+        self.__input_format = input_format
+        # Failed songs are written in the default input format so they can be retried
+        self.__failed_separator = separator if input_format == SEPARATED else "|"
+        self.__workers = workers
+        if self.__workers < 1:
+            raise ValueError("Number of workers must be at least 1")
         self.__failed_path = output_root / "failed.txt"
+        self.__report_path = output_root / "report.json"
+        self.__prometheus_path = prometheus_path
+        # Reorders timestamp backends per song (configured order if not set)
+        self.__scheduler = scheduler
+        self.__output_index = OutputIndex(output_root)
 
-        with open(self.__failed_path, "w", encoding="utf-8"):
-            # Clear failed file
-            pass
+        # Outcome of every song as it finishes (failed file is made from it at the end)
+        self.__journal = RunJournal(output_root / "journal.jsonl", resume=resume)
+        # Started for each run
+        self.__writer: Optional[OutputWriter] = None
+        # Lookups shared by songs that are the same once standardised
+        # (made for each run, or each batch of new songs while watching)
+        self.__lookups: Optional[SingleFlight] = None
+        # Lookups shared in earlier batches of the run
+        self.__num_shared = 0
+        # Otherwise only exact duplicates share lookups
+        self.__share_lookups = share_lookups
+        # Every lyrics found on a website is added to it
+        self.__lyrics_store = lyrics_store
+        # Only songs in this shard of the input are processed (other shards run elsewhere)
+        self.__shard = shard
+        # When the failure index was last saved while watching
+        self.__failure_index_saved_at = 0.0
+        # Failed songs not in the failed file yet (only while watching, see __save_progress)
+        self.__new_failed: Optional[List[Song]] = None
+        self.__new_failed_lock = threading.Lock()
+        # Known failures from previous runs (so we don't look them up every run)
+        self.__failure_index = FailureIndex(
+            output_root / "failed_index.json",
+            failure_recheck_secs,
+            max_recheck_interval_secs=failure_recheck_secs * 64,
+            retry_all=retry_failed,
+        )
 
         got_no_timestamp_backend = False
         for backend in self.__backends:
@@ -36,93 +192,556 @@ class LyricsGetter:
             if not backend.has_timestamps:
                 got_no_timestamp_backend = True
 
-    def __import_spotify_playlist(self) -> List[Tuple[str, str, int]]:
-        with open(self.__input_path, encoding="utf-8") as file:
-            data = []
-            for line in file.readlines():
-                parts = line.split(self.__separator)
-                if len(parts) != 3:
-                    _LOGGER.warning(
-                        f"Skipping input line {line}. Should be <artist>{self.__separator}<title>{self.__separator}HH:MM:SS"
-                    )
-                    continue
-                artist, title, time = line.split(self.__separator)
-                data.append((title.strip(), artist.strip(), time.strip()))
-        return data
+        self.__timestamp_backends = [b for b in self.__backends if b.has_timestamps]
+        self.__non_timestamp_backends = [
+            b for b in self.__backends if not b.has_timestamps
+        ]
+        # Query all timestamp backends for a song at the same time
+        self.__hedge_executor = None
+        if hedge_backends and len(self.__timestamp_backends) > 1:
+            self.__hedge_executor = ThreadPoolExecutor(
+                max_workers=self.__workers * len(self.__timestamp_backends),
+                thread_name_prefix="hedge",
+            )
+
+    def __get_output_names(self, title: str, artist: str) -> Tuple[str, str]:
+        # Artist folder and file name (without extension)
+        return slugify(artist), slugify(title)
 
-    def __get_output_file_path(self, title: str, artist: str, timestamps: bool) -> Path:
+    def __get_output_file_name(self, title_name: str, timestamps: bool) -> str:
         extension = "lrc" if timestamps else "txt"
-        return self.__output_root / slugify(artist) / f"{slugify(title)}.{extension}"
+        return f"{title_name}.{extension}"
 
     def __save_lyrics_file(
-        self, title: str, artist: str, lyrics: str, timestamps: bool
-    ) -> None:
-        output = self.__get_output_file_path(title, artist, timestamps)
-        output.parent.mkdir(exist_ok=True)
-        try:
-            with open(output, "w", encoding="utf-8") as file:
-                file.write(lyrics)
-        except Exception as ex:
-            _LOGGER.debug(
-                f"Cannot write lyrics of {title} - {artist} to {output}: {ex}"
+        self,
+        song_key: str,
+        song: Song,
+        artist_dir: str,
+        title_name: str,
+        lyrics: Optional[str],
+        timestamps: bool,
+        copy_of: Optional[Tuple[str, str]] = None,
+    ) -> Tuple[str, str]:
+        file_name = self.__get_output_file_name(title_name, timestamps)
+        # Timestamp lyrics replace any non-timestamp lyrics we already had
+        replaces = (
+            self.__get_output_file_name(title_name, False) if timestamps else None
+        )
+        self.__writer.write(
+            WriteJob(artist_dir, file_name, lyrics, replaces, (song_key, song), copy_of)
+        )
+        return artist_dir, file_name
+
+    def __write_failed(self, job: WriteJob, ex: Exception) -> None:
+        # Journaled so it goes in the failed file (and resumes as failed)
+        song_key, song = job.context
+        self.__journal.record_write_failure(song_key, song)
+        self.__add_new_failed(song)
+
+    def __add_new_failed(self, song: Song) -> None:
+        with self.__new_failed_lock:
+            if self.__new_failed is not None:
+                self.__new_failed.append(song)
+
+    def __take_new_failed(self) -> Optional[List[Song]]:
+        """Failed songs since the last call (None the first time), collecting them from now on"""
+        with self.__new_failed_lock:
+            songs = self.__new_failed
+            self.__new_failed = []
+        return songs
+
+    def __format_failed(self, songs: Iterable[Song]) -> Iterator[str]:
+        for title, artist, duration in songs:
+            data = self.__failed_separator.join([artist, title, duration])
+            yield f"{data}\n"
+
+    def __write_failed_file(self) -> None:
+        temp_path = self.__failed_path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.writelines(self.__format_failed(self.__journal.iter_failed_songs()))
+        os.replace(temp_path, self.__failed_path)
+
+    def __should_skip(self, song_key: str, backend: GetLyricsBase) -> bool:
+        if not backend.sends_requests:
+            # Cheap to ask again (and may have the lyrics since the last run)
+            return False
+        # Failed recently, or already tried before the last run was stopped
+        return self.__failure_index.should_skip(
+            song_key, backend.name
+        ) or backend.name in self.__journal.attempted_backends(song_key)
+
+    def __find_lyrics(
+        self,
+        backend: GetLyricsBase,
+        song_key: str,
+        title: str,
+        artist: str,
+        duration: str,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Optional[str]:
+        start_time = time.perf_counter()
+        result = backend.find_lyrics(title, artist, duration, cancel_event)
+        backend.metrics.record_lookup(
+            bool(result.lyrics),
+            result.failure.value if result.failure else None,
+            time.perf_counter() - start_time,
+        )
+        if self.__scheduler:
+            self.__scheduler.record_lookup(
+                artist, backend.name, bool(result.lyrics), result.failure
             )
-            return
-
-        if timestamps:
-            # Try to delete non-timestamp lyrics file
-            self.__get_output_file_path(title, artist, False).unlink(missing_ok=True)
-
-    def __save_song_as_failed(self, title: str, artist: str, duration: int) -> None:
-        with open(self.__failed_path, "a", encoding="utf-8") as file:
-            data = self.__separator.join([artist, title, duration])
-            file.write(f"{data}\n")
-
-    def run(self) -> None:
-        data = self.__import_spotify_playlist()
-        total = len(data)
-        num_skipped = 0
-        num_saved_lrc = 0
-        num_saved_txt = 0
-        num_failed = 0
-        _LOGGER.info(f"Getting lyrics for {total} songs")
-        start_time = time.time()
-        for count, (title, artist, duration) in enumerate(data):
-            lyric_file = self.__get_output_file_path(title, artist, True)
-            if lyric_file.exists():
-                _LOGGER.debug(f"Skipping lyrics that exist: {title} - {artist}")
-                num_skipped += 1
+        if result.failure and backend.sends_requests:
+            self.__failure_index.record_failure(song_key, backend.name, result.failure)
+            self.__journal.record_attempt(song_key, backend.name, result.failure.value)
+        return result.lyrics
+
+    def __get_timestamp_lyrics(
+        self, song_key: str, title: str, artist: str, duration: str
+    ) -> Tuple[Optional[str], Optional[GetLyricsBase]]:
+        backends = [
+            backend
+            for backend in self.__timestamp_backends
+            if not self.__should_skip(song_key, backend)
+        ]
+        if self.__scheduler:
+            backends = self.__scheduler.order(artist, backends)
+        if not self.__hedge_executor:
+            # Backends are always tried in priority order for each song
+            for backend in backends:
+                lyrics = self.__find_lyrics(backend, song_key, title, artist, duration)
+                if lyrics:
+                    return lyrics, backend
+            return None, None
+
+        # Backends that don't send requests are quick, so only hedge the websites
+        while backends and not backends[0].sends_requests:
+            backend = backends.pop(0)
+            lyrics = self.__find_lyrics(backend, song_key, title, artist, duration)
+            if lyrics:
+                return lyrics, backend
+
+        # Query every backend at once but still take results in priority order,
+        # so we only wait for lower priority backends when higher ones have failed
+        cancel_event = threading.Event()
+        futures = [
+            self.__hedge_executor.submit(
+                self.__find_lyrics,
+                backend,
+                song_key,
+                title,
+                artist,
+                duration,
+                cancel_event,
+            )
+            for backend in backends
+        ]
+        for backend, future in zip(backends, futures):
+            lyrics = future.result()
+            if lyrics:
+                # Ignore slower lower priority backends
+                cancel_event.set()
+                for other_future in futures:
+                    other_future.cancel()
+                return lyrics, backend
+        return None, None
+
+    def __get_non_timestamp_lyrics(
+        self, song_key: str, title: str, artist: str, duration: str
+    ) -> Tuple[Optional[str], Optional[GetLyricsBase]]:
+        for backend in self.__non_timestamp_backends:
+            if self.__should_skip(song_key, backend):
                 continue
+            lyrics = self.__find_lyrics(backend, song_key, title, artist, duration)
+            if lyrics:
+                return lyrics, backend
+        return None, None
+
+    def __look_up_and_save(
+        self,
+        song_key: str,
+        song: Song,
+        artist_dir: str,
+        title_name: str,
+        timestamps: bool,
+    ) -> Optional[Tuple[Tuple[str, str], str]]:
+        """Where the lyrics were saved and the backend that had them (or None if no backend had them)"""
+        get_lyrics = (
+            self.__get_timestamp_lyrics
+            if timestamps
+            else self.__get_non_timestamp_lyrics
+        )
+        lyrics, backend = get_lyrics(song_key, *song)
+        if not lyrics:
+            return None
+        self.__failure_index.record_success(song_key, backend.name)
+        if self.__lyrics_store and backend.sends_requests:
+            add_to_store(self.__lyrics_store, song, lyrics, backend)
+        saved_to = self.__save_lyrics_file(
+            song_key, song, artist_dir, title_name, lyrics, timestamps
+        )
+        return saved_to, backend.name
+
+    def __get_lyrics_once(
+        self,
+        song_key: str,
+        canonical_key: Hashable,
+        song: Song,
+        artist_dir: str,
+        title_name: str,
+        timestamps: bool,
+    ) -> Optional[SongOutcome]:
+        """Get and save lyrics, sharing the lookup with any duplicates of the song (None if not found)"""
+        found, shared = self.__lookups.do(
+            (canonical_key, timestamps),
+            lambda: self.__look_up_and_save(
+                song_key, song, artist_dir, title_name, timestamps
+            ),
+        )
+        if not found:
+            return None
+        saved_to, backend_name = found
+        if shared:
+            if saved_to == (
+                artist_dir,
+                self.__get_output_file_name(title_name, timestamps),
+            ):
+                # Exact duplicate of a song being saved at the same time
+                return SongOutcome.SKIPPED
+            self.__failure_index.record_success(song_key, backend_name)
+            self.__save_lyrics_file(
+                song_key, song, artist_dir, title_name, None, timestamps, saved_to
+            )
+        return SongOutcome.SAVED_LRC if timestamps else SongOutcome.SAVED_TXT
+
+    def __process_song(
+        self, title: str, artist: str, duration: str
+    ) -> Optional[SongOutcome]:
+        artist_dir, title_name = self.__get_output_names(title, artist)
+        if self.__output_index.exists(
+            artist_dir, self.__get_output_file_name(title_name, True)
+        ):
+            _LOGGER.debug(f"Skipping lyrics that exist: {title} - {artist}")
+            return SongOutcome.SKIPPED
 
-            non_timed_lyrics_exist = self.__get_output_file_path(
-                title, artist, False
-            ).exists()
+        non_timed_lyrics_exist = self.__output_index.exists(
+            artist_dir, self.__get_output_file_name(title_name, False)
+        )
+
+        song_key = get_song_key(title, artist, duration)
+        canonical_key = (
+            get_canonical_key(self.__backends[0], title, artist, duration)
+            if self.__share_lookups
+            else song_key
+        )
+        song = Song(title, artist, duration)
+        outcome = self.__get_lyrics_once(
+            song_key, canonical_key, song, artist_dir, title_name, True
+        )
+        if not outcome:
+            # We have failed to get timestamp lyrics but already have non-timestamped lyrics
+            if self.__non_timestamp_backends and non_timed_lyrics_exist:
+                return SongOutcome.SKIPPED
+            if self.__non_timestamp_backends:
+                # Fallback backends are tried for every song that needs them at the end
+                return None
+            return SongOutcome.FAILED
+
+        _LOGGER.debug(f"Successfully got lyrics for: {title} - {artist}")
+        return outcome
+
+    def __process_fallback(self, title: str, artist: str, duration: str) -> SongOutcome:
+        """Non-timestamp lyrics for a song no timestamp backend had"""
+        artist_dir, title_name = self.__get_output_names(title, artist)
+        if any(
+            self.__output_index.exists(
+                artist_dir, self.__get_output_file_name(title_name, timestamps)
+            )
+            for timestamps in (True, False)
+        ):
+            # e.g. a duplicate of the song got them (or lyrics with timestamps) first
+            return SongOutcome.SKIPPED
+        song_key = get_song_key(title, artist, duration)
+        canonical_key = (
+            get_canonical_key(self.__backends[0], title, artist, duration)
+            if self.__share_lookups
+            else song_key
+        )
+        outcome = self.__get_lyrics_once(
+            song_key,
+            canonical_key,
+            Song(title, artist, duration),
+            artist_dir,
+            title_name,
+            False,
+        )
+        if not outcome:
+            return SongOutcome.FAILED
+        _LOGGER.debug(f"Successfully got lyrics for: {title} - {artist}")
+        return outcome
+
+    def __timed_process_song(
+        self, song_key: str, song: Song, fallback: bool = False
+    ) -> Tuple[Optional[SongOutcome], Optional[float]]:
+        """Outcome is None if the song still needs the fallback backends (so isn't journaled yet)"""
+        start_time = time.perf_counter()
+        try:
+            if fallback:
+                outcome = self.__process_fallback(*song)
+            else:
+                outcome = self.__process_song(*song)
+        except Exception:
+            # Don't stop the run for one song (e.g. a parse process died)
+            _LOGGER.exception(f"Failed to process: {song.title} - {song.artist}")
+            outcome = SongOutcome.FAILED
+        if outcome:
+            self.__journal.record_song(song_key, song, outcome.value)
+        return outcome, time.perf_counter() - start_time
+
+    def __process_songs(
+        self, songs: Iterable[Song]
+    ) -> Iterator[Tuple[Song, Tuple[Optional[SongOutcome], Optional[float]]]]:
+        """Yields the outcome (and time taken) of each song in input order, while only reading ahead a few songs.
 
-            found_lyrics = False
+        Songs finished by the run being resumed aren't processed again (so have no time taken).
+        Outcome is None for songs that still need the fallback backends.
+        """
+        with ThreadPoolExecutor(max_workers=self.__workers) as executor:
+            pending = deque()
+            for song in songs:
+                song_key = get_song_key(*song)
+                outcome = self.__journal.finished_outcome(song_key)
+                if outcome:
+                    future = Future()
+                    future.set_result((SongOutcome(outcome), None))
+                else:
+                    future = executor.submit(self.__timed_process_song, song_key, song)
+                pending.append((song, future))
+                if len(pending) >= self.__workers * 2:
+                    song, future = pending.popleft()
+                    yield song, future.result()
+            while pending:
+                song, future = pending.popleft()
+                yield song, future.result()
+
+    def __start_run(self) -> None:
+        self.__writer = OutputWriter(
+            self.__output_root, self.__output_index, on_failure=self.__write_failed
+        )
+        self.__lookups = SingleFlight()
+        self.__num_shared = 0
+
+    def __process_fallbacks(
+        self, songs: Iterable[Tuple[Song, float]]
+    ) -> Iterator[Tuple[Song, Tuple[SongOutcome, float]]]:
+        """Yields the outcome (and total time taken) of each song in order, while only looking up a few songs ahead"""
+        with ThreadPoolExecutor(max_workers=self.__workers) as executor:
+            pending = deque()
+            for song, secs in songs:
+                future = executor.submit(
+                    self.__timed_process_song, get_song_key(*song), song, True
+                )
+                pending.append((song, secs, future))
+                if len(pending) >= self.__workers * 2:
+                    song, secs, future = pending.popleft()
+                    outcome, fallback_secs = future.result()
+                    yield song, (outcome, secs + fallback_secs)
+            while pending:
+                song, secs, future = pending.popleft()
+                outcome, fallback_secs = future.result()
+                yield song, (outcome, secs + fallback_secs)
+
+    def __count(
+        self,
+        song: Song,
+        outcome: SongOutcome,
+        secs: Optional[float],
+        counts: _SongCounts,
+    ) -> None:
+        counts.add(outcome, secs)
+        if outcome == SongOutcome.FAILED and secs is not None:
+            _LOGGER.info(f"Failed to get lyrics for: {song.title} - {song.artist}")
+            self.__add_new_failed(song)
+        if counts.total % 5 == 0:
+            _LOGGER.info(f"Progress: {counts.total} (Failed={counts.failed})")
+
+    def __process_and_count(self, songs: Iterable[Song], counts: _SongCounts) -> None:
+        # Results are tallied here so counters aren't shared between threads
+        # Songs that need the fallback backends wait on disk until every song has been
+        # tried on the timestamp backends, so memory doesn't grow with the input
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as fallback_file:
+            num_fallback_songs = 0
+            for song, (outcome, secs) in self.__process_songs(songs):
+                if outcome:
+                    self.__count(song, outcome, secs, counts)
+                else:
+                    fallback_file.write(f"{json.dumps([*song, secs])}\n")
+                    num_fallback_songs += 1
+            if not num_fallback_songs:
+                return
+            _LOGGER.info(
+                f"Getting lyrics without timestamps for {num_fallback_songs} songs"
+            )
+            fallback_file.seek(0)
+            fallback_songs = (
+                (Song(title, artist, duration), secs)
+                for title, artist, duration, secs in map(json.loads, fallback_file)
+            )
+            for song, (outcome, secs) in self.__process_fallbacks(fallback_songs):
+                self.__count(song, outcome, secs, counts)
+
+    def __get_summary(self, counts: _SongCounts, start_time: float) -> RunSummary:
+        return RunSummary(
+            counts.total,
+            counts.skipped,
+            counts.saved_lrc,
+            counts.saved_txt,
+            counts.failed,
+            time.time() - start_time,
+            list(counts.song_secs),
+            self.__writer.num_failed,
+            self.__num_shared + self.__lookups.num_shared,
+        )
+
+    def __finish_run(self, counts: _SongCounts, start_time: float) -> RunSummary:
+        """Save everything once the writer and journal are closed"""
+        summary = self.__get_summary(counts, start_time)
+        # Results are only needed for the run
+        self.__lookups = None
+        with self.__new_failed_lock:
+            self.__new_failed = None
+        self.__write_failed_file()
+        self.__failure_index.save()
+        if self.__scheduler:
             for backend in self.__backends:
-                # We have failed to get timestamp lyrics but already have non-timestamped lyrics
-                if not backend.has_timestamps and non_timed_lyrics_exist:
-                    num_skipped += 1
-                    found_lyrics = True
-                    break
-                lyrics = backend.get_lyrics(title, artist, duration)
-                if lyrics:
-                    self.__save_lyrics_file(
-                        title, artist, lyrics, backend.has_timestamps
-                    )
-                    if backend.has_timestamps:
-                        num_saved_lrc += 1
-                    else:
-                        num_saved_txt += 1
-                    _LOGGER.debug(f"Successfully got lyrics for: {title} - {artist}")
-                    found_lyrics = True
-                    break
-            if not found_lyrics:
-                self.__save_song_as_failed(title, artist, duration)
-                num_failed += 1
-                _LOGGER.info(f"Failed to get lyrics for: {title} - {artist}")
-
-            if (count + 1) % 5 == 0:
-                _LOGGER.info(f"Progress: {count+1}/{total} (Failed={num_failed})")
+                metrics = backend.metrics.snapshot()
+                self.__scheduler.record_requests(
+                    backend.name, metrics["requests"], metrics["lookups"]
+                )
+            self.__scheduler.save()
+        _LOGGER.info(
+            f"Finished getting lyrics: Total={summary.total} Skipped={summary.skipped} Saved(LRC)={summary.saved_lrc} Saved(TXT)={summary.saved_txt} Failed={summary.failed} Resumed={counts.resumed} WriteFailed={summary.write_failed} SharedLookups={summary.shared_lookups} Time={summary.elapsed_secs}"
+        )
+        self.__write_reports(summary)
+        return summary
+
+    def run(self) -> RunSummary:
+        songs = read_songs(self.__input_path, self.__input_format, self.__separator)
+        if self.__shard:
+            songs = (song for song in songs if in_shard(*song, self.__shard))
+        counts = _SongCounts()
+        _LOGGER.info(
+            f"Getting lyrics for songs in {self.__input_path} (Workers={self.__workers} Shard={self.__shard or 'all'})"
+        )
+        start_time = time.time()
+        self.__start_run()
+        try:
+            self.__process_and_count(songs, counts)
+        finally:
+            # Whatever happens, keep what has finished so the run can be resumed
+            self.__writer.close()
+            self.__journal.close()
+        return self.__finish_run(counts, start_time)
+
+    def watch(self, poll_secs: float = 1.0) -> RunSummary:
+        """Get lyrics for songs as they're added to the input file, until interrupted (e.g. Ctrl+C).
+
+        Backends, caches and the output index stay warm between songs, and only new lines are read.
+        If the file is changed rather than appended to, songs that haven't been seen are processed.
+        """
+        watcher = InputWatcher(self.__input_path)
+        # Keys of the latest songs processed while watching (oldest first)
+        seen: "OrderedDict[str, None]" = OrderedDict()
+        counts = _SongCounts(max_song_secs=_WATCH_LATENCY_SONGS)
         _LOGGER.info(
-            f"Finished getting lyrics: Skipped={num_skipped} Saved(LRC)={num_saved_lrc} Saved(TXT)={num_saved_txt} Failed={num_failed} Time={time.time() - start_time}"
+            f"Watching {self.__input_path} for new songs (Workers={self.__workers} Shard={self.__shard or 'all'})"
         )
+        start_time = time.time()
+        self.__start_run()
+        try:
+            while True:
+                lines, from_start = watcher.read_new_lines()
+                if (
+                    lines
+                    and not from_start
+                    and self.__input_format == CSV
+                    and watcher.first_line
+                ):
+                    # The header says which columns are which (seen songs are skipped if it's not a header)
+                    lines.insert(0, watcher.first_line)
+                songs = []
+                for song in parse_lines(lines, self.__input_format, self.__separator):
+                    song_key = get_song_key(*song)
+                    if song_key in seen:
+                        seen.move_to_end(song_key)
+                        continue
+                    seen[song_key] = None
+                    if len(seen) > _WATCH_SEEN_SONGS:
+                        seen.popitem(last=False)
+                    if not self.__shard or in_shard(*song, self.__shard):
+                        songs.append(song)
+                if not songs:
+                    time.sleep(poll_secs)
+                    continue
+                _LOGGER.info(f"Getting lyrics for {len(songs)} new songs")
+                self.__process_and_count(songs, counts)
+                # Forget the batch's lookups, so memory doesn't grow while watching and songs
+                # that weren't found are looked up again once their failures are rechecked
+                self.__num_shared += self.__lookups.num_shared
+                self.__lookups = SingleFlight()
+                self.__save_progress(counts, start_time)
+        except KeyboardInterrupt:
+            _LOGGER.info(f"Stopped watching {self.__input_path}")
+        finally:
+            self.__writer.close()
+            self.__journal.close()
+        return self.__finish_run(counts, start_time)
+
+    def close(self) -> None:
+        """Stop the threads shared between runs"""
+        if self.__hedge_executor:
+            self.__hedge_executor.shutdown(cancel_futures=True)
+            self.__hedge_executor = None
+
+    def __save_progress(self, counts: _SongCounts, start_time: float) -> None:
+        """Failed file, failure index and reports so far (while watching)"""
+        new_failed = self.__take_new_failed()
+        self.__journal.flush()
+        if new_failed is None:
+            # Includes songs that failed in the run being resumed
+            self.__write_failed_file()
+        elif new_failed:
+            # Only the new failures, so saving doesn't get slower as the journal grows
+            with open(self.__failed_path, "a", encoding="utf-8") as file:
+                file.writelines(self.__format_failed(new_failed))
+        if (
+            time.monotonic() - self.__failure_index_saved_at
+            >= _WATCH_FAILURE_INDEX_SAVE_SECS
+        ):
+            # Whole index is rewritten, so not after every batch
+            self.__failure_index.save()
+            self.__failure_index_saved_at = time.monotonic()
+        summary = self.__get_summary(counts, start_time)
+        _LOGGER.info(
+            f"Got lyrics so far: Total={summary.total} Skipped={summary.skipped} Saved(LRC)={summary.saved_lrc} Saved(TXT)={summary.saved_txt} Failed={summary.failed}"
+        )
+        # Backend stats are logged when watching stops
+        self.__write_reports(summary, log=False)
+
+    def __write_reports(self, summary: RunSummary, log: bool = True) -> None:
+        scheduler_summary = self.__scheduler.summary() if self.__scheduler else None
+        report = build_report(summary, self.__backends, scheduler_summary, self.__shard)
+        if log and scheduler_summary:
+            _LOGGER.info(
+                f"Adaptive backend order: Reordered={scheduler_summary['reordered']}/{scheduler_summary['songs']} ExpectedRequests={scheduler_summary['expected_requests']:.1f} (vs {scheduler_summary['configured_order_expected_requests']:.1f} in configured order)"
+            )
+        if log:
+            for name, metrics in report["backends"].items():
+                _LOGGER.info(
+                    f"{name}: Lookups={metrics['lookups']} Found={metrics['found']} Requests={metrics['requests']} CacheHits={metrics['cache_hits']} Latency(p50)={metrics['request_latency_secs']['p50']:.3f}"
+                )
+        try:
+            write_json_report(self.__report_path, report)
+            if self.__prometheus_path:
+                write_prometheus_report(self.__prometheus_path, report)
+        except OSError as ex:
+            _LOGGER.warning(f"Cannot write run report: {ex}")
@@ -0,0 +1,357 @@
+"""Local HTTP API for getting lyrics on demand, sharing warm backends between every caller.
+
+GET  /lyrics?artist=<artist>&title=<title>&duration=<duration>
+    One song as JSON (404 if no backend has lyrics for it)
+POST /lyrics/batch
+    Songs as JSON lines ({"artist": ..., "title": ..., "duration": ...}), answered with a JSON line
+    for each song as soon as it's looked up (so not in order, use "index" to match them up)
+GET  /stats
+    Lookups, result cache and backend metrics since the server started
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import (
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import parse_qs, urlsplit
+
+from backends.base import GetLyricsBase
+from backends.lyrics_store import LyricsStore
+from input_reader import JSONL, Song, normalise_duration, parse_lines
+from lyrics_getter import add_to_store, get_canonical_key
+from single_flight import SingleFlight
+
+_LOGGER = logging.getLogger(__name__)
+
+# Biggest batch body accepted
+_MAX_BODY_BYTES = 64 * 2**20
+
+
+class LookupOutcome(NamedTuple):
+    lyrics: Optional[str]
+    # Backend that had the lyrics
+    backend: Optional[str]
+    has_timestamps: bool
+    # Backend -> why it didn't have the lyrics
+    failures: Dict[str, str]
+
+
+class LyricsService:
+    """Looks songs up on the backends in priority order (timestamp backends first).
+
+    Lyrics found are remembered (least recently used are forgotten first), and callers asking
+    for the same song at the same time share one lookup. Songs no backend had are remembered
+    for a short time, so callers asking again and again don't send the same requests each time.
+    """
+
+    def __init__(
+        self,
+        backends: List[GetLyricsBase],
+        workers: int = 8,
+        cache_size: int = 10000,
+        lyrics_store: Optional[LyricsStore] = None,
+        miss_ttl_secs: float = 60,
+    ):
+        if not backends:
+            raise ValueError("No valid backends provided")
+        if workers < 1:
+            raise ValueError("Number of workers must be at least 1")
+        self.__backends = backends
+        self.__lyrics_store = lyrics_store
+        self.__cache_size = cache_size
+        self.__miss_ttl_secs = miss_ttl_secs
+        self.__lock = threading.Lock()
+        self.__results: "OrderedDict[Hashable, LookupOutcome]" = OrderedDict()
+        # Key -> when no backend had the song and the outcome (oldest first)
+        self.__misses: "OrderedDict[Hashable, Tuple[float, LookupOutcome]]" = (
+            OrderedDict()
+        )
+        # Only while running, the results cache remembers them
+        self.__lookups = SingleFlight(remember=False)
+        # Batch lookups from every caller share these
+        self.__workers = workers
+        self.__executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="lookup"
+        )
+        self.started_at = time.time()
+        self.num_lookups = 0
+        self.num_cache_hits = 0
+        self.num_cached_misses = 0
+
+    def look_up(self, song: Song) -> LookupOutcome:
+        key = get_canonical_key(self.__backends[0], *song)
+        with self.__lock:
+            self.num_lookups += 1
+            outcome = self.__results.get(key)
+            if outcome:
+                self.num_cache_hits += 1
+                self.__results.move_to_end(key)
+                return outcome
+            miss = self.__misses.get(key)
+            if miss and time.monotonic() - miss[0] < self.__miss_ttl_secs:
+                self.num_cached_misses += 1
+                return miss[1]
+        outcome, _ = self.__lookups.do(key, lambda: self.__look_up(song))
+        with self.__lock:
+            if outcome.lyrics:
+                self.__results[key] = outcome
+                if len(self.__results) > self.__cache_size:
+                    self.__results.popitem(last=False)
+            elif self.__miss_ttl_secs > 0:
+                self.__misses.pop(key, None)
+                self.__misses[key] = (time.monotonic(), outcome)
+                # Oldest first, so expired misses are at the start
+                while self.__misses and (
+                    len(self.__misses) > self.__cache_size
+                    or time.monotonic() - next(iter(self.__misses.values()))[0]
+                    >= self.__miss_ttl_secs
+                ):
+                    self.__misses.popitem(last=False)
+        return outcome
+
+    def look_up_many(
+        self, songs: Iterable[Song]
+    ) -> Iterator[Tuple[int, Song, Union[LookupOutcome, Exception]]]:
+        """Index, song and outcome of each song, in the order they finish
+        (or the exception if looking the song up failed, so the other songs still finish).
+
+        Only a few songs are looked up ahead, so a big batch doesn't queue every song at once.
+        """
+        indexed_songs = enumerate(songs)
+        futures: Dict[Future, Tuple[int, Song]] = {}
+        try:
+            while True:
+                for index, song in indexed_songs:
+                    futures[self.__executor.submit(self.look_up, song)] = (index, song)
+                    if len(futures) >= self.__workers * 2:
+                        break
+                if not futures:
+                    return
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, song = futures.pop(future)
+                    try:
+                        outcome = future.result()
+                    except Exception as ex:
+                        _LOGGER.exception(
+                            f"Failed to look up: {song.title} - {song.artist}"
+                        )
+                        outcome = ex
+                    yield index, song, outcome
+        finally:
+            # e.g. the caller went away
+            for future in futures:
+                future.cancel()
+
+    def __look_up(self, song: Song) -> LookupOutcome:
+        failures = {}
+        for backend in self.__backends:
+            start_time = time.perf_counter()
+            result = backend.find_lyrics(*song)
+            backend.metrics.record_lookup(
+                bool(result.lyrics),
+                result.failure.value if result.failure else None,
+                time.perf_counter() - start_time,
+            )
+            if result.lyrics:
+                if self.__lyrics_store and backend.sends_requests:
+                    add_to_store(self.__lyrics_store, song, result.lyrics, backend)
+                return LookupOutcome(
+                    result.lyrics, backend.name, backend.has_timestamps, failures
+                )
+            if result.failure:
+                failures[backend.name] = result.failure.value
+        return LookupOutcome(None, None, False, failures)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            stats = {
+                "uptime_secs": time.time() - self.started_at,
+                "lookups": self.num_lookups,
+                "cache_hits": self.num_cache_hits,
+                "cached_misses": self.num_cached_misses,
+                "cached_songs": len(self.__results),
+                "remembered_misses": len(self.__misses),
+                "shared_lookups": self.__lookups.num_shared,
+            }
+        stats["backends"] = {
+            backend.name: backend.metrics.snapshot() for backend in self.__backends
+        }
+        return stats
+
+    def close(self) -> None:
+        self.__executor.shutdown(cancel_futures=True)
+
+
+def outcome_to_json(song: Song, outcome: LookupOutcome) -> dict:
+    return {
+        "artist": song.artist,
+        "title": song.title,
+        "duration": song.duration,
+        "found": outcome.lyrics is not None,
+        "timestamps": outcome.has_timestamps,
+        "backend": outcome.backend,
+        "lyrics": outcome.lyrics,
+        "failures": outcome.failures,
+    }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Default backlog of 5 drops connections when lots of callers connect at once
+    request_queue_size = 128
+
+
+class LyricsServer:
+    def __init__(self, service: LyricsService, host: str = "127.0.0.1", port: int = 0):
+        self.__service = service
+        self.__server = _Server((host, port), self.__make_handler())
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        _LOGGER.info(f"Serving lyrics at {self.url}")
+        try:
+            self.__server.serve_forever()
+        finally:
+            self.__server.server_close()
+
+    def shutdown(self) -> None:
+        self.__server.shutdown()
+
+    def __make_handler(self):
+        service = self.__service
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections open between requests
+            protocol_version = "HTTP/1.1"
+            # Headers and body are sent separately, so don't wait for an ACK between them
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                url = urlsplit(self.path)
+                if url.path == "/lyrics":
+                    self.__get_lyrics(parse_qs(url.query))
+                elif url.path == "/stats":
+                    self.__send_json(HTTPStatus.OK, service.stats())
+                else:
+                    self.__send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+
+            def do_POST(self) -> None:
+                if urlsplit(self.path).path != "/lyrics/batch":
+                    self.__send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", ""))
+                except ValueError:
+                    self.__send_json(
+                        HTTPStatus.LENGTH_REQUIRED, {"error": "Content-Length needed"}
+                    )
+                    return
+                if length < 0:
+                    self.__send_json(
+                        HTTPStatus.BAD_REQUEST, {"error": "Invalid Content-Length"}
+                    )
+                    return
+                if length > _MAX_BODY_BYTES:
+                    self.__send_json(
+                        HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Too many songs"}
+                    )
+                    return
+                body = self.rfile.read(length).decode("utf-8", errors="replace")
+                self.__get_batch(body.splitlines())
+
+            def __get_lyrics(self, query: Dict[str, List[str]]) -> None:
+                artist = query.get("artist", [""])[0].strip()
+                title = query.get("title", [""])[0].strip()
+                if not artist or not title:
+                    self.__send_json(
+                        HTTPStatus.BAD_REQUEST,
+                        {"error": "artist and title must be given"},
+                    )
+                    return
+                duration = normalise_duration(query.get("duration", [""])[0])
+                song = Song(title, artist, duration)
+                try:
+                    outcome = service.look_up(song)
+                except Exception:
+                    _LOGGER.exception(f"Failed to look up: {title} - {artist}")
+                    self.__send_json(
+                        HTTPStatus.INTERNAL_SERVER_ERROR,
+                        {"error": "Failed to look up the song"},
+                    )
+                    return
+                status = HTTPStatus.OK if outcome.lyrics else HTTPStatus.NOT_FOUND
+                self.__send_json(status, outcome_to_json(song, outcome))
+
+            def __get_batch(self, lines: List[str]) -> None:
+                # Results are sent as they finish, so the length isn't known
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                songs = []
+                indexes = []
+                # The response has started, so every line gets a result or an error
+                for index, line in enumerate(line for line in lines if line.strip()):
+                    try:
+                        parsed = list(parse_lines([line], JSONL, None))
+                    except Exception:
+                        _LOGGER.exception(f"Failed to parse: {line}")
+                        parsed = []
+                    if parsed:
+                        songs.append(parsed[0])
+                        indexes.append(index)
+                    else:
+                        self.__send_chunk(
+                            {"index": index, "error": f"Not a song: {line}"}
+                        )
+                for song_index, song, outcome in service.look_up_many(songs):
+                    if isinstance(outcome, Exception):
+                        self.__send_chunk(
+                            {
+                                "index": indexes[song_index],
+                                "error": f"Failed to look up: {song.title} - {song.artist}",
+                            }
+                        )
+                        continue
+                    self.__send_chunk(
+                        {"index": indexes[song_index], **outcome_to_json(song, outcome)}
+                    )
+                self.wfile.write(b"0\r\n\r\n")
+
+            def __send_chunk(self, data: dict) -> None:
+                line = (json.dumps(data) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+                self.wfile.flush()
+
+            def __send_json(self, status: HTTPStatus, data: dict) -> None:
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                _LOGGER.debug(f"{self.address_string()} {format % args}")
+
+        return Handler
@@ -0,0 +1,193 @@
+"""Import output folders into a lyrics store (see --lyrics-store) and export it to any layout.
+
+py lyrics_store_tool.py import <store> <output folder>...
+py lyrics_store_tool.py export <store> <folder> [--layout "{artist}/{title}.{ext}"]
+"""
+
+import argparse
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from slugify import slugify
+
+from backends.lrc import LrcLyrics
+from backends.lyrics_store import LyricsStore, StoredLyrics
+from backends.normaliser import get_normaliser
+from input_reader import Song
+from run_journal import read_finished_songs
+
+_LOGGER = logging.getLogger(__name__)
+
+IMPORTED_SOURCE = "import"
+# Same as the lyrics getter's output folder
+DEFAULT_LAYOUT = "{artist_slug}/{title_slug}.{ext}"
+_IMPORT_BATCH_SIZE = 500
+
+
+def _get_journal_songs(output_root: Path) -> Dict[Tuple[str, str], Song]:
+    """(Artist folder, file name without extension) -> songs in the output folder's journal,
+    as the file names lose the punctuation"""
+    path = output_root / "journal.jsonl"
+    if not path.exists():
+        return {}
+    return {
+        (slugify(song.artist), slugify(song.title)): song
+        for song in read_finished_songs(path)
+    }
+
+
+def _get_tag(lyrics: LrcLyrics, key: str) -> Optional[str]:
+    for tag_key, value in lyrics.tags:
+        if tag_key == key and value:
+            return value
+    return None
+
+
+def _get_length_secs(length: Optional[str]) -> Optional[int]:
+    # [length: mm:ss] or [length: mm:ss.xx]
+    if not length:
+        return None
+    mins, _, secs = length.partition(":")
+    try:
+        return int(mins) * 60 + round(float(secs))
+    except ValueError:
+        return None
+
+
+def iter_output_folder(output_root: Path) -> Iterator[StoredLyrics]:
+    """Lyrics files in an output folder (<artist>/<title>.lrc or .txt)"""
+    journal_songs = _get_journal_songs(output_root)
+    normaliser = get_normaliser((), ())
+    with os.scandir(output_root) as artist_entries:
+        for artist_entry in artist_entries:
+            if not artist_entry.is_dir():
+                continue
+            with os.scandir(artist_entry.path) as file_entries:
+                for entry in file_entries:
+                    title_name, extension = os.path.splitext(entry.name)
+                    if extension not in (".lrc", ".txt") or title_name.startswith("."):
+                        continue
+                    try:
+                        with open(entry.path, encoding="utf-8") as file:
+                            lyrics = file.read()
+                    except (OSError, UnicodeDecodeError) as ex:
+                        _LOGGER.warning(f"Cannot read lyrics file {entry.path}: {ex}")
+                        continue
+                    has_timestamps = extension == ".lrc"
+                    song = journal_songs.get((artist_entry.name, title_name))
+                    if song:
+                        title, artist, duration = song
+                        duration_secs = normaliser.get_secs_from_time_str(duration)
+                    else:
+                        # Best we can do is the tags (or the file names)
+                        parsed = LrcLyrics.parse(lyrics) if has_timestamps else None
+                        title = (parsed and _get_tag(parsed, "ti")) or title_name
+                        artist = (
+                            parsed and _get_tag(parsed, "ar")
+                        ) or artist_entry.name
+                        duration_secs = parsed and _get_length_secs(
+                            _get_tag(parsed, "length")
+                        )
+                    yield StoredLyrics(
+                        title,
+                        artist,
+                        duration_secs,
+                        lyrics,
+                        has_timestamps,
+                        IMPORTED_SOURCE,
+                    )
+
+
+def import_output_folder(store: LyricsStore, output_root: Path) -> int:
+    """Add every lyrics file in the output folder to the store. Returns how many were added"""
+    count = 0
+    batch = []
+    for stored in iter_output_folder(output_root):
+        batch.append(stored)
+        if len(batch) >= _IMPORT_BATCH_SIZE:
+            count += store.add_many(batch)
+            batch = []
+    count += store.add_many(batch)
+    return count
+
+
+def export_store(
+    store: LyricsStore, output_root: Path, layout: str, overwrite: bool
+) -> Tuple[int, int]:
+    """Write every song in the store to a file laid out by the layout.
+    Returns how many were written and how many already existed"""
+    num_written = 0
+    num_existing = 0
+    for stored in store:
+        relative_path = layout.format(
+            title=stored.title,
+            artist=stored.artist,
+            title_slug=slugify(stored.title),
+            artist_slug=slugify(stored.artist),
+            duration_secs=stored.duration_secs or "",
+            source=stored.source,
+            ext="lrc" if stored.has_timestamps else "txt",
+        )
+        path = output_root / relative_path
+        if not overwrite and path.exists():
+            num_existing += 1
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file then renamed, so there are never half written files
+        temp_path = path.with_name(f".{path.name}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(stored.lyrics)
+        os.replace(temp_path, path)
+        num_written += 1
+    return num_written, num_existing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        "Import lyrics into a lyrics store, or export them from it."
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser(
+        "import", help="Add the lyrics files in output folders to the store."
+    )
+    import_parser.add_argument("store", type=Path)
+    import_parser.add_argument("output_folders", type=Path, nargs="+")
+    export_parser = subparsers.add_parser(
+        "export", help="Write every song in the store to a folder."
+    )
+    export_parser.add_argument("store", type=Path)
+    export_parser.add_argument("output_folder", type=Path)
+    export_parser.add_argument(
+        "--layout",
+        help=f"Path of each file in the folder, with {{title}}, {{artist}}, {{title_slug}}, {{artist_slug}}, {{duration_secs}}, {{source}} and {{ext}} (lrc or txt) filled in. Uses {DEFAULT_LAYOUT} (like the output folder) by default.",
+        default=DEFAULT_LAYOUT,
+    )
+    export_parser.add_argument(
+        "--overwrite", help="Replace files that exist.", action="store_true"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    store = LyricsStore(args.store)
+    try:
+        if args.command == "import":
+            for output_folder in args.output_folders:
+                count = import_output_folder(store, output_folder)
+                _LOGGER.info(f"Imported {count} lyrics from {output_folder}")
+        else:
+            num_written, num_existing = export_store(
+                store, args.output_folder, args.layout, args.overwrite
+            )
+            _LOGGER.info(
+                f"Exported {num_written} lyrics to {args.output_folder} (Existing={num_existing})"
+            )
+        _LOGGER.info(store.summary())
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,93 @@
-from distutils.debug import DEBUG
 from pathlib import Path
 import argparse
 from backends import helpers
-from lyrics_getter import LyricsGetter
+from backends.http_cache import LYRICS_PAGE, SEARCH_PAGE, HttpCache
+from backends.lyrics_store import LyricsStore
+from input_reader import INPUT_FORMATS, detect_format, get_default_separator
+from sharding import parse_shard
 
 import logging
 
+# Anything that imports requests or the backends is imported once the args are parsed,
+# so `-h` (and bad args) don't wait for them
+
 _LOGGER = logging.getLogger(__name__)
 
 def get_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser("Get lyrics from a range of websites and save them in LRC format.")
-    parser.add_argument("-b", "--backend", help="Which website to use as a backend. Multiple can be specified. Uses all available backends by default.", action="append", default=[])
+    parser.add_argument("-b", "--backend", help="Which website to use as a backend. Multiple can be specified. Uses all available backends by default. Backends installed by other packages (in the `lyrics_getter.backends` entry point group) can be used by name.", action="append", default=[])
     parser.add_argument("-i", "--input-file", help="Path of file containing songs to get lyrics for. Using sample input by default.", type=str, default="sample/input.txt")
-    parser.add_argument("-s", "--input-separator", help="Separator that the input file is using. Uses `|` by default.", type=str, default="|")
+    parser.add_argument("-s", "--input-separator", help="Separator that the input file is using. Uses `|` by default (or `,` for CSV).", type=str, default=None)
+    parser.add_argument("-f", "--input-format", help="Format of the input file. Detected from the file extension by default (.csv, .jsonl, .m3u, anything else is separated).", choices=INPUT_FORMATS, default=None)
     parser.add_argument("-o", "--output-folder", help="Folder where LRC lyrics should be saved. Uses sample output by default.", type=str, default="sample/output/")
     parser.add_argument("--no-timestamp-fallback", help="Store lyrics without timestamps (in txt file) if no timed lyrics found. Will append all non-timestamp backends onto existing list. Default false.", action="store_true")
     parser.add_argument("--genius-access-token", help="An access token provided from your free Genius account.", type=str, default=None)
+    parser.add_argument("--shard", help="Only get lyrics for one shard of the input in the format `<index>/<count>` (e.g. 2/4), so the songs can be split between machines. Songs are split by a hash of their standardised artist, title and duration, so each shard is the same every run. Combine the output folders with merge_shards.py. Uses the whole input by default.", type=str, default=None)
+    parser.add_argument("--watch", help="Keep running and get lyrics for songs as they're added to the input file (until stopped with Ctrl+C). Only new lines are read, and the backends and caches stay warm. Default false.", action="store_true")
+    parser.add_argument("--watch-interval", help="Seconds between checking the input file for new songs with --watch. Uses 1 by default.", type=float, default=1.0)
+    parser.add_argument("--serve", help="Instead of reading the input file, serve lyrics over a local HTTP API on this port (see lyrics_server.py for the endpoints). Batches are looked up with --workers threads. Not served by default.", type=int, default=None)
+    parser.add_argument("--serve-host", help="Address to serve the HTTP API on with --serve. Uses 127.0.0.1 (only this machine) by default.", type=str, default="127.0.0.1")
+    parser.add_argument("--serve-cache-size", help="Number of songs' lyrics the HTTP API remembers (least recently used are forgotten first). Uses 10000 by default.", type=int, default=10000)
+    parser.add_argument("--serve-miss-ttl", help="Seconds the HTTP API remembers that no backend had a song, so asking again doesn't send the same requests. 0 to always look again. Uses 60 by default.", type=float, default=60)
+    parser.add_argument("-w", "--workers", help="Number of songs to get lyrics for at the same time. Uses 1 by default.", type=int, default=1)
+    parser.add_argument("--backend-concurrency", help="Max concurrent requests to a backend in the format `<backend>=<count>`. Can be specified for multiple backends.", action="append", default=[])
+    parser.add_argument("--backend-rps", help="Max requests per second to a backend in the format `<backend>=<rate>`. Can be specified for multiple backends.", action="append", default=[])
+    parser.add_argument("--backend-url", help="Base URL to use for a backend instead of its website (e.g. a mirror or local server) in the format `<backend>=<url>`. Can be specified for multiple backends.", action="append", default=[])
+    parser.add_argument("--max-retries", help="Times to retry a request that fails to connect or gets a busy response (429/5xx), with jittered exponential backoff (and waiting for Retry-After). Uses 3 by default.", type=int, default=3)
+    parser.add_argument("--request-timeout", help="Seconds to wait for a website to respond. Uses 30 by default.", type=float, default=30)
+    parser.add_argument("--parse-processes", help="Number of processes to parse pages (and check/scrub the lyrics) in, so parsing doesn't hold up the workers waiting on websites. Worth it with lots of workers (e.g. set it to the number of cores). Uses 0 (parse in the workers) by default.", type=int, default=0)
+    parser.add_argument("--hedge-backends", help="Query all timestamp backends for a song at the same time (still preferring the highest priority backend's lyrics). Default false.", action="store_true")
+    parser.add_argument("--cache-file", help="Path of SQLite file to cache website responses in between runs. No cache by default.", type=str, default=None)
+    parser.add_argument("--cache-search-ttl", help="Hours to keep cached search pages. Uses 168 (1 week) by default.", type=float, default=168)
+    parser.add_argument("--cache-lyrics-ttl", help="Hours to keep cached lyrics pages. Uses 2160 (90 days) by default.", type=float, default=2160)
+    parser.add_argument("--cache-max-size", help="Max size of the cache in MB. Least recently used responses are removed first. Uses 500 by default.", type=float, default=500)
+    parser.add_argument("--lyrics-store", dest="lyrics_store_file", metavar="LYRICS_STORE", help="Path of SQLite file to keep every lyrics found in (import existing output folders with lyrics_store_tool.py). It's searched before any website, as the `local` backend. No store by default.", type=str, default=None)
+    parser.add_argument("--retry-failed", help="Look up songs on every backend, even if the backend failed to get them recently. Default false.", action="store_true")
+    parser.add_argument("--failure-recheck-hours", help="Hours to wait before looking up a song again on a backend that failed to get it. Doubles after each failure. Uses 24 by default.", type=float, default=24)
+    parser.add_argument("--min-confidence", help="Min score (0 to 1) of a search result for it to be used. Based on matching title and artist words, duration and keywords like live/remix/cover. Uses 0.8 by default.", type=float, default=None)
+    parser.add_argument("--max-candidates", help="Max number of search results to get lyrics from for each backend, if the best result's lyrics are invalid. Uses 3 by default.", type=int, default=None)
+    parser.add_argument("--adaptive-order", help="Try timestamp backends for each song in the order most likely to find lyrics in the fewest requests, learned from previous runs (saved in backend_stats.json in the output folder). Non-timestamp backends are always tried last. Default false.", action="store_true")
+    parser.add_argument("--adaptive-order-by-artist", help="Learn the adaptive order separately for each artist (falling back to overall stats for artists with few lookups). Implies --adaptive-order. Default false.", action="store_true")
+    parser.add_argument("--resume", help="Carry on from where the last run (in the same output folder) stopped, using its journal. Songs it finished aren't looked up again and backends it already tried aren't asked again. Default false.", action="store_true")
+    parser.add_argument("--prometheus-file", help="Path to also write the run report to in the Prometheus text format (e.g. for the node exporter textfile collector). Not written by default.", type=str, default=None)
     parser.add_argument("-v", "--verbose", help="Set logging level to verbose/debug.", action="store_true")
     args = parser.parse_args()
 
     log_level = logging.DEBUG if args.verbose else logging.INFO
     logging.basicConfig(level=log_level)
+    from backends.parse_pool import ParsePool
+    from backends.transport import Transport
 
     args.input_path = Path(Path.cwd(), args.input_file)
+    if not args.input_format:
+        args.input_format = detect_format(args.input_path)
+    if not args.input_separator:
+        args.input_separator = get_default_separator(args.input_format)
     args.output_path = Path(Path.cwd(), args.output_folder)
+    if args.shard:
+        args.shard = parse_shard(args.shard)
+    args.backend_concurrency = helpers.parse_backend_options(args.backend_concurrency, int)
+    args.backend_requests_per_second = helpers.parse_backend_options(args.backend_rps, float)
+    args.backend_base_urls = helpers.parse_backend_options(args.backend_url, str)
+    args.transport = Transport(max_retries=args.max_retries, timeout_secs=args.request_timeout)
+    args.http_cache = None
+    if args.cache_file:
+        ttls = {SEARCH_PAGE: args.cache_search_ttl * 3600, LYRICS_PAGE: args.cache_lyrics_ttl * 3600}
+        args.http_cache = HttpCache(Path(Path.cwd(), args.cache_file), ttls, int(args.cache_max_size * 1e6))
+
+    args.lyrics_store = None
+    if args.lyrics_store_file:
+        args.lyrics_store = LyricsStore(Path(Path.cwd(), args.lyrics_store_file))
 
     if not args.backend:
         args.backend = helpers.get_all_backends()
+    if args.lyrics_store:
+        # Always look in the store first
+        args.backend.insert(0, helpers.LOCAL_BACKEND)
     if args.no_timestamp_fallback:
+        if args.lyrics_store:
+            # Lyrics without timestamps in the store before any fallback website
+            args.backend.append(helpers.LOCAL_TXT_BACKEND)
         args.backend.extend(helpers.get_all_no_timestamp_backends())
 
     dont_print_args = ["genius-access-token"]
@@ -44,14 +104,15 @@ def get_args() -> argparse.Namespace:
         if backend_name in existing_backends:
             continue
 
-        backend_class = helpers.get_backend_class(backend_name)
-        if not backend_class:
+        backend = helpers.create_backend(backend_name, args)
+        if not backend:
             _LOGGER.warning(f"Can't find backend {backend_name}")
+            continue
         _LOGGER.debug(f"Using backend: {backend_name}")
-        if helpers.has_timestamps(backend_name):
-            timestamp_backends.append(backend_class(args))
+        if backend.has_timestamps:
+            timestamp_backends.append(backend)
         else:
-            non_timestamp_backends.append((backend_class(args)))
+            non_timestamp_backends.append(backend)
         existing_backends.append(backend_name)
 
     # Enfore that we use timestamp backends first
@@ -60,12 +121,51 @@ def get_args() -> argparse.Namespace:
     if not args.backends:
         raise ValueError("No valid backends provided")
 
+    args.parse_pool = None
+    if args.parse_processes:
+        args.parse_pool = ParsePool(args.backends, args.parse_processes)
+
     return args
 
+def serve(args: argparse.Namespace) -> None:
+    from lyrics_server import LyricsServer, LyricsService
+    service = LyricsService(args.backends, workers=args.workers, cache_size=args.serve_cache_size, lyrics_store=args.lyrics_store, miss_ttl_secs=args.serve_miss_ttl)
+    server = LyricsServer(service, args.serve_host, args.serve)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        _LOGGER.info("Stopped serving lyrics")
+    finally:
+        service.close()
+
 def main() -> None:
     args = get_args()
-    get_lyrics = LyricsGetter(args.backends, args.input_path, args.output_path, args.input_separator)
-    get_lyrics.run()
+    if args.serve is not None:
+        try:
+            serve(args)
+        finally:
+            if args.parse_pool:
+                args.parse_pool.close()
+        return
+    from backend_scheduler import BackendScheduler
+    from lyrics_getter import LyricsGetter
+    scheduler = None
+    if args.adaptive_order or args.adaptive_order_by_artist:
+        scheduler = BackendScheduler(args.output_path / "backend_stats.json", per_artist=args.adaptive_order_by_artist)
+    get_lyrics = LyricsGetter(args.backends, args.input_path, args.output_path, args.input_separator, input_format=args.input_format, workers=args.workers, hedge_backends=args.hedge_backends, retry_failed=args.retry_failed, failure_recheck_secs=args.failure_recheck_hours * 3600, prometheus_path=Path(Path.cwd(), args.prometheus_file) if args.prometheus_file else None, scheduler=scheduler, resume=args.resume, lyrics_store=args.lyrics_store, shard=args.shard)
+    try:
+        if args.watch:
+            get_lyrics.watch(args.watch_interval)
+        else:
+            get_lyrics.run()
+    finally:
+        get_lyrics.close()
+        if args.parse_pool:
+            args.parse_pool.close()
+    if args.http_cache:
+        _LOGGER.info(args.http_cache.summary())
+    if args.lyrics_store:
+        _LOGGER.info(args.lyrics_store.summary())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
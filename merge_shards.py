@@ -0,0 +1,144 @@
+"""Combine the output folders of shards (see --shard) into one output folder.
+
+py merge_shards.py <output folder> <shard output folder>...
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List
+
+from run_report import merge_reports, write_atomic, write_json_report
+
+_LOGGER = logging.getLogger(__name__)
+
+_LYRICS_EXTENSIONS = (".lrc", ".txt")
+
+
+def merge_lyrics(shard_root: Path, output_root: Path) -> int:
+    """Copy the shard's lyrics files into the output folder. Returns how many were copied"""
+    count = 0
+    with os.scandir(shard_root) as artist_entries:
+        for artist_entry in artist_entries:
+            if not artist_entry.is_dir():
+                continue
+            artist_path = output_root / artist_entry.name
+            with os.scandir(artist_entry.path) as file_entries:
+                for entry in file_entries:
+                    title_name, extension = os.path.splitext(entry.name)
+                    # Hidden files are half written (e.g. from a shard still running)
+                    if (
+                        entry.name.startswith(".")
+                        or extension not in _LYRICS_EXTENSIONS
+                    ):
+                        continue
+                    # Timestamp lyrics replace non-timestamp lyrics (like in a run)
+                    if (
+                        extension == ".txt"
+                        and (artist_path / f"{title_name}.lrc").exists()
+                    ):
+                        continue
+                    artist_path.mkdir(parents=True, exist_ok=True)
+                    # Copied to a temporary file then renamed, so there are never half written files
+                    temp_path = artist_path / f".{entry.name}.tmp"
+                    shutil.copyfile(entry.path, temp_path)
+                    os.replace(temp_path, artist_path / entry.name)
+                    if extension == ".lrc":
+                        (artist_path / f"{title_name}.txt").unlink(missing_ok=True)
+                    count += 1
+    return count
+
+
+def merge_shards(output_root: Path, shard_roots: List[Path]) -> dict:
+    """Merge the shards' lyrics, failed songs, journals, failure indexes and reports.
+    Returns the merged report"""
+    output_root.mkdir(parents=True, exist_ok=True)
+    reports = []
+    failed_lines: Dict[str, None] = {}
+    failures = {}
+    journal_lines = []
+    for shard_root in shard_roots:
+        count = merge_lyrics(shard_root, output_root)
+        _LOGGER.info(f"Copied {count} lyrics files from {shard_root}")
+
+        report_path = shard_root / "report.json"
+        if report_path.exists():
+            with open(report_path, encoding="utf-8") as file:
+                reports.append(json.load(file))
+        else:
+            _LOGGER.warning(f"No run report in {shard_root}, has the shard finished?")
+        failed_path = shard_root / "failed.txt"
+        if failed_path.exists():
+            with open(failed_path, encoding="utf-8") as file:
+                # Keeps the order (without duplicates)
+                failed_lines.update(
+                    dict.fromkeys(line for line in file if line.strip())
+                )
+        failure_index_path = shard_root / "failed_index.json"
+        if failure_index_path.exists():
+            with open(failure_index_path, encoding="utf-8") as file:
+                failures.update(json.load(file))
+        journal_path = shard_root / "journal.jsonl"
+        if journal_path.exists():
+            with open(journal_path, encoding="utf-8") as file:
+                journal_lines.extend(line for line in file if line.endswith("\n"))
+
+    _check_shards(reports)
+    write_atomic(output_root / "failed.txt", "".join(failed_lines))
+    write_atomic(output_root / "failed_index.json", json.dumps(failures, indent=1))
+    write_atomic(output_root / "journal.jsonl", "".join(journal_lines))
+    report = merge_reports(reports)
+    write_json_report(output_root / "report.json", report)
+    return report
+
+
+def _check_shards(reports: List[dict]) -> None:
+    shards = [report.get("shard") for report in reports]
+    if not all(shards):
+        _LOGGER.warning("Some of the reports aren't from a shard")
+        return
+    counts = {shard["count"] for shard in shards}
+    if len(counts) > 1:
+        _LOGGER.warning(f"Shards were split different ways: {sorted(counts)} shards")
+        return
+    (count,) = counts
+    indexes = sorted(shard["index"] for shard in shards)
+    missing = sorted(set(range(1, count + 1)) - set(indexes))
+    if missing:
+        _LOGGER.warning(f"Missing shards: {', '.join(f'{i}/{count}' for i in missing)}")
+    if len(set(indexes)) < len(indexes):
+        _LOGGER.warning("The same shard was given more than once")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        "Combine the output folders of shards into one output folder."
+    )
+    parser.add_argument("output_folder", type=Path)
+    parser.add_argument("shard_folders", type=Path, nargs="+")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    shard_folders = []
+    for shard_folder in args.shard_folders:
+        if shard_folder.is_dir():
+            shard_folders.append(shard_folder)
+        else:
+            _LOGGER.warning(
+                f"Ignoring shard output folder that doesn't exist: {shard_folder}"
+            )
+    if not shard_folders:
+        raise ValueError("None of the shard output folders exist")
+    report = merge_shards(args.output_folder, shard_folders)
+    songs = report["songs"]
+    _LOGGER.info(
+        f"Merged {len(report['shards'])} shards: Total={songs.get('total', 0)} Saved(LRC)={songs.get('saved_lrc', 0)} Saved(TXT)={songs.get('saved_txt', 0)} Failed={songs.get('failed', 0)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
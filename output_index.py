@@ -0,0 +1,52 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Set
+
+_LOGGER = logging.getLogger(__name__)
+
+_LYRICS_EXTENSIONS = (".lrc", ".txt")
+
+
+class OutputIndex:
+    """In-memory index of the lyrics files in the output folder, so we only scan it once"""
+
+    def __init__(self, output_root: Path):
+        self.__output_root = output_root
+        self.__lock = threading.Lock()
+        # Artist folder name -> lyrics file names
+        self.__files: Dict[str, Set[str]] = {}
+        self.__scan()
+
+    def __scan(self) -> None:
+        start_time = time.time()
+        num_files = 0
+        with os.scandir(self.__output_root) as artist_entries:
+            for artist_entry in artist_entries:
+                if not artist_entry.is_dir():
+                    continue
+                with os.scandir(artist_entry.path) as file_entries:
+                    files = {
+                        entry.name
+                        for entry in file_entries
+                        if entry.name.endswith(_LYRICS_EXTENSIONS)
+                    }
+                self.__files[artist_entry.name] = files
+                num_files += len(files)
+        _LOGGER.debug(
+            f"Indexed {num_files} existing lyrics files in {len(self.__files)} folders (Time={time.time() - start_time})"
+        )
+
+    def exists(self, artist_dir: str, file_name: str) -> bool:
+        with self.__lock:
+            return file_name in self.__files.get(artist_dir, ())
+
+    def add(self, artist_dir: str, file_name: str) -> None:
+        with self.__lock:
+            self.__files.setdefault(artist_dir, set()).add(file_name)
+
+    def remove(self, artist_dir: str, file_name: str) -> None:
+        with self.__lock:
+            self.__files.get(artist_dir, set()).discard(file_name)
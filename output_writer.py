@@ -0,0 +1,165 @@
+import logging
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Set, Tuple
+
+from output_index import OutputIndex
+
+_LOGGER = logging.getLogger(__name__)
+
+# Tells the writer thread there's nothing more to write
+_STOP = None
+
+
+class WriteJob(NamedTuple):
+    artist_dir: str
+    file_name: str
+    # None to copy another lyrics file instead
+    lyrics: Optional[str]
+    # Lyrics file this one replaces (e.g. TXT lyrics when we've now got LRC)
+    replaces: Optional[str]
+    # Anything the caller wants back if the write fails
+    context: object = None
+    # Artist folder and file name of the lyrics to copy (written before this job)
+    copy_of: Optional[Tuple[str, str]] = None
+
+
+class OutputWriter:
+    """Writes lyrics files on a background thread, so lookups don't wait on the disk.
+
+    Files are written in batches: each to a temporary file that is synced, then renamed into
+    place (so nothing ever sees a half written file), then each folder changed is synced once.
+    """
+
+    def __init__(
+        self,
+        output_root: Path,
+        output_index: OutputIndex,
+        on_failure: Optional[Callable[[WriteJob, Exception], None]] = None,
+        batch_size: int = 32,
+        max_queued: int = 1024,
+    ):
+        self.__output_root = output_root
+        self.__output_index = output_index
+        self.__on_failure = on_failure
+        self.__batch_size = batch_size
+        self.__queue = queue.Queue(maxsize=max_queued)
+        # Artist folders the writer thread knows exist (only used on that thread)
+        self.__made_dirs: Set[str] = set()
+        self.num_written = 0
+        self.num_failed = 0
+        self.__thread = threading.Thread(
+            target=self.__run, name="output-writer", daemon=True
+        )
+        self.__thread.start()
+
+    def write(self, job: WriteJob) -> None:
+        # Counted as existing straight away so the same song isn't looked up twice
+        self.__output_index.add(job.artist_dir, job.file_name)
+        # Blocks if the disk can't keep up
+        self.__queue.put(job)
+
+    def close(self) -> None:
+        """Write everything that's queued then stop"""
+        self.__queue.put(_STOP)
+        self.__thread.join()
+
+    def __run(self) -> None:
+        while True:
+            batch = [self.__queue.get()]
+            # Take whatever else is already waiting
+            while len(batch) < self.__batch_size and batch[-1] is not _STOP:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self.__write_batch(batch)
+            if stop:
+                return
+
+    def __write_batch(self, batch: List[WriteJob]) -> None:
+        written = []
+        # Lyrics written in this batch (that copies may need before they're renamed into place)
+        batch_lyrics = {}
+        for job in batch:
+            try:
+                lyrics = self.__get_lyrics(job, batch_lyrics)
+                written.append((job, self.__write_temp_file(job, lyrics)))
+                batch_lyrics[job.artist_dir, job.file_name] = lyrics
+            except Exception as ex:
+                self.__failed(job, ex)
+
+        # Move the synced files into place, then sync each folder once for the whole batch
+        directories: Set[Path] = set()
+        for job, temp_path in written:
+            path = self.__output_root / job.artist_dir / job.file_name
+            try:
+                os.replace(temp_path, path)
+            except Exception as ex:
+                temp_path.unlink(missing_ok=True)
+                self.__failed(job, ex)
+                continue
+            directories.add(path.parent)
+            self.num_written += 1
+            if job.replaces:
+                self.__remove(job.artist_dir, job.replaces)
+        for directory in directories:
+            self.__sync_directory(directory)
+
+    def __get_lyrics(self, job: WriteJob, batch_lyrics: dict) -> str:
+        if job.lyrics is not None:
+            return job.lyrics
+        if job.copy_of in batch_lyrics:
+            return batch_lyrics[job.copy_of]
+        with open(self.__output_root.joinpath(*job.copy_of), encoding="utf-8") as file:
+            return file.read()
+
+    def __write_temp_file(self, job: WriteJob, lyrics: str) -> Path:
+        if job.artist_dir not in self.__made_dirs:
+            (self.__output_root / job.artist_dir).mkdir(exist_ok=True)
+            self.__made_dirs.add(job.artist_dir)
+        temp_path = self.__output_root / job.artist_dir / f".{job.file_name}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(lyrics)
+            # Only this file, rather than everything waiting to be written on the machine
+            file.flush()
+            os.fsync(file.fileno())
+        return temp_path
+
+    def __remove(self, artist_dir: str, file_name: str) -> None:
+        if not self.__output_index.exists(artist_dir, file_name):
+            return
+        try:
+            (self.__output_root / artist_dir / file_name).unlink(missing_ok=True)
+        except OSError as ex:
+            _LOGGER.warning(f"Cannot remove replaced lyrics {file_name}: {ex}")
+            return
+        self.__output_index.remove(artist_dir, file_name)
+
+    def __sync_directory(self, directory: Path) -> None:
+        # So the renames survive a crash too (not possible on Windows)
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def __failed(self, job: WriteJob, ex: Exception) -> None:
+        _LOGGER.warning(
+            f"Cannot write lyrics to {self.__output_root / job.artist_dir / job.file_name}: {ex}"
+        )
+        self.num_failed += 1
+        self.__output_index.remove(job.artist_dir, job.file_name)
+        if self.__on_failure:
+            self.__on_failure(job, ex)
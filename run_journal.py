@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+from input_reader import Song
+
+_LOGGER = logging.getLogger(__name__)
+
+# A song has finished (with its outcome)
+SONG_EVENT = "song"
+# A backend failed to get lyrics for a song (that may not have finished)
+ATTEMPT_EVENT = "attempt"
+# We got lyrics for a song but couldn't save them (can be before or after the song event)
+WRITE_FAILED_EVENT = "write_failed"
+# Outcome of songs that failed
+FAILED_OUTCOME = "failed"
+
+
+def _read_entries(path: Path) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Last line can be cut off if the run was killed mid write
+                _LOGGER.debug(f"Ignoring unreadable journal line: {line}")
+
+
+def read_finished_songs(path: Path) -> Iterator[Song]:
+    """Every song a journal says has finished (whatever the outcome)"""
+    for entry in _read_entries(path):
+        if entry.get("event") == SONG_EVENT:
+            yield Song(entry["title"], entry["artist"], entry["duration"])
+
+
+class RunJournal:
+    """Append-only JSONL record of the run, so a killed run can carry on where it stopped.
+
+    Lines are buffered and written in batches (when enough have built up or enough time has passed).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        resume: bool = False,
+        flush_every: int = 50,
+        flush_secs: float = 5,
+    ):
+        self.__path = path
+        self.__flush_every = flush_every
+        self.__flush_secs = flush_secs
+        self.__lock = threading.Lock()
+        self.__buffer: List[str] = []
+        self.__last_flush_time = time.monotonic()
+        # Song key -> outcome of songs finished by previous runs
+        self.__finished: Dict[str, str] = {}
+        # Song key -> backends that already failed songs that didn't finish
+        self.__attempted: Dict[str, Set[str]] = {}
+        if resume:
+            self.__load()
+        self.__file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def __load(self) -> None:
+        if not self.__path.exists():
+            _LOGGER.info(f"No journal to resume from at {self.__path}")
+            return
+        write_failed = set()
+        for entry in self.__read_entries():
+            key = entry.get("key")
+            if entry.get("event") == SONG_EVENT:
+                self.__finished[key] = entry["outcome"]
+                self.__attempted.pop(key, None)
+            elif entry.get("event") == ATTEMPT_EVENT and key not in self.__finished:
+                self.__attempted.setdefault(key, set()).add(entry["backend"])
+            elif entry.get("event") == WRITE_FAILED_EVENT:
+                write_failed.add(key)
+        for key in write_failed:
+            self.__finished[key] = FAILED_OUTCOME
+        _LOGGER.info(
+            f"Resuming from journal: Finished={len(self.__finished)} InProgress={len(self.__attempted)}"
+        )
+
+    def __read_entries(self) -> Iterator[dict]:
+        return _read_entries(self.__path)
+
+    def finished_outcome(self, song_key: str) -> Optional[str]:
+        """Outcome of the song if a previous run finished it"""
+        return self.__finished.get(song_key)
+
+    def attempted_backends(self, song_key: str) -> Set[str]:
+        """Backends a previous run already tried (and failed) for a song it didn't finish"""
+        return self.__attempted.get(song_key, set())
+
+    def record_song(self, song_key: str, song: Song, outcome: str) -> None:
+        self.__append(
+            {
+                "event": SONG_EVENT,
+                "key": song_key,
+                "artist": song.artist,
+                "title": song.title,
+                "duration": song.duration,
+                "outcome": outcome,
+                "at": time.time(),
+            }
+        )
+
+    def record_write_failure(self, song_key: str, song: Song) -> None:
+        self.__append(
+            {
+                "event": WRITE_FAILED_EVENT,
+                "key": song_key,
+                "artist": song.artist,
+                "title": song.title,
+                "duration": song.duration,
+            }
+        )
+
+    def record_attempt(self, song_key: str, backend_name: str, reason: str) -> None:
+        self.__append(
+            {
+                "event": ATTEMPT_EVENT,
+                "key": song_key,
+                "backend": backend_name,
+                "reason": reason,
+            }
+        )
+
+    def __append(self, entry: dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.__lock:
+            self.__buffer.append(line)
+            if (
+                len(self.__buffer) >= self.__flush_every
+                or time.monotonic() - self.__last_flush_time >= self.__flush_secs
+            ):
+                self.__flush()
+
+    def __flush(self) -> None:
+        if self.__buffer:
+            self.__file.write("\n".join(self.__buffer) + "\n")
+            self.__file.flush()
+            self.__buffer.clear()
+        self.__last_flush_time = time.monotonic()
+
+    def flush(self) -> None:
+        with self.__lock:
+            self.__flush()
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__flush()
+            os.fsync(self.__file.fileno())
+            self.__file.close()
+
+    def iter_failed_songs(self) -> Iterator[Song]:
+        """Every song that failed (or couldn't be saved), in the order they finished (call after flush or close)"""
+        for entry in self.__read_entries():
+            event = entry.get("event")
+            if (
+                event == SONG_EVENT and entry["outcome"] == FAILED_OUTCOME
+            ) or event == WRITE_FAILED_EVENT:
+                yield Song(entry["title"], entry["artist"], entry["duration"])
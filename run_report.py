@@ -0,0 +1,294 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from backends.base import GetLyricsBase
+from backends.metrics import summarise_latencies
+from sharding import Shard
+
+_PROMETHEUS_PREFIX = "lyrics_getter"
+
+
+class RunSummary(NamedTuple):
+    total: int
+    skipped: int
+    saved_lrc: int
+    saved_txt: int
+    failed: int
+    elapsed_secs: float
+    # Time taken to process each song, in input order
+    song_secs: List[float]
+    # Songs we got lyrics for but couldn't save (also counted as saved above)
+    write_failed: int = 0
+    # Lookups shared with a duplicate of the song (instead of being sent again)
+    shared_lookups: int = 0
+
+
+def build_report(
+    summary: RunSummary,
+    backends: List[GetLyricsBase],
+    scheduler_summary: Optional[dict] = None,
+    shard: Optional[Shard] = None,
+) -> dict:
+    report = {
+        "finished_at": time.time(),
+        "songs": {
+            "total": summary.total,
+            "skipped": summary.skipped,
+            "saved_lrc": summary.saved_lrc,
+            "saved_txt": summary.saved_txt,
+            "failed": summary.failed,
+            "write_failed": summary.write_failed,
+        },
+        "shared_lookups": summary.shared_lookups,
+        "elapsed_secs": summary.elapsed_secs,
+        "songs_per_sec": (
+            summary.total / summary.elapsed_secs if summary.elapsed_secs else 0.0
+        ),
+        "song_latency_secs": summarise_latencies(summary.song_secs),
+        "backends": {backend.name: backend.metrics.snapshot() for backend in backends},
+    }
+    if scheduler_summary:
+        report["scheduler"] = scheduler_summary
+    if shard:
+        report["shard"] = {"index": shard.index, "count": shard.count}
+    return report
+
+
+# Percentiles can't be combined exactly, so merged reports have the slowest shard's
+# (labelled as such, only the max is the max of every song)
+_LATENCY_KEYS = frozenset(
+    ["song_latency_secs", "request_latency_secs", "lookup_latency_secs"]
+)
+_SLOWEST_SHARD_PREFIX = "slowest_shard_"
+
+
+def _max_latencies(summaries: List[dict]) -> dict:
+    merged = {}
+    for summary in summaries:
+        for quantile, secs in summary.items():
+            merged[quantile] = max(secs, merged.get(quantile, 0.0))
+    return merged
+
+
+def _label_slowest_shard(summary: dict) -> dict:
+    return {
+        (
+            quantile
+            if quantile == "max" or quantile.startswith(_SLOWEST_SHARD_PREFIX)
+            else f"{_SLOWEST_SHARD_PREFIX}{quantile}"
+        ): secs
+        for quantile, secs in summary.items()
+    }
+
+
+def _merge_counts(values: List[dict]) -> dict:
+    """Sum the numbers in dicts (of dicts) with the same layout"""
+    merged = {}
+    for value in values:
+        for key, item in value.items():
+            if key in _LATENCY_KEYS:
+                merged[key] = _max_latencies([merged.get(key, {}), item])
+            elif isinstance(item, dict):
+                merged[key] = _merge_counts([merged.get(key, {}), item])
+            else:
+                merged[key] = merged.get(key, 0) + item
+    return merged
+
+
+def merge_reports(reports: List[dict]) -> dict:
+    """Combine the reports of shards run at the same time into one report"""
+    elapsed_secs = max((report["elapsed_secs"] for report in reports), default=0.0)
+    songs = _merge_counts([report["songs"] for report in reports])
+    backends = _merge_counts([report["backends"] for report in reports])
+    for metrics in backends.values():
+        metrics["hit_rate"] = (
+            metrics["found"] / metrics["lookups"] if metrics["lookups"] else 0.0
+        )
+        for key in _LATENCY_KEYS & metrics.keys():
+            metrics[key] = _label_slowest_shard(metrics[key])
+    return {
+        "finished_at": max((report["finished_at"] for report in reports), default=0.0),
+        "songs": songs,
+        "shared_lookups": sum(report.get("shared_lookups", 0) for report in reports),
+        # Shards run at the same time, so the run took as long as the slowest one
+        "elapsed_secs": elapsed_secs,
+        "songs_per_sec": songs.get("total", 0) / elapsed_secs if elapsed_secs else 0.0,
+        "song_latency_secs": _label_slowest_shard(
+            _max_latencies([report["song_latency_secs"] for report in reports])
+        ),
+        "backends": backends,
+        "shards": [
+            {**report.get("shard", {}), "songs": report["songs"]} for report in reports
+        ],
+    }
+
+
+def write_atomic(path: Path, text: str) -> None:
+    # Readers (e.g. the node exporter) never see a half written file
+    temp_path = path.with_name(f"{path.name}.tmp")
+    with open(temp_path, "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(temp_path, path)
+
+
+def write_json_report(path: Path, report: dict) -> None:
+    write_atomic(path, json.dumps(report, indent=2))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _quantile(key: str) -> str:
+    # Latency summaries are p50, p95, p99 and max
+    return "1" if key == "max" else str(int(key[1:]) / 100)
+
+
+def _prometheus_line(name: str, value: float, **labels: str) -> str:
+    label_str = ",".join(
+        f'{key}="{_escape_label(str(label))}"' for key, label in labels.items()
+    )
+    if label_str:
+        label_str = f"{{{label_str}}}"
+    return f"{_PROMETHEUS_PREFIX}_{name}{label_str} {value}"
+
+
+def write_prometheus_report(path: Path, report: dict) -> None:
+    """Write the report in the Prometheus text format (for the node exporter textfile collector)"""
+    lines = []
+
+    def add(name: str, help: str, samples: List[str]) -> None:
+        lines.append(f"# HELP {_PROMETHEUS_PREFIX}_{name} {help}")
+        lines.append(f"# TYPE {_PROMETHEUS_PREFIX}_{name} gauge")
+        lines.extend(samples)
+
+    add(
+        "last_run_timestamp_seconds",
+        "When the last run finished.",
+        [_prometheus_line("last_run_timestamp_seconds", report["finished_at"])],
+    )
+    add(
+        "run_duration_seconds",
+        "How long the last run took.",
+        [_prometheus_line("run_duration_seconds", report["elapsed_secs"])],
+    )
+    add(
+        "songs",
+        "Songs in the last run by outcome.",
+        [
+            _prometheus_line("songs", count, outcome=outcome)
+            for outcome, count in report["songs"].items()
+        ],
+    )
+    add(
+        "song_latency_seconds",
+        "Time taken to process each song.",
+        [
+            _prometheus_line("song_latency_seconds", secs, quantile=_quantile(quantile))
+            for quantile, secs in report["song_latency_secs"].items()
+        ],
+    )
+
+    backends = report["backends"].items()
+    add(
+        "backend_lookups",
+        "Songs looked up on each backend by result.",
+        [
+            _prometheus_line("backend_lookups", count, backend=name, result=result)
+            for name, metrics in backends
+            for result, count in [("found", metrics["found"])]
+            + list(metrics["failures"].items())
+        ],
+    )
+    add(
+        "backend_hit_ratio",
+        "Fraction of lookups on each backend that found lyrics.",
+        [
+            _prometheus_line("backend_hit_ratio", metrics["hit_rate"], backend=name)
+            for name, metrics in backends
+        ],
+    )
+    add(
+        "backend_requests",
+        "Requests sent to each backend.",
+        [
+            _prometheus_line("backend_requests", metrics["requests"], backend=name)
+            for name, metrics in backends
+        ],
+    )
+    add(
+        "backend_retries",
+        "Requests to each backend that were tried again.",
+        [
+            _prometheus_line("backend_retries", metrics["retries"], backend=name)
+            for name, metrics in backends
+        ],
+    )
+    add(
+        "backend_responses",
+        "Responses from each backend by HTTP status.",
+        [
+            _prometheus_line("backend_responses", count, backend=name, status=status)
+            for name, metrics in backends
+            for status, count in metrics["statuses"].items()
+        ],
+    )
+    add(
+        "backend_cache_hits",
+        "Pages for each backend served from the cache.",
+        [
+            _prometheus_line("backend_cache_hits", metrics["cache_hits"], backend=name)
+            for name, metrics in backends
+        ],
+    )
+    add(
+        "backend_downloaded_bytes",
+        "Bytes downloaded from each backend.",
+        [
+            _prometheus_line(
+                "backend_downloaded_bytes", metrics["bytes_downloaded"], backend=name
+            )
+            for name, metrics in backends
+        ],
+    )
+    add(
+        "backend_time_seconds",
+        "Time each backend spent on each kind of work (summed across threads).",
+        [
+            _prometheus_line("backend_time_seconds", secs, backend=name, kind=kind)
+            for name, metrics in backends
+            for kind, secs in metrics["time_secs"].items()
+        ],
+    )
+    add(
+        "backend_request_latency_seconds",
+        "Time taken by each request to a backend.",
+        [
+            _prometheus_line(
+                "backend_request_latency_seconds",
+                secs,
+                backend=name,
+                quantile=_quantile(quantile),
+            )
+            for name, metrics in backends
+            for quantile, secs in metrics["request_latency_secs"].items()
+        ],
+    )
+    add(
+        "backend_lookup_latency_seconds",
+        "Time taken by each song lookup on a backend.",
+        [
+            _prometheus_line(
+                "backend_lookup_latency_seconds",
+                secs,
+                backend=name,
+                quantile=_quantile(quantile),
+            )
+            for name, metrics in backends
+            for quantile, secs in metrics["lookup_latency_secs"].items()
+        ],
+    )
+    write_atomic(path, "\n".join(lines) + "\n")
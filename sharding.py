@@ -0,0 +1,64 @@
+import hashlib
+from typing import NamedTuple
+
+from backends.normaliser import (
+    DEFAULT_IGNORE_KEYWORDS_IN_TITLE_BRACKETS,
+    DEFAULT_REMOVE_WORDS_FROM_TITLE_ARTIST,
+    get_normaliser,
+)
+from input_reader import get_song_key
+
+
+class Shard(NamedTuple):
+    # 1 to count
+    index: int
+    count: int
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+
+def parse_shard(value: str) -> Shard:
+    """Parse `<index>/<count>` from the CLI (e.g. 2/4 is the second of four shards)"""
+    index, sep, count = value.partition("/")
+    try:
+        shard = Shard(int(index), int(count))
+    except ValueError:
+        shard = None
+    if not sep or not shard or not 1 <= shard.index <= shard.count:
+        raise ValueError(
+            f"Shard {value} should be <index>/<count> with index from 1 to count"
+        )
+    return shard
+
+
+def get_shard_index(title: str, artist: str, duration: str, count: int) -> int:
+    """Shard (1 to count) a song belongs in, the same on every machine and every run.
+
+    Songs that are the same once standardised go in the same shard, so they still share lookups.
+    """
+    # Same standardising on every machine, whichever backends each one uses
+    normaliser = get_normaliser(
+        DEFAULT_IGNORE_KEYWORDS_IN_TITLE_BRACKETS,
+        DEFAULT_REMOVE_WORDS_FROM_TITLE_ARTIST,
+    )
+    std_title, std_artist, duration_secs = normaliser.standardise(
+        title, artist, duration
+    )
+    if std_title and std_artist:
+        key = "|".join(
+            [
+                std_artist,
+                std_title,
+                str(duration_secs) if duration_secs is not None else duration.strip(),
+            ]
+        )
+    else:
+        key = get_song_key(title, artist, duration)
+    # Python's hash() is different in every process, so use a real hash
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count + 1
+
+
+def in_shard(title: str, artist: str, duration: str, shard: Shard) -> bool:
+    return get_shard_index(title, artist, duration, shard.count) == shard.index
@@ -0,0 +1,52 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """Runs a function once per key, however many threads ask for the same key.
+
+    Threads asking while it's running wait for it and share its result, and threads asking
+    afterwards get the remembered result (calls that raise aren't remembered, so they're tried again).
+    """
+
+    def __init__(self, remember: bool = True):
+        # Otherwise results are only shared while the call is running
+        self.__remember = remember
+        self.__lock = threading.Lock()
+        # Key -> result of calls that are still running
+        self.__running: Dict[Hashable, Future] = {}
+        # Key -> result of calls that have finished (kept as plain values as futures are heavier)
+        self.__results: Dict[Hashable, T] = {}
+        self.num_shared = 0
+
+    def do(self, key: Hashable, function: Callable[[], T]) -> Tuple[T, bool]:
+        """Result of the function for the key, and whether it was shared with another caller"""
+        with self.__lock:
+            if key in self.__results:
+                self.num_shared += 1
+                return self.__results[key], True
+            future = self.__running.get(key)
+            leader = future is None
+            if leader:
+                future = self.__running[key] = Future()
+            else:
+                self.num_shared += 1
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = function()
+        except BaseException as ex:
+            with self.__lock:
+                del self.__running[key]
+            future.set_exception(ex)
+            raise
+        with self.__lock:
+            if self.__remember:
+                self.__results[key] = result
+            del self.__running[key]
+        future.set_result(result)
+        return result, False